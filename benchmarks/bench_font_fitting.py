@@ -0,0 +1,93 @@
+"""
+テキストのフォントサイズ調整のマイクロベンチマーク。
+
+従来の二分探索 (サイズを変えながら最大7回程度 getbbox で実測) と FontFitter
+(基準サイズでの1回の計測 + 比例計算 + 確認と1つ大きいサイズの実測、結果の記憶) について、
+アノテーション1件あたりの処理時間とフォントの実測回数を比較します。
+
+使い方:
+    python benchmarks/bench_font_fitting.py [フォントファイルのパス]
+"""
+import os
+import random
+import sys
+import time
+
+from PIL import ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_editer_tool import FontFitter # noqa: E402
+
+LABELS = ["承認", "確認済", "Draft", "Paid", "山田 太郎", "2024-04-01", "No. 000123", "Confidential"]
+ANNOTATION_COUNT = 300
+REPEAT = 5
+
+
+def make_font_loader(font_path):
+    """アプリと同様に、ロード済みのフォントを (サイズ, ファミリー, 太字) ごとに記憶するフォント取得関数を作成します。"""
+    font_cache = {}
+    def get_font(font_size, font_family="gothic", is_bold=False):
+        key = (font_size, font_family, is_bold)
+        if key not in font_cache:
+            font_cache[key] = ImageFont.truetype(font_path, font_size) if font_path else ImageFont.load_default(font_size)
+        return font_cache[key]
+    return get_font
+
+
+def binary_search_fit(get_font, text_content, rect_width, rect_height, max_font_size=100, font_family="gothic", is_bold=False):
+    """変更前の `_get_fitted_font_size` と同じ二分探索。戻り値は (フォントサイズ, 実測回数)。"""
+    if not text_content or rect_width <= 0 or rect_height <= 0:
+        return 0, 0
+    low, high, best_f_size, probes = 1, max_font_size, 1, 0
+    while low <= high:
+        mid = (low + high) // 2
+        font = get_font(mid, font_family, is_bold)
+        bbox = font.getbbox(text_content)
+        probes += 1
+        if bbox[2] - bbox[0] <= rect_width and bbox[3] - bbox[1] <= rect_height:
+            best_f_size = mid
+            low = mid + 1
+        else:
+            high = mid - 1
+    return best_f_size, probes
+
+
+def main():
+    font_path = sys.argv[1] if len(sys.argv) > 1 else None
+    get_font = make_font_loader(font_path)
+    rng = random.Random(0)
+    annotations = [(rng.choice(LABELS), rng.uniform(30, 400), rng.uniform(12, 120), rng.choice([40, 72, 100]))
+                   for _ in range(ANNOTATION_COUNT)]
+    for size in range(1, 101): # フォントのロード時間は両者で共通のため、事前に読み込んでおく
+        get_font(size)
+
+    # 変更前: 描画のたびに二分探索
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        old_results = [binary_search_fit(get_font, text, w, h, max_size) for text, w, h, max_size in annotations]
+    old_us = (time.perf_counter() - start) / (REPEAT * ANNOTATION_COUNT) * 1e6
+    old_probes = sum(probes for _, probes in old_results) / ANNOTATION_COUNT
+
+    # 変更後: 初回 (記憶なし) と2回目以降 (記憶あり)
+    fitter = FontFitter(get_font)
+    start = time.perf_counter()
+    new_results = [fitter.fit(text, w, h, max_size) for text, w, h, max_size in annotations]
+    first_us = (time.perf_counter() - start) / ANNOTATION_COUNT * 1e6
+    first_probes = fitter.probe_count / ANNOTATION_COUNT
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        for text, w, h, max_size in annotations:
+            fitter.fit(text, w, h, max_size)
+    repeat_us = (time.perf_counter() - start) / (REPEAT * ANNOTATION_COUNT) * 1e6
+
+    same = sum(1 for (old, _), new in zip(old_results, new_results) if old == new)
+    within_one = sum(1 for (old, _), new in zip(old_results, new_results) if abs(old - new) <= 1)
+    print(f"font: {font_path or 'Pillow default'}  annotations: {ANNOTATION_COUNT}")
+    print(f"binary search        : {old_us:8.1f} us/annotation  ({old_probes:.1f} probes)")
+    print(f"FontFitter (first)   : {first_us:8.1f} us/annotation  ({first_probes:.1f} probes)")
+    print(f"FontFitter (repeat)  : {repeat_us:8.1f} us/annotation  (0 probes)")
+    print(f"same size as binary search: {same}/{ANNOTATION_COUNT}, within 1pt: {within_one}/{ANNOTATION_COUNT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+ページ表示経路での画素データのコピー量のマイクロベンチマーク。
+
+レンダリング結果 (fitz.Pixmap) から表示用の画像を作るまでに確保されるメモリ量と処理時間を、
+変更前の処理 (pix.samples 経由の変換、ページ全体の複製へのオーバーレイ合成) と現在の処理について比較します。
+確保量は glibc の mallinfo2 で、各処理で作成したオブジェクトを保持したまま計測した使用中のヒープの増分です。
+
+計測の対象外:
+    - Tkへの転送 (ImageTk.PhotoImage の作成や paste)。ディスプレイが必要なため計測していません。
+      既存のPhotoImageへの paste による再確保の削減は、この結果には含まれません。
+    - 連続スクロール表示。アノテーションのあるページは現在も `_compose_page_image` でページ全体を
+      複製して合成するため、Pillow側のコピー量は変更前と同じです (参考として同じ処理を計測します)。
+
+使い方:
+    python benchmarks/bench_page_display.py [ズーム倍率]
+"""
+import ctypes
+import os
+import sys
+import time
+
+import fitz
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_editer_tool import pixmap_to_image # noqa: E402
+
+PAGE_SIZE = (595, 842) # A4 (pt)
+OVERLAY_RECT = (72, 72, 372, 192) # アノテーションを囲む範囲 (pt)
+REPEAT = 20
+
+
+class _MallInfo2(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_size_t) for name in
+                ("arena", "ordblks", "smblks", "hblks", "hblkhd", "usmblks", "fsmblks", "uordblks", "fordblks", "keepcost")]
+
+
+_libc = ctypes.CDLL("libc.so.6")
+_libc.mallinfo2.restype = _MallInfo2
+
+
+def heap_in_use():
+    """使用中のヒープ (brkの領域 + mmapで確保した領域) のバイト数を返します。"""
+    info = _libc.mallinfo2()
+    return info.uordblks + info.hblkhd
+
+
+def measure(func):
+    """func を実行し、(確保量のバイト数, 1回あたりの処理時間のミリ秒) を返します。確保量は戻り値を保持したまま計測します。"""
+    before = heap_in_use()
+    kept = func()
+    allocated = heap_in_use() - before
+    del kept
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        func()
+    return allocated, (time.perf_counter() - start) / REPEAT * 1e3
+
+
+def make_page_and_overlay(zoom):
+    """テキストを含む1ページのPixmapと、アノテーションを描画したRGBAオーバーレイを作成します。"""
+    doc = fitz.open()
+    page = doc.new_page(width=PAGE_SIZE[0], height=PAGE_SIZE[1])
+    for line in range(40):
+        page.insert_text((72, 80 + line * 18), f"Line {line} of the sample page for the display benchmark", fontsize=11)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    x0, y0, x1, y1 = (int(v * zoom) for v in OVERLAY_RECT)
+    overlay = Image.new("RGBA", (x1 - x0, y1 - y0), (255, 0, 0, 96))
+    return pix, ((x0, y0), overlay)
+
+
+def main():
+    zoom = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    pix, ((overlay_x, overlay_y), overlay) = make_page_and_overlay(zoom)
+    page_layer = pixmap_to_image(pix)
+
+    def old_convert(): # 変更前: samples (bytesのコピー) から変換
+        samples = pix.samples
+        return samples, Image.frombytes("RGB", (pix.width, pix.height), samples)
+
+    def new_convert(): # 現在: samples_mv (Pixmapのバッファを直接参照) から変換
+        return pixmap_to_image(pix)
+
+    def old_compose(): # 変更前の単ページ表示、現在の連続スクロール表示: ページ全体を複製して合成
+        composed = page_layer.copy()
+        composed.paste(overlay, (overlay_x, overlay_y), overlay)
+        return composed
+
+    def new_compose(): # 現在の単ページ表示: アノテーションの範囲だけを切り出して合成
+        region = page_layer.crop((overlay_x, overlay_y, overlay_x + overlay.width, overlay_y + overlay.height))
+        region.paste(overlay, (0, 0), overlay)
+        return region
+
+    def old_preview(): # 変更前の加工後プレビュー: samples から PIL Image を作成 (この後 PhotoImage に変換)
+        return old_convert()
+
+    def new_preview(): # 現在の加工後プレビュー: PPM形式のデータを作成 (この後 PhotoImage に直接読み込む)
+        return pix.tobytes("ppm")
+
+    print(f"page: {pix.width}x{pix.height} px (zoom {zoom}), annotation region: {overlay.width}x{overlay.height} px")
+    print(f"{'':36}{'before':>19}{'after':>22}")
+    for label, old_func, new_func in [("render -> PIL Image", old_convert, new_convert),
+                                      ("single page, annotation overlay", old_compose, new_compose),
+                                      ("continuous view, annotated page", old_compose, old_compose),
+                                      ("processed preview (before Tk)", old_preview, new_preview)]:
+        old_bytes, old_ms = measure(old_func)
+        new_bytes, new_ms = measure(new_func)
+        print(f"{label:36}{old_bytes / 2**20:8.2f} MB {old_ms:6.2f} ms{new_bytes / 2**20:8.2f} MB {new_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
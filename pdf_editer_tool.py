@@ -2,15 +2,1652 @@ import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog, Scale, HORIZONTAL, StringVar, OptionMenu, BooleanVar, Checkbutton
 from tkinter.colorchooser import askcolor
 import fitz  # PyMuPDF (PDF処理ライブラリ)
-from PIL import Image, ImageTk, ImageDraw, ImageFont # Pillow (画像処理ライブラリ)
+from PIL import Image, ImageTk, ImageDraw, ImageFont, ImageColor # Pillow (画像処理ライブラリ)
 import os # オペレーティングシステム機能 (ファイルパス操作など)
 import platform # 実行環境のプラットフォーム情報
 import io # インメモリバイナリI/O (画像データのバイト変換など)
 import copy # オブジェクトのコピー操作 (undo/redo用)
 import math # 数学関数 (楕円描画の計算など)
+import json # 設定ファイルの読み書き
+import bisect # 連続スクロール表示でY座標からページを求める二分探索
+import hashlib # ディスクキャッシュのキーに使うドキュメント内容のハッシュ
+import tempfile # ディスクキャッシュへのアトミックな書き込み用の一時ファイル
+import shutil # 追記保存の前に元のPDFファイルを保存先へコピー
+import queue # スレッド間での結果受け渡し (バックグラウンドレンダリング用)
+import threading # フォントディレクトリのバックグラウンド走査
+import weakref # 参照されなくなった挿入画像データの自動解放
+from collections import OrderedDict, deque # LRUキャッシュの順序管理、編集履歴の古い操作からの破棄
+from array import array # フリーハンドの点群をコンパクトに保持するための数値配列
+import multiprocessing # ワーカープロセスの起動方式の指定
+from concurrent.futures import ProcessPoolExecutor # バックグラウンドレンダリング用のプロセスプール
+from concurrent.futures.process import BrokenProcessPool # ワーカープロセスの異常終了の検出
 
 # TkDNDライブラリは使用しないため、関連するインポートとグローバル変数を削除
 
+CONFIG_FILE_PATH = os.path.join(os.path.expanduser("~"), ".pdf_editer_tool.json") # ユーザー設定 (キャッシュ上限など) の保存先
+
+# === ディスク上の永続レンダリングキャッシュ ===
+class DiskRenderCache:
+    """
+    レンダリング済みのページ画像をディスクに保存し、同じPDFを再度開いたときにラスタライズせずに表示できるようにするキャッシュ。
+    キーはPDFファイルの内容のハッシュ (SHA-256)、ページインデックス、ズーム倍率、回転角度です。
+    ファイル名ではなく内容で識別するため、同名の別ファイルや移動・コピーされたファイルでも正しく扱えます。
+
+    複数のプロセス (メインプロセス、レンダリングワーカー、他のアプリケーションインスタンス) から同時に使われるため、
+    書き込みは同じディレクトリ内の一時ファイルに書いてから `os.replace` で置き換え (読み手が書きかけのファイルを見ることはない)、
+    読み込み中や削除中に他のプロセスがファイルを消した場合は単にキャッシュミスとして扱います。
+    容量が上限を超えた場合は、最終アクセス時刻 (読み込み時に更新するmtime) が古いファイルから削除します。
+    """
+    FILE_EXTENSION = ".png"
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Args:
+            cache_dir (str): キャッシュファイルを保存するディレクトリ (存在しない場合は作成)。
+            max_bytes (int): キャッシュディレクトリ全体のバイト数の上限。
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._approx_bytes = None # 現在のおおよその合計バイト数 (初回書き込み時にディレクトリを走査して求める)
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path):
+        """
+        ファイルの内容のSHA-256ハッシュを計算します。
+
+        Args:
+            path (str): ファイルのパス。
+
+        Returns:
+            str: 16進数のハッシュ文字列。
+        """
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _entry_path(self, doc_hash, page_idx, zoom, rotation):
+        """キャッシュファイルのパスを返します (ドキュメントごとにサブディレクトリを分ける)。"""
+        return os.path.join(self.cache_dir, doc_hash, f"p{page_idx}_z{zoom:.6g}_r{rotation}{self.FILE_EXTENSION}")
+
+    def load(self, doc_hash, page_idx, zoom, rotation):
+        """
+        キャッシュされたページ画像を読み込みます。
+
+        Args:
+            doc_hash (str): `hash_file` で求めたドキュメントのハッシュ。
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            rotation (int): ページの回転角度。
+
+        Returns:
+            PIL.Image.Image or None: キャッシュされた画像。存在しない場合や読み込めない場合はNone。
+        """
+        path = self._entry_path(doc_hash, page_idx, zoom, rotation)
+        try:
+            with Image.open(path) as img:
+                img.load()
+            os.utime(path) # 最終アクセス時刻を更新 (削除順序の判定に使用)
+            return img
+        except FileNotFoundError:
+            return None
+        except Exception as e: # 壊れたファイルなどは削除して、次回はレンダリングし直す
+            print(f"Disk cache entry could not be read ({path}): {e}")
+            self._remove(path)
+            return None
+
+    def store(self, doc_hash, page_idx, zoom, rotation, pil_image):
+        """
+        ページ画像をキャッシュに保存します。書き込みに失敗してもレンダリング自体には影響しないため、例外は送出しません。
+
+        Args:
+            doc_hash (str): ドキュメントのハッシュ。
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            rotation (int): ページの回転角度。
+            pil_image (PIL.Image.Image): 保存するページ画像 (アノテーションを含まない素の画像)。
+        """
+        path = self._entry_path(doc_hash, page_idx, zoom, rotation)
+        temp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as f:
+                pil_image.save(f, format="PNG", compress_level=1) # 展開速度を優先した低い圧縮レベル
+            new_size = os.path.getsize(temp_path)
+            try:
+                old_size = os.path.getsize(path) # 同じキーのエントリを置き換える場合は、その分を差し引く
+            except OSError:
+                old_size = 0
+            os.replace(temp_path, path) # アトミックに置き換え (同じキーを同時に書いても壊れない)
+            temp_path = None
+            if self._approx_bytes is None:
+                self._approx_bytes = self._scan_total_bytes()
+            else:
+                self._approx_bytes += new_size - old_size
+            if self._approx_bytes > self.max_bytes:
+                self.evict()
+        except OSError as e:
+            print(f"Disk cache entry could not be written ({path}): {e}")
+        finally:
+            if temp_path:
+                self._remove(temp_path)
+
+    def evict(self):
+        """
+        ディスクキャッシュの合計サイズが上限の90%以下になるまで、最終アクセスが古いファイルから削除します。
+        (上限ちょうどまで削除すると、次の書き込みですぐに再び走査が必要になるため)
+        """
+        entries = []
+        for dir_path, _, file_names in os.walk(self.cache_dir):
+            for name in file_names:
+                if not name.endswith(self.FILE_EXTENSION):
+                    continue
+                path = os.path.join(dir_path, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError: # 他のプロセスが削除した
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total_bytes = sum(size for _, size, _ in entries)
+        target_bytes = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total_bytes <= target_bytes:
+                break
+            self._remove(path)
+            total_bytes -= size
+        self._approx_bytes = total_bytes
+
+    def _scan_total_bytes(self):
+        """キャッシュディレクトリ内のファイルの合計バイト数を求めます。"""
+        total_bytes = 0
+        for dir_path, _, file_names in os.walk(self.cache_dir):
+            for name in file_names:
+                try:
+                    total_bytes += os.path.getsize(os.path.join(dir_path, name))
+                except FileNotFoundError:
+                    continue
+        return total_bytes
+
+    @staticmethod
+    def _remove(path):
+        """ファイルを削除します。既に削除されている場合は何もしません。"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Disk cache entry could not be removed ({path}): {e}")
+
+
+# === バックグラウンドレンダリング (ワーカープロセス側) ===
+# PyMuPDFのレンダリングはGILを保持したまま実行されるため、スレッドではUIが固まってしまう。
+# そのため別プロセスで専用のfitz.Documentを開き、そこでラスタライズを行う。
+_worker_doc = None # ワーカープロセス内で保持する専用のDocumentハンドル
+_worker_disk_cache = None # ワーカープロセス内で使用するディスクキャッシュ (DiskRenderCache、無効の場合None)
+_worker_doc_hash = None # ディスクキャッシュのキーに使うドキュメントのハッシュ
+
+def _render_worker_init(pdf_path, disk_cache_dir=None, disk_cache_max_bytes=0, doc_hash=None):
+    """
+    ワーカープロセスの初期化関数。プロセス専用のDocumentハンドルを開きます。
+
+    Args:
+        pdf_path (str): レンダリング対象のPDFファイルのパス。
+        disk_cache_dir (str, optional): ディスクキャッシュのディレクトリ。Noneの場合はディスクキャッシュを使用しない。
+        disk_cache_max_bytes (int, optional): ディスクキャッシュの容量の上限 (バイト)。
+        doc_hash (str, optional): ディスクキャッシュのキーに使うドキュメントのハッシュ。
+    """
+    global _worker_doc, _worker_disk_cache, _worker_doc_hash
+    _worker_doc = fitz.open(pdf_path)
+    if disk_cache_dir and doc_hash:
+        try:
+            _worker_disk_cache = DiskRenderCache(disk_cache_dir, disk_cache_max_bytes)
+            _worker_doc_hash = doc_hash
+        except OSError as e:
+            print(f"Disk cache could not be opened in render worker: {e}")
+
+def _render_worker_render(page_idx, zoom, rotation):
+    """
+    ワーカープロセス内で1ページをラスタライズします。
+
+    Args:
+        page_idx (int): ページインデックス。
+        zoom (float): ズーム倍率。
+        rotation (int): ページの回転角度 (メインプロセス側のドキュメントの値)。
+
+    Returns:
+        tuple: (モード, 幅, 高さ, 画素データのbytes)。
+    """
+    if _worker_disk_cache:
+        cached_image = _worker_disk_cache.load(_worker_doc_hash, page_idx, zoom, rotation)
+        if cached_image is not None: # 以前に開いたときのレンダリング結果を再利用
+            return cached_image.mode, cached_image.width, cached_image.height, cached_image.tobytes()
+    page = _worker_doc[page_idx]
+    if page.rotation != rotation: # 回転はメイン側のメモリ上でのみ変更されているため、ここで合わせる
+        page.set_rotation(rotation)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    mode = "RGB" if pix.alpha == 0 else "RGBA"
+    if _worker_disk_cache:
+        _worker_disk_cache.store(_worker_doc_hash, page_idx, zoom, rotation, pixmap_to_image(pix))
+    return mode, pix.width, pix.height, pix.samples
+
+
+# === バックグラウンドレンダリング (メインプロセス側) ===
+class PageRenderWorker:
+    """
+    ページのラスタライズを別プロセスで行うワーカー。
+    ジョブは (ページインデックス, ズーム倍率, 回転角度) のキーで管理され、
+    完了した結果はTkのメインスレッドから `poll_results` で取り出します。
+    ワーカープロセスが異常終了した場合 (メモリ不足など) は以降のジョブを受け付けず、`is_broken` がTrueを返します。
+    """
+    def __init__(self, pdf_path, max_workers=1, disk_cache=None, doc_hash=None):
+        """
+        Args:
+            pdf_path (str): レンダリング対象のPDFファイルのパス。
+            max_workers (int, optional): ワーカープロセス数。デフォルトは1。
+            disk_cache (DiskRenderCache, optional): レンダリング結果を読み書きするディスクキャッシュ。
+                ワーカープロセス内では同じディレクトリと上限で別のインスタンスを作成して使用します。
+            doc_hash (str, optional): ディスクキャッシュのキーに使うドキュメントのハッシュ。
+        """
+        disk_cache_args = (disk_cache.cache_dir, disk_cache.max_bytes, doc_hash) if disk_cache and doc_hash else ()
+        # fork はTkの状態を子プロセスに引き継いでしまうため、全プラットフォームで spawn を使用
+        self._executor = ProcessPoolExecutor(max_workers=max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_render_worker_init, initargs=(pdf_path, *disk_cache_args))
+        self._futures = {} # 実行待ち/実行中のジョブ (キー -> Future)
+        self._results = queue.Queue() # 完了したジョブ (Futureのコールバックスレッドから投入される)
+        self._broken = False # ワーカープロセスが異常終了し、プールが使えなくなったか
+
+    def submit(self, page_idx, zoom, rotation):
+        """
+        ページのレンダリングジョブを投入します。同じキーのジョブが既にあれば何もしません。
+
+        Args:
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            rotation (int): ページの回転角度。
+        """
+        key = (page_idx, zoom, rotation)
+        if key in self._futures or self._broken:
+            return
+        try:
+            future = self._executor.submit(_render_worker_render, page_idx, zoom, rotation)
+        except BrokenProcessPool:
+            self._broken = True
+            return
+        self._futures[key] = future
+        future.add_done_callback(lambda f, k=key: self._results.put((k, f)))
+
+    def cancel_except(self, keys_to_keep):
+        """
+        指定されたキー以外の未着手ジョブをキャンセルします (ユーザーが別のページへ移動した場合など)。
+        既に実行中のジョブは止められないため、完了後に結果が破棄されます。
+
+        Args:
+            keys_to_keep (set): キャンセルせずに残すジョブのキー。
+        """
+        for key, future in list(self._futures.items()):
+            if key not in keys_to_keep and future.cancel():
+                del self._futures[key]
+
+    def has_pending(self):
+        """実行待ち/実行中のジョブが残っているかを返します。"""
+        return bool(self._futures)
+
+    def is_broken(self):
+        """ワーカープロセスが異常終了し、ジョブを実行できなくなったかを返します。"""
+        return self._broken
+
+    def poll_results(self):
+        """
+        完了したジョブの結果をまとめて取り出します。
+
+        Returns:
+            list: (キー, PIL Image) のタプルのリスト。レンダリングに失敗したジョブの画像はNone
+                (呼び出し側で同期的にレンダリングし直せるように含める)。キャンセルされたジョブは含まれません。
+        """
+        finished = []
+        while True:
+            try:
+                key, future = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if self._futures.get(key) is future:
+                del self._futures[key]
+            if future.cancelled():
+                continue
+            try:
+                mode, width, height, samples = future.result()
+            except Exception as e:
+                print(f"Background render error for page {key[0]}: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    self._broken = True
+                finished.append((key, None))
+                continue
+            finished.append((key, Image.frombytes(mode, (width, height), samples)))
+        return finished
+
+    def shutdown(self):
+        """未着手のジョブを破棄し、ワーカープロセスを終了させます (終了は待ちません)。"""
+        self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# === PDFの書き出し ===
+# アノテーションは書き出し前に、Tkやアプリの状態に依存しない描画命令 (タプルのリスト) に変換する。
+# 描画命令はプロセス間で受け渡せるため、ページ数の多いPDFはページ範囲ごとに別プロセスで並列に書き出せる。
+# 描画命令の形式 (座標はPDF座標、色は0.0-1.0のRGBタプル):
+#   ('redaction', 矩形)
+#   ('fill', 矩形, 色)                                マスク (黒塗り/白塗り)
+#   ('image', 矩形, キー, 画像ファイルのデータ)       キーが同じ画像は1つの画像オブジェクトを共有する
+#   ('rect' / 'oval', 矩形, 線の色, 線の太さ)
+#   ('line', 始点, 終点, 線の色, 線の太さ)
+#   ('polyline' / 'curve', 点の並び, 線の色, 線の太さ) 'curve' は点列を通る滑らかな曲線として描画する
+#                                                    点の並びは (x, y) を返すシーケンス (PointPairs など)
+#   ('text', ベースラインの始点, テキスト, フォントファイルのパス, フォントサイズ, 文字色)
+_export_fonts = {} # フォントファイルのパス -> fitz.Font (プロセス内で共有し、PDFには同じフォントとして1回だけ埋め込まれる)
+
+def _get_export_font(font_path):
+    """PDFに埋め込むフォントを返します。フォントファイルはプロセスごとに一度だけ読み込みます。"""
+    font = _export_fonts.get(font_path)
+    if font is None:
+        font = _export_fonts[font_path] = fitz.Font(fontfile=font_path)
+    return font
+
+def draw_export_ops(page, ops, image_xrefs):
+    """
+    描画命令をPDFのページに描画します (リダクションは先にまとめて適用し、ページ内容から削除します)。
+
+    Args:
+        page (fitz.Page): 描画先のページ。
+        ops (list): 描画命令のリスト (描画順)。
+        image_xrefs (dict): 画像のキー -> 描画先のPDFに埋め込み済みの画像のxref (同じPDFへの書き出しで共有する)。
+    """
+    redaction_rects = [op[1] for op in ops if op[0] == 'redaction']
+    if redaction_rects: # PyMuPDFのリダクションは他の描画より先に行う必要がある
+        for rect in redaction_rects:
+            page.add_redact_annot(fitz.Rect(rect), text=" ", fill=(0.75,0.75,0.75))
+        page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS) # リダクションを適用して内容を削除
+
+    # 図形とマスクはページごとに1つのShapeにまとめて描画し、1回のコミットで1つのコンテンツストリームとして追加する
+    # (画像やテキストを挟む場合のみ、重なり順を保つためにそこで区切ってコミットする)
+    shape = None
+    text_writer, text_color = None, None # 同じ色で続くテキストは1つのTextWriterでまとめて書き込む
+    for op in ops:
+        kind = op[0]
+        if kind == 'redaction':
+            continue # 適用済み
+        if text_writer is not None and (kind != 'text' or op[5] != text_color):
+            text_writer.write_text(page, color=text_color, overlay=True)
+            text_writer = None
+        if kind in ('text', 'image'):
+            if shape is not None:
+                shape.commit(overlay=True)
+                shape = None
+        elif shape is None:
+            shape = page.new_shape()
+
+        if kind == 'text':
+            _, origin, text, font_path, font_size, color = op
+            if text_writer is None:
+                text_writer, text_color = fitz.TextWriter(page.rect), color
+            text_writer.append(origin, text, font=_get_export_font(font_path), fontsize=font_size)
+        elif kind == 'image':
+            _, rect, image_key, image_data = op
+            try:
+                if image_key in image_xrefs:
+                    # 埋め込み済みの画像は参照のみ追加する (画像データの再埋め込みをしない)
+                    page.insert_image(fitz.Rect(rect), xref=image_xrefs[image_key], overlay=True)
+                else:
+                    image_xrefs[image_key] = page.insert_image(fitz.Rect(rect), stream=image_data, overlay=True)
+            except Exception as e_img:
+                print(f"Error inserting image to PDF page {page.number}: {e_img}") # 画像挿入エラーを出力
+        elif kind == 'fill':
+            shape.draw_rect(fitz.Rect(op[1]))
+            shape.finish(color=op[2], fill=op[2])
+        elif kind == 'rect':
+            shape.draw_rect(fitz.Rect(op[1]))
+            shape.finish(color=op[2], width=op[3])
+        elif kind == 'oval':
+            shape.draw_oval(fitz.Rect(op[1]))
+            shape.finish(color=op[2], width=op[3])
+        elif kind == 'line':
+            shape.draw_line(fitz.Point(op[1]), fitz.Point(op[2]))
+            shape.finish(color=op[3], width=op[4], closePath=False)
+        elif kind == 'polyline':
+            shape.draw_polyline(op[1])
+            shape.finish(color=op[2], width=op[3], closePath=False, lineCap=1, lineJoin=1)
+        elif kind == 'curve':
+            # 点列を通る滑らかな曲線 (ベジェ曲線の列) として出力
+            for p1, c1, c2, p2 in catmull_rom_to_bezier(op[1]):
+                shape.draw_bezier(p1, c1, c2, p2)
+            shape.finish(color=op[2], width=op[3], closePath=False, lineCap=1, lineJoin=1)
+    if shape is not None:
+        shape.commit(overlay=True)
+    if text_writer is not None:
+        text_writer.write_text(page, color=text_color, overlay=True)
+
+def subset_export_fonts(doc):
+    """
+    PDFに埋め込んだフォントを、使用している文字のみを含むサブセットに置き換えます (描画命令 'text' を使用した場合)。
+    失敗した場合はフォント全体を埋め込んだままにします。
+
+    Args:
+        doc (fitz.Document): 対象のPDF。
+    """
+    try:
+        doc.subset_fonts()
+    except Exception as e:
+        print(f"Font subsetting failed, embedding whole fonts: {e}")
+
+def insert_export_page(output_doc, source_doc, page_idx, rotation, ops, image_xrefs, pno=-1):
+    """
+    元のページの内容をコピーしたページを出力先のPDFに追加し、描画命令を描画します。
+
+    Args:
+        output_doc (fitz.Document): 出力先のPDF。
+        source_doc (fitz.Document): 元のPDF。
+        page_idx (int): 元のPDFのページインデックス。
+        rotation (int): ページの回転角度 (元のPDFのメモリ上の値)。
+        ops (list): 描画命令のリスト。
+        image_xrefs (dict): 画像のキー -> 出力先のPDFに埋め込み済みの画像のxref。
+        pno (int, optional): 出力先のPDFでの挿入位置 (このページの前に挿入する)。-1 の場合は末尾に追加します。
+    """
+    original_page = source_doc[page_idx]
+    # 元のページと同じサイズで新しいページを作成し、元のページの内容をコピー
+    new_page = output_doc.new_page(pno=pno, width=original_page.rect.width, height=original_page.rect.height)
+    new_page.show_pdf_page(new_page.rect, source_doc, page_idx)
+    new_page.set_rotation(rotation) # 元のページの回転を適用
+    draw_export_ops(new_page, ops, image_xrefs)
+
+def _export_worker_build(pdf_path, page_jobs):
+    """
+    ワーカープロセス内で、ページ範囲の分の書き出し結果を1つのPDFとして作成します。
+
+    Args:
+        pdf_path (str): 元のPDFファイルのパス。
+        page_jobs (list): (ページインデックス, 回転角度, 描画命令のリスト) のリスト (ページ順)。
+
+    Returns:
+        bytes: ページ範囲分のPDFデータ (最適化はせず、結合後にまとめて行う)。
+    """
+    source_doc = fitz.open(pdf_path)
+    part_doc = fitz.open()
+    try:
+        image_xrefs = {}
+        for page_idx, rotation, ops in page_jobs:
+            insert_export_page(part_doc, source_doc, page_idx, rotation, ops, image_xrefs)
+        return part_doc.tobytes()
+    finally:
+        part_doc.close()
+        source_doc.close()
+
+class PageExportMemo:
+    """
+    前回の書き出しで作成したPDFを、ページごとのフィンガープリント (アノテーションと回転の内容) とともに保持します。
+    次回の書き出しでは、フィンガープリントが変わったページのみを作り直して差し替え、
+    何も変わっていなければ前回のPDFデータをそのまま返せるようにします。
+    差し替えたページの古い内容はドキュメント内に残る (出力時の garbage で取り除かれる) ため、
+    差し替えたページ数がページ数を超えた場合は全ページを作り直します。
+    保持する内容 (作成したPDFと書き出し結果のPDFデータ) の合計が上限を超える場合は保持しません。
+    """
+    def __init__(self, max_bytes):
+        """
+        Args:
+            max_bytes (int): 保持する内容の合計サイズの上限 (バイト)。
+        """
+        self.max_bytes = max_bytes
+        self.source_doc = None # 書き出し元のドキュメント (別のPDFを開き直した場合は使用しない)
+        self.doc = None # 作成したPDF (出力のページ i が元のPDFのページ i に対応する)
+        self.image_xrefs = {} # 画像のキー -> self.doc に埋め込み済みの画像のxref
+        self.fingerprints = [] # ページごとのフィンガープリント
+        self.pdf_bytes = None # 前回の書き出し結果のPDFデータ
+        self.replaced_pages = 0 # 作成後に差し替えたページ数の累計
+
+    def clear(self):
+        """保持している書き出し結果を破棄します。"""
+        if self.doc is not None and not self.doc.is_closed:
+            self.doc.close()
+        self.__init__(self.max_bytes)
+
+    def release_pdf_bytes(self):
+        """
+        書き出し結果のPDFデータのみを破棄します (保存でファイルに書き込んだ後など)。
+        作成したPDFは保持し続けるため、次回の書き出しでは変更がなくてもそこから出力し直します。
+        """
+        self.pdf_bytes = None
+
+    def changed_pages(self, source_doc, fingerprints):
+        """
+        前回の書き出し結果から作り直す必要のあるページを返します。
+
+        Args:
+            source_doc (fitz.Document): 書き出し元のドキュメント。
+            fingerprints (list): 現在のページごとのフィンガープリント。
+
+        Returns:
+            list or None: 作り直すページのインデックスのリスト。全ページを作り直す必要がある場合はNone。
+        """
+        if self.doc is None or source_doc is not self.source_doc or len(fingerprints) != len(self.fingerprints):
+            return None
+        changed = [page_idx for page_idx, (old, new) in enumerate(zip(self.fingerprints, fingerprints)) if old != new]
+        if self.replaced_pages + len(changed) > len(fingerprints):
+            return None
+        return changed
+
+    def store(self, source_doc, doc, image_xrefs, fingerprints, pdf_bytes, doc_size, replaced_pages=0):
+        """
+        書き出し結果を保持します。doc_size と pdf_bytes の合計が上限を超える場合は、保持せずに doc を閉じます。
+
+        Args:
+            source_doc (fitz.Document): 書き出し元のドキュメント。
+            doc (fitz.Document): 作成したPDF (出力時の garbage でオブジェクト番号が振り直されていないもの)。
+            image_xrefs (dict): 画像のキー -> doc に埋め込み済みの画像のxref。
+            fingerprints (list): ページごとのフィンガープリント。
+            pdf_bytes (bytes): 書き出したPDFデータ。
+            doc_size (int): doc をそのまま出力した場合のサイズ (バイト。doc が使用するメモリ量の目安)。
+            replaced_pages (int, optional): 今回差し替えたページ数 (全ページを作成した場合は0)。
+        """
+        if doc_size + len(pdf_bytes) > self.max_bytes:
+            if doc is not self.doc and not doc.is_closed:
+                doc.close()
+            self.clear() # 大きなPDFでは、毎回全ページを作り直す
+            return
+        if self.doc is not None and self.doc is not doc and not self.doc.is_closed:
+            self.doc.close()
+        self.replaced_pages = self.replaced_pages + replaced_pages if self.doc is doc else 0
+        self.source_doc, self.doc, self.image_xrefs = source_doc, doc, image_xrefs
+        self.fingerprints, self.pdf_bytes = list(fingerprints), pdf_bytes
+
+# === バイト数上限付きLRUキャッシュ ===
+def pixmap_to_image(pix):
+    """
+    fitz.PixmapをPIL Imageに変換します。
+    pix.samplesは呼び出すたびに画素データ全体のbytesコピーを作るため、Pixmapのバッファを直接参照する
+    samples_mvから変換し、コピーをPillow側への1回だけに抑えます。
+
+    Args:
+        pix (fitz.Pixmap): 変換するピクセルマップ。
+
+    Returns:
+        PIL.Image.Image: 変換後の画像 ("RGB" または "RGBA")。
+    """
+    mode = "RGB" if pix.alpha == 0 else "RGBA"
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples_mv)
+
+def estimate_image_bytes(pil_image):
+    """
+    PIL Imageが占有するメモリ量の概算を返します。
+    Pillowは内部的にRGB画像も1画素4バイトで保持するため、多チャンネルの画像は4バイト/画素として計算します。
+
+    Args:
+        pil_image (PIL.Image.Image): 対象の画像。
+
+    Returns:
+        int: 概算のバイト数。
+    """
+    bytes_per_pixel = 1 if pil_image.mode in ("1", "L", "P") else 4
+    return pil_image.width * pil_image.height * bytes_per_pixel
+
+class LRUByteCache:
+    """
+    エントリ数ではなく合計バイト数の上限で管理するLRUキャッシュ。
+    OrderedDictで順序を管理するため、参照 (末尾への移動) と削除 (先頭から) はいずれもO(1)です。
+    ヒット・ミス・削除の回数と現在のバイト数を統計として保持します。
+    """
+    def __init__(self, max_bytes, sizeof=estimate_image_bytes):
+        """
+        Args:
+            max_bytes (int): キャッシュ全体のバイト数の上限。
+            sizeof (callable, optional): 値のバイト数を返す関数。デフォルトはPIL Image用の `estimate_image_bytes`。
+        """
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries = OrderedDict() # キー -> (値, バイト数)。先頭が最も古く使われていないエントリ
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(list(self._entries)) # 反復中に削除できるようキーのコピーを返す
+
+    def get(self, key, default=None):
+        """
+        値を取り出し、最近使われたエントリとして扱います。ヒット/ミスの統計に計上されます。
+
+        Args:
+            key: キャッシュキー。
+            default (optional): キーが存在しない場合に返す値。
+
+        Returns:
+            キャッシュされた値、または default。
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key, default=None):
+        """LRU順序や統計を変更せずに値を取り出します (暫定表示用の近似検索など)。"""
+        entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def put(self, key, value):
+        """
+        値を格納し、合計バイト数が上限を超えた分だけ最も古く使われていないエントリを削除します。
+        格納したばかりのエントリは、単独で上限を超える場合でも削除しません (表示中のページを保持するため)。
+
+        Args:
+            key: キャッシュキー。
+            value: 格納する値。
+        """
+        self.pop(key)
+        size = self._sizeof(value)
+        self._entries[key] = (value, size)
+        self.current_bytes += size
+        self._evict_to_budget(keep_key=key)
+
+    def pop(self, key, default=None):
+        """エントリを削除してその値を返します (削除統計には計上しません)。"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.current_bytes -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        """全てのエントリを削除します (統計はそのまま)。"""
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def set_max_bytes(self, max_bytes):
+        """
+        上限バイト数を変更し、超過分を直ちに削除します。
+
+        Args:
+            max_bytes (int): 新しい上限バイト数。
+        """
+        self.max_bytes = max_bytes
+        self._evict_to_budget()
+
+    def stats(self):
+        """
+        統計情報を返します。
+
+        Returns:
+            dict: entries, bytes, max_bytes, hits, misses, evictions をキーとする辞書。
+        """
+        return {"entries": len(self._entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _evict_to_budget(self, keep_key=None):
+        """合計バイト数が上限以下になるまで、最も古く使われていないエントリから削除します。"""
+        while self.current_bytes > self.max_bytes and self._entries:
+            oldest_key = next(iter(self._entries))
+            if oldest_key == keep_key:
+                break # 残っているのは格納したばかりのエントリのみ
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+# === フリーハンド線の処理 ===
+def simplify_polyline(points, tolerance):
+    """
+    Ramer-Douglas-Peucker法で折れ線の点を間引きます。
+    間引いた後の折れ線と元の点との距離が `tolerance` 以下に収まる範囲で、できるだけ少ない点を残します。
+    再帰を使わずスタックで処理するため、点数の多い線でも再帰の深さの上限に達しません。
+
+    Args:
+        points (list): (x, y) のリスト。
+        tolerance (float): 許容する最大のずれ (点と同じ座標系)。
+
+    Returns:
+        list: 間引いた後の (x, y) のリスト (始点と終点は必ず残ります)。
+    """
+    if len(points) < 3 or tolerance <= 0:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    tolerance_sq = tolerance * tolerance
+    while stack:
+        first, last = stack.pop()
+        (x0, y0), (x1, y1) = points[first], points[last]
+        dx, dy = x1 - x0, y1 - y0
+        length_sq = dx * dx + dy * dy
+        max_dist_sq, max_index = -1.0, first
+        for i in range(first + 1, last):
+            px, py = points[i]
+            if length_sq == 0: # 始点と終点が同じ位置の場合は、その点からの距離
+                dist_sq = (px - x0) ** 2 + (py - y0) ** 2
+            else: # 始点と終点を結ぶ直線からの距離の2乗
+                cross = dx * (py - y0) - dy * (px - x0)
+                dist_sq = cross * cross / length_sq
+            if dist_sq > max_dist_sq:
+                max_dist_sq, max_index = dist_sq, i
+        if max_dist_sq > tolerance_sq: # 許容範囲を超える点があれば、そこで分割してそれぞれを処理
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+def catmull_rom_to_bezier(points):
+    """
+    点列を通るCatmull-Romスプラインを、3次ベジェ曲線の列に変換します (PDFへの滑らかな曲線の出力用)。
+
+    Args:
+        points (list): 曲線が通る (x, y) のリスト (2点以上)。
+
+    Returns:
+        list: 各区間の (始点, 制御点1, 制御点2, 終点) のリスト。
+    """
+    segments = []
+    last_index = len(points) - 1
+    for i in range(last_index):
+        p0 = points[max(i - 1, 0)] # 端点では、端点自身を前後の点として扱う
+        p1, p2 = points[i], points[i + 1]
+        p3 = points[min(i + 2, last_index)]
+        control1 = (p1[0] + (p2[0] - p0[0]) / 6, p1[1] + (p2[1] - p0[1]) / 6)
+        control2 = (p2[0] - (p3[0] - p1[0]) / 6, p2[1] - (p3[1] - p1[1]) / 6)
+        segments.append((p1, control1, control2, p2))
+    return segments
+
+# === 挿入画像のデータ ===
+class ImageBlob:
+    """
+    挿入画像のファイルデータ1件分。`BlobStore` が内容のハッシュごとに1つだけ作成し、
+    同じ画像を参照する全てのアノテーション (ペーストしたもの、元に戻す履歴内の複製を含む) で共有します。
+    bytes と同様に不変として扱い、アノテーションを複製しても参照がコピーされるだけです。
+    """
+    __slots__ = ("blob_id", "data", "__weakref__")
+
+    def __init__(self, blob_id, data):
+        """
+        Args:
+            blob_id (str): 内容のハッシュ (16進文字列)。
+            data (bytes): 画像ファイルのデータ。
+        """
+        self.blob_id = blob_id
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __copy__(self):
+        return self # 不変なので複製せず共有する
+
+    def __deepcopy__(self, memo):
+        return self
+
+class BlobStore:
+    """
+    挿入画像のデータを内容のハッシュで管理するストア。同じ内容の画像は何度追加しても1つの `ImageBlob` を共有します。
+    ストアは弱参照で保持するため、参照カウントはアノテーションなどからの参照数そのものになり、
+    どこからも参照されなくなった画像データは自動的に解放されます。
+    """
+    DIGEST_SIZE = 16 # 内容のハッシュ (blake2b) のバイト数
+
+    def __init__(self):
+        self._blobs = weakref.WeakValueDictionary() # 内容のハッシュ -> ImageBlob
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def add(self, data):
+        """
+        画像データを登録し、共有される `ImageBlob` を返します。同じ内容が登録済みならそれを返します。
+
+        Args:
+            data (bytes): 画像ファイルのデータ。
+
+        Returns:
+            ImageBlob: 画像データへの参照。
+        """
+        blob_id = hashlib.blake2b(data, digest_size=self.DIGEST_SIZE).hexdigest()
+        blob = self._blobs.get(blob_id)
+        if blob is None:
+            blob = ImageBlob(blob_id, data)
+            self._blobs[blob_id] = blob
+        return blob
+
+    def get(self, blob_id):
+        """内容のハッシュから `ImageBlob` を返します (参照されていない場合は None)。"""
+        return self._blobs.get(blob_id)
+
+    def total_bytes(self):
+        """保持している画像データの合計バイト数を返します。"""
+        return sum(len(blob) for blob in list(self._blobs.values()))
+
+# === アノテーションのレコード ===
+_MISSING = object() # 辞書互換の get でキーがないことを表す番兵
+
+class PointPairs:
+    """
+    array('d') に [x0, y0, x1, y1, ...] の並びで保持した点群を、(x, y) のシーケンスとして参照する読み取り専用のビュー。
+    (x, y) のタプルは参照したときに1つずつ作成し、点群全体のタプルのリストは作りません。
+    描画命令としてワーカープロセスに受け渡せるよう、モジュールのトップレベルに定義しています。
+    """
+    __slots__ = ("flat",)
+
+    def __init__(self, flat):
+        """
+        Args:
+            flat (array): [x0, y0, x1, y1, ...] の並びの array('d')。
+        """
+        self.flat = flat
+
+    def __len__(self):
+        return len(self.flat) // 2
+
+    def __getitem__(self, index):
+        point_count = len(self)
+        if index < 0:
+            index += point_count
+        if not 0 <= index < point_count:
+            raise IndexError(index)
+        return self.flat[2 * index], self.flat[2 * index + 1]
+
+    def __iter__(self):
+        values = iter(self.flat)
+        return zip(values, values) # 同じイテレータから x, y の順に取り出す
+
+class ShapeData:
+    """
+    図形固有データ (直線の始点・終点、フリーハンドの点群) を保持するレコード。
+    点群はタプルのリストではなく array('d') に [x0, y0, x1, y1, ...] の並びで保持し、1点あたり16バイトに抑えます。
+    従来の辞書と同じく shape_data['points'] / .get('start') / 'end' in shape_data の形で読み書きできます
+    ('points' の読み出しは (x, y) タプルのリストを返し、代入は点の並びまたは array('d') を受け付けます)。
+    描画や書き出しなど点群を毎回読む処理では、タプルのリストを作らない `point_pairs` / `transformed_points` を使用します。
+    """
+    __slots__ = ("start", "end", "point_array")
+    KEYS = ("start", "end", "points")
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key == "points":
+            point_array = getattr(self, "point_array", None)
+            return default if point_array is None else list(zip(point_array[0::2], point_array[1::2]))
+        if key not in ("start", "end"):
+            return default
+        return getattr(self, key, default)
+
+    def __setitem__(self, key, value):
+        if key == "points":
+            self.point_array = value if isinstance(value, array) else array('d', (v for point in value for v in point[:2]))
+        elif key in ("start", "end"):
+            setattr(self, key, tuple(value))
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        delattr(self, "point_array" if key == "points" else key)
+
+    def __contains__(self, key):
+        return key in self.KEYS and hasattr(self, "point_array" if key == "points" else key)
+
+    def keys(self):
+        return [key for key in self.KEYS if key in self]
+
+    def __deepcopy__(self, memo):
+        shape_copy = ShapeData()
+        for name in self.__slots__:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                setattr(shape_copy, name, array('d', value) if name == "point_array" else value) # 座標のタプルは不変なので共有
+        return shape_copy
+
+    @classmethod
+    def from_dict(cls, data):
+        """従来の辞書形式 ({'start': ..., 'end': ...} / {'points': [...]}) から作成します。"""
+        if isinstance(data, cls):
+            return data
+        shape = cls()
+        for key, value in (data or {}).items():
+            shape[key] = value
+        return shape
+
+    def to_dict(self):
+        """従来の辞書形式に変換します。"""
+        return {key: self[key] for key in self.keys()}
+
+    def point_pairs(self):
+        """点群を (x, y) の並びとして参照するビュー (PointPairs) を返します。点群がない場合は空のビュー。"""
+        point_array = getattr(self, "point_array", None)
+        return PointPairs(array('d') if point_array is None else point_array)
+
+    def transformed_points(self, scale_x, scale_y, offset_x, offset_y):
+        """
+        点群の各点を (x * scale_x + offset_x, y * scale_y + offset_y) に変換した array('d') を返します (移動・拡大縮小用)。
+        点群がない場合は空の配列を返します。
+        """
+        point_array = getattr(self, "point_array", None) or array('d')
+        transformed = array('d', point_array)
+        transformed[0::2] = array('d', [x * scale_x + offset_x for x in point_array[0::2]])
+        transformed[1::2] = array('d', [y * scale_y + offset_y for y in point_array[1::2]])
+        return transformed
+
+    def fingerprint(self):
+        """内容を比較するためのタプルを返します (点群はバイト列にします)。"""
+        point_array = getattr(self, "point_array", None)
+        return (getattr(self, "start", None), getattr(self, "end", None),
+                None if point_array is None else point_array.tobytes())
+
+
+class Annotation:
+    """
+    アノテーション1件分のレコード。__slots__ により辞書よりも小さく、ディープコピーも高速です。
+    既存のコードとの互換性のため、従来の辞書と同じく ann['coords'] / ann.get('type') / 'image_blob' in ann /
+    del ann['font_size'] / ann.update({...}) の形で読み書きできます (値が設定されていないスロットは「キーなし」として扱います)。
+    マスクからテキストへの変更などアノテーションの種類はその場で切り替わるため、種類ごとのクラスではなく
+    全種類の項目を持つ1つのクラスとしています。
+    """
+    FIELDS = ("page_idx", "coords", "type", "canvas_items", "shape_kind", "line_color", "line_thickness",
+              "shape_specific_data", "text_content", "font_size", "font_family", "font_bold", "text_color", "image_blob")
+    __slots__ = FIELDS + ("_extra",) # _extra: 上記以外のキー (辞書。通常は未設定)
+    # image_blob: 挿入画像のデータ (ImageBlob)。画像のバイト列を直接持たず、BlobStore で共有されるデータを参照する
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            return getattr(self, key, default)
+        return getattr(self, "_extra", {}).get(key, default)
+
+    def __setitem__(self, key, value):
+        if key == "shape_specific_data":
+            value = ShapeData.from_dict(value)
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if not hasattr(self, "_extra"):
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        if key in self.FIELDS:
+            delattr(self, key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        if key in self.FIELDS:
+            return hasattr(self, key)
+        return key in getattr(self, "_extra", {})
+
+    def keys(self):
+        return [key for key in self.FIELDS if hasattr(self, key)] + list(getattr(self, "_extra", {}))
+
+    def update(self, values):
+        """辞書の update と同様に、複数の項目をまとめて設定します。"""
+        for key, value in values.items():
+            self[key] = value
+
+    def __deepcopy__(self, memo):
+        ann_copy = Annotation()
+        for name in self.FIELDS:
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING:
+                setattr(ann_copy, name, value) # 座標のタプルや画像データ (ImageBlob) など不変の値は共有する
+        # 変更され得る値のみ複製する
+        if hasattr(self, "canvas_items"):
+            ann_copy.canvas_items = dict(self.canvas_items) # CanvasアイテムID(整数) の辞書
+        if hasattr(self, "shape_specific_data"):
+            ann_copy.shape_specific_data = self.shape_specific_data.__deepcopy__(memo)
+        if hasattr(self, "_extra"):
+            ann_copy._extra = copy.deepcopy(self._extra, memo)
+        return ann_copy
+
+    def restore(self, snapshot):
+        """
+        `copy.deepcopy` で取っておいた複製の内容で、このレコードの項目をその場で置き換えます。
+        オブジェクト自体は変わらないため、選択状態や索引からの参照はそのまま有効です。
+        CanvasアイテムIDは表示中のものを維持します。
+
+        Args:
+            snapshot (Annotation): 復元する内容 (複製してから取り込むため、以降の編集で変更されることはありません)。
+        """
+        restored = copy.deepcopy(snapshot)
+        for name in self.FIELDS + ("_extra",):
+            if name == "canvas_items":
+                continue
+            value = getattr(restored, name, _MISSING)
+            if value is not _MISSING:
+                setattr(self, name, value)
+            elif hasattr(self, name):
+                delattr(self, name)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        従来の辞書形式のアノテーションから作成します。
+
+        Args:
+            data (dict or Annotation): 辞書形式のアノテーション (Annotationの場合はそのまま返します)。
+
+        Returns:
+            Annotation: 作成したレコード。
+        """
+        if isinstance(data, cls):
+            return data
+        ann = cls()
+        for key, value in data.items():
+            if key == "canvas_items" and not value:
+                continue # 空のCanvasアイテム情報は保持しない (描画時に作成される)
+            ann[key] = value
+        return ann
+
+    def to_dict(self):
+        """従来の辞書形式に変換します (図形固有データも辞書に戻します)。"""
+        data = {key: self[key] for key in self.keys()}
+        if "shape_specific_data" in data:
+            data["shape_specific_data"] = data["shape_specific_data"].to_dict()
+        return data
+
+    def fingerprint(self):
+        """
+        書き出し結果に影響する項目の値をまとめたタプルを返します (書き出し結果を再利用できるかの判定に使用)。
+        ページインデックスとCanvasアイテムIDは含みません。挿入画像はデータではなくIDで比較します。
+        """
+        values = []
+        for name in self.FIELDS:
+            if name in ("page_idx", "canvas_items"):
+                continue
+            value = getattr(self, name, _MISSING)
+            if value is not _MISSING and name == "shape_specific_data":
+                value = value.fingerprint()
+            elif value is not _MISSING and name == "image_blob":
+                value = value.blob_id
+            values.append(value)
+        return tuple(values)
+
+# === アノテーションの索引 ===
+class AnnotationStore:
+    """
+    アノテーション (辞書) を保持し、ページごとの索引と、ページ内を格子状に区切った空間索引を管理します。
+    描画・当たり判定・PDF生成で、全アノテーションを走査せずにページ単位や矩形範囲で取得できます。
+    リストと同様に append / remove / clear / 反復 / len が使えます (remove は同一オブジェクトで判定します)。
+    アノテーションの 'coords' や 'page_idx' を書き換えた場合は、`update` を呼んで索引を更新する必要があります。
+    """
+    CELL_SIZE = 64 # 空間索引の格子の一辺 (PDF座標、ポイント)
+
+    def __init__(self, annotations=()):
+        """
+        Args:
+            annotations (iterable, optional): 初期状態のアノテーション。
+        """
+        self._sequence = 0 # 追加順の通し番号 (描画順を追加順に保つため)
+        self._entries = {} # id(アノテーション) -> (通し番号, アノテーション, 索引したページ, 索引したセルのリスト)
+        self._pages = {} # ページインデックス -> {id(アノテーション): アノテーション} (追加順)
+        self._grid = {} # (ページインデックス, セルX, セルY) -> {id(アノテーション): アノテーション}
+        for ann in annotations:
+            self.append(ann)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """全アノテーションを追加順に返します (反復中に変更できるよう、コピーを反復します)。"""
+        return iter([entry[1] for entry in sorted(self._entries.values(), key=lambda entry: entry[0])])
+
+    def __contains__(self, ann):
+        return id(ann) in self._entries
+
+    def _cells_for(self, page_idx, coords):
+        """矩形 (PDF座標) が重なる格子セルのキーのリストを返します。"""
+        x0, x1 = sorted((coords[0], coords[2]))
+        y0, y1 = sorted((coords[1], coords[3]))
+        size = self.CELL_SIZE
+        return [(page_idx, cell_x, cell_y)
+                for cell_x in range(int(math.floor(x0 / size)), int(math.floor(x1 / size)) + 1)
+                for cell_y in range(int(math.floor(y0 / size)), int(math.floor(y1 / size)) + 1)]
+
+    def append(self, ann, sequence=None):
+        """
+        アノテーションを追加して索引に登録します。
+
+        Args:
+            ann: 追加するアノテーション。
+            sequence (int, optional): 描画順の通し番号。削除したアノテーションを元の描画順に戻す場合に
+                `sequence_of` で取得しておいた値を指定します。省略時は最前面に追加します。
+        """
+        ann_id = id(ann)
+        if ann_id in self._entries:
+            return
+        page_idx = ann['page_idx']
+        cells = self._cells_for(page_idx, ann['coords'])
+        if sequence is None:
+            sequence = self._sequence
+            self._sequence += 1
+        self._entries[ann_id] = (sequence, ann, page_idx, cells)
+        self._pages.setdefault(page_idx, {})[ann_id] = ann
+        for cell in cells:
+            self._grid.setdefault(cell, {})[ann_id] = ann
+
+    def remove(self, ann):
+        """
+        アノテーションを削除します。
+
+        Raises:
+            ValueError: アノテーションが登録されていない場合。
+        """
+        entry = self._entries.pop(id(ann), None)
+        if entry is None:
+            raise ValueError("annotation is not in the store")
+        _, _, page_idx, cells = entry
+        page_anns = self._pages[page_idx]
+        del page_anns[id(ann)]
+        if not page_anns:
+            del self._pages[page_idx]
+        for cell in cells:
+            cell_anns = self._grid[cell]
+            del cell_anns[id(ann)]
+            if not cell_anns:
+                del self._grid[cell]
+
+    def update(self, ann):
+        """座標またはページが変更されたアノテーションの索引を更新します (描画順は変わりません)。"""
+        entry = self._entries.get(id(ann))
+        if entry is None:
+            return
+        self.remove(ann)
+        self.append(ann, sequence=entry[0]) # 元の追加順を維持
+
+    def sequence_of(self, ann):
+        """アノテーションの描画順の通し番号を返します (登録されていない場合は None)。"""
+        entry = self._entries.get(id(ann))
+        return entry[0] if entry else None
+
+    def clear(self):
+        """全てのアノテーションを削除します。"""
+        self._entries.clear()
+        self._pages.clear()
+        self._grid.clear()
+
+    def to_list(self):
+        """全アノテーションを追加順に並べたリストを返します。"""
+        return list(self)
+
+    def pages(self):
+        """アノテーションが1つ以上あるページのインデックスを昇順で返します。"""
+        return sorted(self._pages)
+
+    def on_page(self, page_idx):
+        """
+        指定ページのアノテーションを追加順に返します。
+
+        Args:
+            page_idx (int): ページインデックス。
+
+        Returns:
+            list: アノテーションのリスト。
+        """
+        page_anns = self._pages.get(page_idx)
+        if not page_anns:
+            return []
+        return sorted(page_anns.values(), key=lambda ann: self._entries[id(ann)][0])
+
+    def query_rect(self, page_idx, rect):
+        """
+        指定ページで、矩形 (PDF座標) と重なるアノテーションを追加順に返します。
+
+        Args:
+            page_idx (int): ページインデックス。
+            rect (tuple): 検索範囲 (x0, y0, x1, y1)。
+
+        Returns:
+            list: 矩形と重なる (境界で接するものを含む) アノテーションのリスト。
+        """
+        qx0, qx1 = sorted((rect[0], rect[2]))
+        qy0, qy1 = sorted((rect[1], rect[3]))
+        if page_idx not in self._pages:
+            return []
+        candidates = {}
+        for cell in self._cells_for(page_idx, (qx0, qy0, qx1, qy1)):
+            cell_anns = self._grid.get(cell)
+            if cell_anns:
+                candidates.update(cell_anns)
+        hits = []
+        for ann in candidates.values():
+            coords = ann['coords']
+            if min(coords[0], coords[2]) <= qx1 and max(coords[0], coords[2]) >= qx0 and \
+               min(coords[1], coords[3]) <= qy1 and max(coords[1], coords[3]) >= qy0:
+                hits.append(ann)
+        hits.sort(key=lambda ann: self._entries[id(ann)][0])
+        return hits
+
+    def query_point(self, page_idx, x, y, tolerance=0):
+        """
+        指定ページで、点 (PDF座標) を含むアノテーションを追加順に返します。
+
+        Args:
+            page_idx (int): ページインデックス。
+            x (float): X座標。
+            y (float): Y座標。
+            tolerance (float, optional): 判定の許容誤差 (PDF座標)。デフォルトは0。
+
+        Returns:
+            list: 点を含むアノテーションのリスト。
+        """
+        return self.query_rect(page_idx, (x - tolerance, y - tolerance, x + tolerance, y + tolerance))
+
+# === 編集履歴 (元に戻す/やり直し) ===
+class EditHistory:
+    """
+    元に戻す/やり直しの履歴。操作のたびに全アノテーションを複製するのではなく、その操作で変わった部分 (変更) だけを記録します。
+    1回の操作は変更のリストで、各変更は次のいずれかのタプルです。
+
+      ('add', アノテーション, 描画順)                アノテーションの追加
+      ('remove', アノテーション, 描画順)             アノテーションの削除
+      ('modify', アノテーション, 変更前, 変更後)     アノテーションの項目の変更 (変更前/後は copy.deepcopy による複製)
+      ('rotate', ページインデックス, 変更前, 変更後)  ページの回転角度の変更
+
+    履歴の深さは件数ではなく記録した内容のおおよそのバイト数で制限し、上限を超えると古い操作から破棄します
+    (直前の1操作は上限を超えていても保持します)。
+    """
+    ENTRY_OVERHEAD_BYTES = 256 # 1操作・1変更あたりの管理情報のおおよそのバイト数
+
+    def __init__(self, max_bytes):
+        """
+        Args:
+            max_bytes (int): 履歴全体のおおよそのメモリ上限 (バイト)。
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._undo = deque() # (変更のリスト, 操作時のページインデックス, バイト数) の並び (末尾が最新)
+        self._redo = [] # 元に戻した操作 (末尾が直近に元に戻したもの)
+
+    @classmethod
+    def _annotation_bytes(cls, ann, shared_image=None):
+        """アノテーションの複製が占めるおおよそのバイト数 (`shared_image` と同じ画像データは数えない)。"""
+        size = cls.ENTRY_OVERHEAD_BYTES + len(ann.get('text_content') or "")
+        shape_data = ann.get('shape_specific_data')
+        if shape_data is not None and getattr(shape_data, "point_array", None) is not None:
+            size += shape_data.point_array.itemsize * len(shape_data.point_array)
+        image_blob = ann.get('image_blob')
+        if image_blob is not None and image_blob is not shared_image:
+            size += len(image_blob)
+        return size
+
+    @classmethod
+    def _changes_bytes(cls, changes):
+        """
+        変更のリストが履歴として占めるおおよそのバイト数を見積もります。
+        画像データ (ImageBlob) は表示中のアノテーションと共有されるため、履歴だけが保持することになるもの
+        (削除したアノテーションの画像、変更で置き換えられた画像) のみを数えます。
+        """
+        size = cls.ENTRY_OVERHEAD_BYTES
+        for change in changes:
+            kind = change[0]
+            if kind == 'remove':
+                size += cls._annotation_bytes(change[1])
+            elif kind == 'modify':
+                _, ann, before, after = change
+                size += cls._annotation_bytes(before, shared_image=after.get('image_blob'))
+                size += cls._annotation_bytes(after, shared_image=ann.get('image_blob'))
+            else:
+                size += cls.ENTRY_OVERHEAD_BYTES
+        return size
+
+    def record(self, changes, page_idx):
+        """
+        操作を1件記録します。やり直しの履歴は破棄されます。
+
+        Args:
+            changes (list): 変更のリスト (空の場合は何もしません)。
+            page_idx (int): 操作時に表示していたページ (元に戻す/やり直すときにこのページを表示します)。
+        """
+        if not changes:
+            return
+        self._drop_redo()
+        entry = (list(changes), page_idx, self._changes_bytes(changes))
+        self._undo.append(entry)
+        self.total_bytes += entry[2]
+        while self.total_bytes > self.max_bytes and len(self._undo) > 1:
+            self.total_bytes -= self._undo.popleft()[2] # 最も古い操作から破棄
+
+    def _drop_redo(self):
+        for entry in self._redo:
+            self.total_bytes -= entry[2]
+        self._redo.clear()
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def pop_undo(self):
+        """
+        直近の操作を取り出し、やり直しの履歴に移します。
+
+        Returns:
+            tuple or None: (変更のリスト, 操作時のページインデックス)。元に戻せる操作がなければ None。
+        """
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        self._redo.append(entry)
+        return entry[0], entry[1]
+
+    def pop_redo(self):
+        """
+        直近に元に戻した操作を取り出し、元に戻す履歴に戻します。
+
+        Returns:
+            tuple or None: (変更のリスト, 操作時のページインデックス)。やり直せる操作がなければ None。
+        """
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        self._undo.append(entry)
+        return entry[0], entry[1]
+
+    def clear(self):
+        """全ての履歴を破棄します。"""
+        self._undo.clear()
+        self._redo.clear()
+        self.total_bytes = 0
+
+# === フォントの検索と読み込み ===
+class FontRegistry:
+    """
+    フォントファミリーの内部名と太字指定から、使用するフォントファイルを解決して読み込みます。
+    - 起動時にバックグラウンドスレッドでフォントディレクトリを走査し、ファイル名からパスへの索引を作成して、
+      全てのファミリー・ウェイトのフォントファイルを一度だけ解決します
+      (Linuxではfontconfigの標準と同じ XDG_DATA_HOME, ~/.fonts, XDG_DATA_DIRS 配下の fonts を走査します)。
+    - サイズごとのフォントはファイルのパスから読み込みます (FreeTypeがファイルを必要な部分だけ読むため、
+      CJKフォントのような大きなファイルでも、サイズごとにファイル全体のコピーをメモリに持ちません)。
+    - サイズごとのフォントオブジェクトは件数上限付きのLRUキャッシュで保持します。
+    - 走査の完了前は完了を待たず、絶対パスの候補 (無ければPillowのデフォルトフォント) で仮に解決します。
+      仮に解決したパスとフォントは記憶しないため、走査の完了後は索引から解決したフォントが使われます。
+    """
+    # プラットフォームとフォントファミリー、太字指定に応じたフォントパス候補
+    # 各フォントファミリーに対して、[通常フォントパス候補, 太字フォントパス候補] の形式で定義
+    # (ファイル名のみの候補は、フォントディレクトリの走査結果から探す)
+    FONT_CANDIDATES = {
+        "Windows": {
+            "msgothic": (["C:/Windows/Fonts/msgothic.ttc", "arial.ttf"], ["C:/Windows/Fonts/msgothic.ttc", "arialbd.ttf"]), # TTCの場合、太字は同じファイル内の別indexの可能性もあるが、Pillowのtruetypeはindex指定可能
+            "msmincho": (["C:/Windows/Fonts/msmincho.ttc", "arial.ttf"], ["C:/Windows/Fonts/msmincho.ttc", "arialbd.ttf"]),
+            "meiryo_ui": (["C:/Windows/Fonts/meiryo.ttc", "arial.ttf"], ["C:/Windows/Fonts/meiryob.ttc", "arialbd.ttf"]),
+            "yu_gothic_ui": (["C:/Windows/Fonts/YuGothR.ttc", "C:/Windows/Fonts/YuGothic-Regular.ttf", "arial.ttf"], ["C:/Windows/Fonts/YuGothB.ttc", "C:/Windows/Fonts/YuGothic-Bold.ttf", "arialbd.ttf"]),
+            "gothic": (["C:/Windows/Fonts/meiryo.ttc", "arial.ttf"], ["C:/Windows/Fonts/meiryob.ttc", "arialbd.ttf"]), # デフォルトゴシック
+            "mincho": (["C:/Windows/Fonts/YuMincho.ttc", "arial.ttf"], ["C:/Windows/Fonts/YuMinb.ttc", "arialbd.ttf"])  # デフォルト明朝
+        },
+        "Darwin": { # macOS
+            "gothic": (["/System/Library/Fonts/ヒラギノ角ゴシック W4.ttc", "Arial Unicode.ttf"], ["/System/Library/Fonts/ヒラギノ角ゴシック W7.ttc", "Arial Bold.ttf"]), # ヒラギノはウェイトで太さを表現
+            "mincho": (["/System/Library/Fonts/ヒラギノ明朝 ProN W3.ttc", "Arial Unicode.ttf"], ["/System/Library/Fonts/ヒラギノ明朝 ProN W6.ttc", "Arial Bold.ttf"]),
+            "msgothic": (["Arial Unicode.ttf"], ["Arial Bold.ttf"]), # macOSにMSフォントは標準搭載なし、Arialで代替
+            "msmincho": (["Arial Unicode.ttf"], ["Arial Bold.ttf"]),
+            "meiryo_ui": (["Arial Unicode.ttf"], ["Arial Bold.ttf"]), # Meiryoも標準搭載なし
+            "yu_gothic_ui": (["/System/Library/Fonts/YuGothic-Regular.otf", "Arial Unicode.ttf"], ["/System/Library/Fonts/YuGothic-Bold.otf", "Arial Bold.ttf"]) # macOSにも游ゴシックは含まれる
+        },
+        "Linux": { # Linux (フォントは環境依存性が高い)
+            "gothic": (["NotoSansCJK-Regular.ttc", "ipag.ttf", "DejaVuSans.ttf"], ["NotoSansCJK-Bold.ttc", "ipagp.ttf", "DejaVuSans-Bold.ttf"]),
+            "mincho": (["NotoSerifCJK-Regular.ttc", "ipam.ttf", "DejaVuSans.ttf"], ["NotoSerifCJK-Bold.ttc", "ipamp.ttf", "DejaVuSans-Bold.ttf"]),
+            "msgothic": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"]), # MSフォントの代替
+            "msmincho": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"]),
+            "meiryo_ui": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"]),
+            "yu_gothic_ui": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"])
+        }
+    }
+    FONT_FILE_EXTENSIONS = (".ttf", ".ttc", ".otf", ".otc")
+    PRELOAD_FONT_SIZE = 12 # 走査完了後に既定のフォントを試しに読み込む際のフォントサイズ
+    MAX_CACHED_FONTS = 64 # サイズごとのフォントオブジェクトを保持する最大件数
+
+    def __init__(self):
+        self._file_index = {} # フォントファイル名 (小文字) -> パス
+        self._font_paths = {} # (フォントファミリー, 太字) -> 解決したパス (見つからない場合はNone)
+        self._fonts = OrderedDict() # (フォントサイズ, フォントファミリー, 太字) -> フォントオブジェクト (LRU順)
+        self._lock = threading.Lock() # 走査スレッドとメインスレッドで共有する辞書の保護用
+        self._index_ready = threading.Event() # 走査と解決が完了したか
+
+    def start_scan(self):
+        """フォントディレクトリの走査とフォントファイルの解決をバックグラウンドスレッドで開始します。"""
+        threading.Thread(target=self._scan, name="font-scan", daemon=True).start()
+
+    def is_ready(self):
+        """フォントディレクトリの走査とフォントファイルの解決が完了しているかを返します。"""
+        return self._index_ready.is_set()
+
+    @staticmethod
+    def font_directories():
+        """
+        プラットフォームごとのフォントディレクトリの一覧を返します。
+
+        Returns:
+            list: フォントディレクトリのパスのリスト (存在しないものも含む)。
+        """
+        system = platform.system()
+        if system == "Windows":
+            directories = [os.path.join(os.environ.get("WINDIR", "C:/Windows"), "Fonts")]
+            if os.environ.get("LOCALAPPDATA"): # ユーザー単位でインストールされたフォント
+                directories.append(os.path.join(os.environ["LOCALAPPDATA"], "Microsoft", "Windows", "Fonts"))
+        elif system == "Darwin":
+            directories = ["/System/Library/Fonts", "/System/Library/Fonts/Supplemental", "/Library/Fonts", "~/Library/Fonts"]
+        else: # fontconfigの標準のディレクトリ
+            directories = [os.path.join(os.environ.get("XDG_DATA_HOME") or "~/.local/share", "fonts"), "~/.fonts"]
+            data_dirs = os.environ.get("XDG_DATA_DIRS") or "/usr/local/share:/usr/share"
+            directories += [os.path.join(data_dir, "fonts") for data_dir in data_dirs.split(":") if data_dir]
+        return [os.path.expanduser(directory) for directory in directories]
+
+    def _scan(self):
+        """フォントディレクトリを走査して索引を作成し、全てのファミリー・ウェイトを解決します (走査スレッドで実行)。"""
+        file_index = {}
+        for font_dir in self.font_directories():
+            for dir_path, _, file_names in os.walk(font_dir):
+                for file_name in file_names:
+                    if file_name.lower().endswith(self.FONT_FILE_EXTENSIONS):
+                        file_index.setdefault(file_name.lower(), os.path.join(dir_path, file_name)) # 先に見つかったものを優先
+        with self._lock:
+            self._file_index = file_index
+            for font_family in self.FONT_CANDIDATES.get(platform.system(), {}):
+                for is_bold in (False, True):
+                    self._font_paths[(font_family, is_bold)] = self._find_font_path(font_family, is_bold)
+        self._index_ready.set()
+        default_path = self._font_paths.get(("gothic", False))
+        if default_path:
+            try:
+                # 既定のフォントは最初のテキスト描画の前に一度読み込み、ファイルをOSのキャッシュに載せておく
+                ImageFont.truetype(default_path, self.PRELOAD_FONT_SIZE)
+            except Exception as e:
+                print(f"Font preloading error at '{default_path}': {e}")
+
+    def _find_font_path(self, font_family, is_bold):
+        """
+        候補のパスを順に調べ、存在するフォントファイルのパスを返します。太字が見つからない場合は通常のウェイトで代替します。
+        候補がファイル名のみの場合や、絶対パスに存在しない場合は、走査した索引からファイル名で探します。
+        """
+        regular_candidates, bold_candidates = self.FONT_CANDIDATES.get(platform.system(), {}).get(font_family, ([], []))
+        for candidates in ((bold_candidates, regular_candidates) if is_bold else (regular_candidates,)):
+            for path_candidate in candidates:
+                if os.path.isabs(path_candidate) and os.path.exists(path_candidate):
+                    return path_candidate
+                indexed_path = self._file_index.get(os.path.basename(path_candidate).lower())
+                if indexed_path:
+                    return indexed_path
+        return None
+
+    def resolve(self, font_family, is_bold):
+        """
+        フォントファミリーと太字指定に対応するフォントファイルのパスを返します。
+        起動直後で走査が完了していない場合は、完了を待たずに絶対パスの候補だけから仮に解決します (結果は記憶しません)。
+
+        Returns:
+            str or None: フォントファイルのパス。見つからない場合はNone。
+        """
+        key = (font_family, is_bold)
+        if key not in self._font_paths:
+            if not self._index_ready.is_set():
+                return self._find_font_path(font_family, is_bold) # 索引はまだ空のため、絶対パスの候補だけを調べる
+            with self._lock:
+                if key not in self._font_paths: # 未知のファミリーなど、走査時に解決されていないもの
+                    self._font_paths[key] = self._find_font_path(font_family, is_bold)
+        return self._font_paths[key]
+
+    def get_font(self, font_size, font_family="gothic", is_bold=False):
+        """
+        指定されたサイズ、ファミリー、太字設定のフォントオブジェクトを取得します。
+
+        Args:
+            font_size (int): フォントサイズ (ポイント)。
+            font_family (str, optional): フォントファミリーの内部名。デフォルトは "gothic"。
+            is_bold (bool, optional): 太字にするかどうか。デフォルトは False。
+
+        Returns:
+            ImageFont.FreeTypeFont: Pillowのフォントオブジェクト。フォントが見つからない場合はPillowのデフォルトフォント。
+        """
+        font_key = (font_size, font_family, is_bold)
+        font = self._fonts.get(font_key)
+        if font is not None:
+            self._fonts.move_to_end(font_key)
+            return font
+
+        is_final = self._index_ready.is_set() # 走査の完了前に仮に解決したフォントはキャッシュしない
+        font_path = self.resolve(font_family, is_bold)
+        try:
+            if font_path:
+                # バイト列から読み込んだフォントの font_variant はサイズごとにフォントデータ全体を複製するため、パスから読み込む
+                font = ImageFont.truetype(font_path, font_size)
+            else:
+                # フォントが見つからない場合はPillowのデフォルトフォントを使用
+                font = ImageFont.load_default()
+        except Exception as e:
+            # フォントロード中にエラーが発生した場合もデフォルトフォントを使用
+            print(f"Font loading error for '{font_family}' (bold: {is_bold}) at '{font_path}': {e}. Using default.")
+            font = ImageFont.load_default()
+
+        if is_final:
+            self._fonts[font_key] = font
+            if len(self._fonts) > self.MAX_CACHED_FONTS:
+                self._fonts.popitem(last=False) # 最も古く使われていないサイズから破棄
+        return font
+
+# === テキストのフォントサイズ調整 ===
+class FontFitter:
+    """
+    テキストを矩形に収まる最大のフォントサイズを求めます。
+    文字列を基準サイズで一度だけ計測し、テキストの寸法がフォントサイズにほぼ比例することを利用してサイズを解析的に見積もります。
+    見積もったサイズで実測して確認し、ヒンティングなどの誤差で収まらない場合は縮小して再確認します。
+    見積もりが小さめに外れている場合に備えて、1つ大きいサイズも実測し、収まる間は大きくします
+    (結果は1ずつ実測して求める場合と同じ、収まる最大のサイズになります)。
+    結果は (テキスト, 矩形のサイズ, 最大サイズ, フォントファミリー, 太字) ごとに記憶します。
+    """
+    REFERENCE_FONT_SIZE = 100 # 寸法の計測に使う基準のフォントサイズ
+    MAX_MEMO_ENTRIES = 4096 # 計測結果・計算結果を記憶しておく最大件数 (超えた場合は一度すべて破棄する)
+
+    def __init__(self, get_font):
+        """
+        Args:
+            get_font (callable): (フォントサイズ, フォントファミリー, 太字) を受け取り、Pillowのフォントオブジェクトを返す関数。
+        """
+        self._get_font = get_font
+        self._reference_extents = {} # (テキスト, フォントファミリー, 太字) -> 基準サイズでの (幅, 高さ)
+        self._fitted_sizes = {} # (テキスト, 矩形の幅, 矩形の高さ, 最大サイズ, フォントファミリー, 太字) -> フォントサイズ
+        self.probe_count = 0 # フォントを実測した回数 (性能確認用)
+
+    def fit(self, text_content, rect_width, rect_height, max_font_size=100, font_family="gothic", is_bold=False):
+        """
+        指定されたテキストが矩形内に収まる最大のフォントサイズを返します。
+
+        Args:
+            text_content (str): 表示するテキスト。
+            rect_width (float): テキストを表示する矩形の幅 (ピクセル)。
+            rect_height (float): テキストを表示する矩形の高さ (ピクセル)。
+            max_font_size (int, optional): フォントサイズの最大値。デフォルトは100。
+            font_family (str, optional): フォントファミリーの内部名。デフォルトは "gothic"。
+            is_bold (bool, optional): 太字にするかどうか。デフォルトは False。
+
+        Returns:
+            int: 矩形内に収まる最大のフォントサイズ。テキストや矩形が空の場合は0、サイズ1でも収まらない場合は1。
+        """
+        if not text_content or rect_width <= 0 or rect_height <= 0:
+            return 0
+        memo_key = (text_content, rect_width, rect_height, max_font_size, font_family, is_bold)
+        fitted_size = self._fitted_sizes.get(memo_key)
+        if fitted_size is not None:
+            return fitted_size
+
+        reference_key = (text_content, font_family, is_bold)
+        reference_extent = self._reference_extents.get(reference_key)
+        if reference_extent is None:
+            reference_extent = self._measure(text_content, self.REFERENCE_FONT_SIZE, font_family, is_bold)
+            self._remember(self._reference_extents, reference_key, reference_extent)
+
+        # 基準サイズでの寸法から、幅・高さそれぞれが収まるサイズを比例計算で見積もる
+        fitted_size = self._scaled_size(max_font_size, self.REFERENCE_FONT_SIZE, reference_extent, rect_width, rect_height)
+        overflow_size = max_font_size + 1 # 収まらないことが分かっている最小のサイズ
+        while fitted_size > 1:
+            text_width, text_height = self._measure(text_content, fitted_size, font_family, is_bold)
+            if text_width <= rect_width and text_height <= rect_height:
+                break # 見積もったサイズで収まることを確認できた
+            # 収まらない場合は、実測した寸法の比率で縮小して再確認する (最低でも1小さくする)
+            overflow_size = fitted_size
+            fitted_size = min(fitted_size - 1, self._scaled_size(max_font_size, fitted_size, (text_width, text_height), rect_width, rect_height))
+        fitted_size = max(1, fitted_size)
+        # 比例計算の見積もりは小さめに外れることがあるため、1つ大きいサイズも収まる間は大きくする
+        while fitted_size + 1 < overflow_size:
+            text_width, text_height = self._measure(text_content, fitted_size + 1, font_family, is_bold)
+            if text_width > rect_width or text_height > rect_height:
+                break
+            fitted_size += 1
+        self._remember(self._fitted_sizes, memo_key, fitted_size)
+        return fitted_size
+
+    def _measure(self, text_content, font_size, font_family, is_bold):
+        """指定サイズでのテキストの (幅, 高さ) をピクセル単位で実測します。"""
+        self.probe_count += 1
+        font = self._get_font(font_size, font_family, is_bold)
+        try:
+            bbox = font.getbbox(text_content) # (left, top, right, bottom)
+            return bbox[2] - bbox[0], bbox[3] - bbox[1]
+        except AttributeError: # 古いPillowバージョンなどへのフォールバック
+            return font.getsize(text_content)
+
+    def clear(self):
+        """記憶した計測結果・計算結果をすべて破棄します (使用するフォントが変わった場合など)。"""
+        self._reference_extents.clear()
+        self._fitted_sizes.clear()
+
+    @staticmethod
+    def _scaled_size(max_font_size, measured_size, measured_extent, rect_width, rect_height):
+        """`measured_size` での寸法 `measured_extent` から、矩形に収まるフォントサイズを比例計算で見積もります。"""
+        candidates = [max_font_size]
+        if measured_extent[0] > 0:
+            candidates.append(measured_size * rect_width / measured_extent[0])
+        if measured_extent[1] > 0:
+            candidates.append(measured_size * rect_height / measured_extent[1])
+        return int(min(candidates))
+
+    def _remember(self, memo, key, value):
+        """件数の上限を超えないように結果を記憶します。"""
+        if len(memo) >= self.MAX_MEMO_ENTRIES:
+            memo.clear()
+        memo[key] = value
+
 # === アプリケーションのメインクラス ===
 class PDFEditorApp:
     """
@@ -32,15 +1669,22 @@ class PDFEditorApp:
         # --- アプリケーションの状態変数 ---
         self.pdf_path = None # 現在開いているPDFファイルのフルパス
         self.doc = None # PyMuPDFのDocumentオブジェクト (現在開いているPDFドキュメント)
+        self._original_page_rotations = {} # 回転操作をしたページのインデックス -> PDFファイル上の元の回転角度 (追記保存で変更ページを判定するため)
+        self._source_file_stat = None # 開いた時点のPDFファイルの (サイズ, 更新時刻)。ファイルを読み直す処理の前に、上書きされていないか確認する
         self.current_page_index = 0 # 現在表示しているページのインデックス (0始まり)
         self.page_image_pil = None # 現在のページをレンダリングしたPillow Imageオブジェクト (アノテーション描画前)
-        self.page_image_tk = None # Pillow ImageをTkinterで表示するためのPhotoImageオブジェクト (Canvas表示用)
+        self.page_image_tk = None # Pillow ImageをTkinterで表示するためのPhotoImageオブジェクト (Canvas表示用。サイズが同じ間は使い回す)
+        self._page_image_item = None # ページ画像のCanvasアイテムID
+        self._displayed_page_layer = None # 表示中のページ層 (同じ画像の再転送を省くため)
+        self._page_overlay_tk = None # アノテーションのある範囲のみを合成したPhotoImage
+        self._displayed_overlay = None # 表示中のオーバーレイ ((原点X, 原点Y), RGBA画像)
         
         # アノテーション関連
-        self.annotations = [] # 現在のPDFに追加された全てのアノテーションのリスト
+        self.annotations = AnnotationStore() # 現在のPDFに追加された全てのアノテーション (ページ・空間索引付き)
                                # 各アノテーションは辞書形式で、ページインデックス、座標、タイプ、各種プロパティを保持
         self.selected_ann = None # 現在選択されているアノテーションオブジェクト (辞書)
         self.canvas_item_to_ann = {} # Canvas上のアイテムIDと対応するアノテーションオブジェクトをマッピングする辞書
+        self.image_blobs = BlobStore() # 挿入画像のデータ (内容が同じ画像は全アノテーションで1つのデータを共有する)
 
         # ドラッグ操作関連
         self.drag_mode = 'none' # 現在のドラッグ操作モード ('none', 'draw_shape', 'move', 'resize_nw', 'resize_se', etc.)
@@ -49,7 +1693,9 @@ class PDFEditorApp:
         self.original_ann_coords_canvas = None # ドラッグ開始時の選択アノテーションのCanvas座標 (リサイズ/移動の基準)
         self.initial_pdf_coords_for_move = None # 移動操作開始時の選択アノテーションのPDF座標
         self.current_drawing_points_canvas = [] # フリーハンド描画中の一時的な点のリスト (Canvas座標系)
-        self.temp_canvas_item_id = None # 描画中の一時的なCanvasアイテムID (矩形、楕円、直線などのプレビュー用)
+        self.temp_canvas_item_id = None # 描画中の一時的なCanvasアイテムID (矩形、楕円、直線、フリーハンド線のプレビュー用)
+        self._freehand_shown_count = 0 # フリーハンド線のプレビューに反映済みの点の数
+        self._freehand_feedback_job = None # フリーハンド線のプレビュー更新のafterジョブID
 
         # リサイズ操作関連
         self.original_pdf_coords_for_resize = None # リサイズ操作開始時の選択アノテーションのPDF座標
@@ -65,24 +1711,97 @@ class PDFEditorApp:
         self.RESIZE_HANDLE_SIZE = 10 # リサイズハンドルの視覚的なサイズ (ピクセル単位)
 
         # フォント関連
-        self.font_cache = {} # ロード済みのフォントオブジェクトをキャッシュするための辞書 (フォントサイズ、ファミリー、太字情報をキー)
+        self.font_registry = FontRegistry() # フォントファイルの解決と、サイズごとのフォントオブジェクトのキャッシュ
+        self.font_registry.start_scan() # フォントディレクトリの走査はバックグラウンドで行う
+        self.font_fitter = FontFitter(self._get_font) # テキストを矩形に収めるフォントサイズの計算 (結果を記憶する)
+        self.FONT_SCAN_POLL_INTERVAL_MS = 100 # フォントの走査の完了をポーリングする間隔 (ミリ秒)
+        self.root.after(self.FONT_SCAN_POLL_INTERVAL_MS, self._poll_font_scan) # 完了したら仮のフォントで描画したテキストを描き直す
         self.font_bold_var = BooleanVar(value=False) # テキスト太字化のON/OFFを保持するTkinter変数
 
-        # Undo/Redo関連
-        self.undo_stack = [] # 操作履歴を保存するスタック (元に戻す機能用)
-        self.redo_stack = [] # やり直し操作履歴を保存するスタック (現在は未使用、将来的な拡張用)
-        self.max_undo_depth = 20 # undoスタックの最大深度 (これを超えると古い履歴から削除される)
-
         # その他
         self.last_highlighted_item_id = None # 最後にハイライト表示されたCanvasアイテムのID (ハイライト解除用)
         self.copied_ann = None # コピーされたアノテーション情報を一時的に保持する変数
+        self.HIT_TOLERANCE_PX = 3 # アノテーションの枠線をクリックしたとみなす距離 (Canvas上のピクセル)
 
         # --- パフォーマンス改善のためのキャッシュ変数 ---
-        self._rendered_page_cache = {} # レンダリング済みのページ画像 (PIL Image) をキャッシュするための辞書
-                                      # キー: (ページインデックス, ズーム倍率, 回転角度)
-        self._page_cache_lru = [] # LRU (Least Recently Used) アルゴリズムでキャッシュ管理するためのキーのリスト
-        self.MAX_PAGE_CACHE_SIZE = 5 # ページキャッシュの最大サイズ (これを超えると古いキャッシュから削除)
-        self._dirty_pages = set() # アノテーションの追加・変更などにより再レンダリングが必要なページのインデックスを保持するセット
+        self.settings = self._load_settings() # ユーザー設定 (CONFIG_FILE_PATH から読み込み)
+        # --- フリーハンド線の処理 ---
+        self.FREEHAND_MIN_SAMPLE_DISTANCE_PX = 1.5 # 描画中、直前の点からこの距離 (Canvas上のピクセル) 未満の入力点は記録しない
+        self.FREEHAND_SIMPLIFY_TOLERANCE_PT = 0.25 # 描画完了時の点の間引き (RDP法) で許容するずれ (PDF座標、ポイント)
+        self.FREEHAND_FEEDBACK_INTERVAL_MS = 16 # 描画中のプレビュー更新の間隔 (ミリ秒、約60fps)。この間の入力点はまとめて反映する
+        # PDF出力時にフリーハンド線を滑らかな曲線 (ベジェ曲線) として出力するかどうか
+        self.smooth_freehand_var = BooleanVar(value=bool(self.settings.get("smooth_freehand_export", False)))
+        # PDF出力時にテキストを画像ではなく文字 (フォントを埋め込んだPDFのテキスト) として出力するかどうか
+        self.vector_text_var = BooleanVar(value=bool(self.settings.get("vector_text_export", False)))
+        # 保存時、元のPDFファイルに変更したページの分だけを追記して保存するかどうか (できない場合は全体を書き出す)
+        self.incremental_save_var = BooleanVar(value=bool(self.settings.get("incremental_save", True)))
+        self.PARALLEL_EXPORT_MIN_PAGES = 500 # このページ数以上のPDFは、複数のワーカープロセスで並列に書き出す (export_workers が2以上の場合)
+        self.MAX_EXPORT_WORKERS = 16 # 書き出しに使うワーカープロセス数の上限 (設定 export_workers で変更、1で並列化しない)
+        self.EXPORT_CHUNKS_PER_WORKER = 2 # 並列書き出しで、ワーカー1つあたりに割り当てるページ範囲の数
+        self.DEFAULT_EXPORT_MEMO_MB = 256 # 前回の書き出し結果を保持するメモリ量のデフォルトの上限 (MB。超える場合は保持しない)
+        # 前回の書き出し結果 (変更されたページのみを作り直すため)
+        self._export_memo = PageExportMemo(self._get_cache_budget_bytes("export_memo_mb", self.DEFAULT_EXPORT_MEMO_MB))
+        # --- Undo/Redo関連 ---
+        self.DEFAULT_UNDO_HISTORY_MB = 128 # 元に戻す/やり直し履歴のデフォルトのメモリ上限 (MB)
+        # 操作ごとの変更 (差分) の履歴。件数ではなく記録内容のバイト数で深さを制限する
+        self.edit_history = EditHistory(self._get_cache_budget_bytes("undo_history_mb", self.DEFAULT_UNDO_HISTORY_MB))
+        self.DEFAULT_PAGE_CACHE_MB = 256 # ページキャッシュのデフォルトのメモリ上限 (MB)
+        self.DEFAULT_TILE_CACHE_MB = 96 # タイルキャッシュのデフォルトのメモリ上限 (MB。512x512のタイルで約96枚)
+        # レンダリング済みのページ画像 (アノテーションを含まない素のPIL Image) のLRUキャッシュ。枚数ではなく合計バイト数で上限を管理する
+        # キー: (ページインデックス, ズーム倍率, 回転角度)
+        self._rendered_page_cache = LRUByteCache(self._get_cache_budget_bytes("page_cache_mb", self.DEFAULT_PAGE_CACHE_MB))
+        self.DEFAULT_DISK_CACHE_MB = 2048 # ディスクキャッシュのデフォルトの容量上限 (MB)
+        self._disk_cache = self._open_disk_cache() # 永続ディスクキャッシュ (DiskRenderCache。設定でディレクトリが指定されていない場合はNone)
+        self._doc_hash = None # ディスクキャッシュのキーに使う、現在のPDFファイルの内容のハッシュ (計算中はNone)
+        self._doc_hash_results = queue.Queue() # バックグラウンドのスレッドで計算したハッシュ ((世代番号, ハッシュ))
+        self._doc_hash_generation = 0 # ハッシュの計算を始めるたびに増やす (計算中に別のPDFを開いた場合に古い結果を捨てるため)
+        self.MAX_OVERLAY_CACHE_SIZE = 12 # アノテーションオーバーレイ層のキャッシュの最大枚数
+        self._dirty_pages = set() # アノテーションの追加・変更などによりオーバーレイ層の再描画が必要なページのインデックスを保持するセット
+        self._annotation_overlay_cache = {} # アノテーションのみを描画したRGBAオーバーレイ層のキャッシュ
+                                            # キー: (ページインデックス, ズーム倍率), 値: ((原点X, 原点Y), RGBA画像) またはアノテーションなしの場合None
+        self.DEFAULT_IMAGE_SPRITE_CACHE_MB = 64 # 挿入画像のデコード・縮小済み画像キャッシュのデフォルトのメモリ上限 (MB)
+        # 挿入画像 (image_object) をデコード・縮小したRGBA画像のLRUキャッシュ。内容のハッシュをキーにするため、コピーや元に戻す操作をまたいで再利用できる
+        # キー: (画像データのハッシュ, (描画幅, 描画高さ)), 値: RGBA画像
+        self._image_sprite_cache = LRUByteCache(self._get_cache_budget_bytes("image_sprite_cache_mb", self.DEFAULT_IMAGE_SPRITE_CACHE_MB))
+        self.DEFAULT_TEXT_SPRITE_CACHE_MB = 32 # テキスト画像のラスタライズ結果のキャッシュのデフォルトのメモリ上限 (MB)
+        # テキスト画像 (text_image) を描画したRGBA画像のLRUキャッシュ。画面表示とPDF生成で共有し、同じラベルは一度だけラスタライズする
+        # キー: (テキスト, フォントファミリー, 太字, 文字色, フォントサイズ), 値: RGBA画像
+        self._text_sprite_cache = LRUByteCache(self._get_cache_budget_bytes("text_sprite_cache_mb", self.DEFAULT_TEXT_SPRITE_CACHE_MB))
+        self._text_png_cache = LRUByteCache(self._text_sprite_cache.max_bytes // 4, sizeof=len) # 上記のPNGデータ (PDF生成用。キーは同じ)
+        self._render_worker = None # 隣接ページを先読みするバックグラウンドレンダリングワーカー (PageRenderWorker)
+        self.PREFETCH_RADIUS = 2 # 先読みする前後のページ数 (N±1, N±2)
+        self.RENDER_WORKER_COUNT = 2 # ワーカープロセス数 (先読み中でも表示中のページのレンダリングを待たせないため2つ)
+        self.INTERIM_ZOOM_RATIO = 0.25 # 暫定表示用の低解像度レンダリングのズーム比率
+        self.RENDER_POLL_INTERVAL_MS = 40 # ワーカーの結果をポーリングする間隔 (ミリ秒)
+        self._render_poll_scheduled = False # 結果ポーリングが予約済みかどうか
+
+        # --- ズーム変更関連 ---
+        self.ZOOM_BUCKETS_PER_OCTAVE = 2 # ズーム倍率の量子化の細かさ (2倍ごとに2段階 = √2倍刻みのバケット)
+        self.MAX_ZOOM_BUCKETS_PER_PAGE = 3 # 1ページあたりにキャッシュを保持するズームバケット数
+        self.ZOOM_SETTLE_MS = 120 # スライダーやCtrl+ホイールの連続操作をまとめるための待ち時間 (ミリ秒)
+        self._pending_zoom_factor = None # 適用待ちのズーム倍率
+        self._zoom_apply_job = None # ズーム適用のafterジョブID
+
+        # --- 高倍率時のタイル表示関連 ---
+        self.TILE_SIZE = 512 # タイル1枚の一辺のピクセル数
+        self.TILED_RENDER_PIXEL_THRESHOLD = 12_000_000 # ページ全体の画素数がこれを超えるとタイル表示に切り替える
+        self.TILES_PER_UPDATE = 4 # 1回のアイドル処理でレンダリングするタイル数 (UIの応答性を保つため分割して処理)
+        self._tile_cache = LRUByteCache(self._get_cache_budget_bytes("tile_cache_mb", self.DEFAULT_TILE_CACHE_MB)) # レンダリング済みタイルのLRUキャッシュ
+                                         # キー: (ページインデックス, ズーム倍率, 回転角度, 列, 行), 値: PIL Image
+        self._tiled_view = None # タイル表示中の場合 (ページインデックス, ズーム倍率, 回転角度, (全体幅, 全体高さ))
+        self._tile_items = {} # 表示中のタイル (列, 行) -> (CanvasアイテムID, PhotoImage)
+        self._tile_display_list = None # タイルレンダリング用のDisplayList ((ページインデックス, 回転角度), fitz.DisplayList)
+        self._tile_update_scheduled = False # タイル更新処理が予約済みかどうか
+
+        # --- 連続スクロール表示関連 ---
+        self.continuous_scroll_var = BooleanVar(value=False) # 全ページを縦に並べて表示するかどうか
+        self.CONTINUOUS_PAGE_GAP = 10 # 連続スクロール表示でのページ間の余白 (ピクセル)
+        self.CONTINUOUS_PREFETCH_SCREENS = 1.0 # 表示範囲の上下に先読みする範囲 (画面の高さに対する比率)
+        self._continuous_page_sizes = None # 各ページのサイズ (PDF座標、回転を考慮) のリスト。回転時などに破棄
+        self._continuous_layout = None # (ズーム倍率, 各ページの上端Y座標のリスト, 全体の幅, 全体の高さ)
+        self._continuous_items = {} # 配置中のページ -> {"item": CanvasアイテムID, "photo": PhotoImage, "key": キャッシュキー, "interim": 暫定画像かどうか}
+        self._continuous_anchor = None # 表示位置を合わせ済みの (ページインデックス, ズーム倍率)。異なる場合はそのページまでスクロールする
+        self._continuous_update_scheduled = False # 連続スクロール表示の更新が予約済みかどうか
 
         # --- モード選択リスト ---
         # (UI表示名, プログラム内部値) のタプルのリスト
@@ -103,12 +1822,12 @@ class PDFEditorApp:
         # 各UIコンポーネントを初期化・配置
         self._setup_menu()          # メニューバー
         self._setup_left_panel()    # 左側コントロールパネル
+        self._setup_thumbnail_panel() # ページサムネイル一覧
         self._setup_right_panel()   # 右側PDFプレビューパネル
         self._bind_events()         # 各種イベントハンドラのバインド
         # ドラッグ＆ドロップ機能は削除されたため、_setup_dnd() の呼び出しも削除
 
-        # --- 初期状態の保存とUI更新 ---
-        self._save_state() # アプリケーション起動時の初期状態をundoスタックに保存
+        # --- 初期状態のUI更新 ---
         self._update_undo_redo_buttons() # undo/redoボタンの有効/無効状態を更新
 
     def _setup_menu(self):
@@ -128,6 +1847,22 @@ class PDFEditorApp:
         file_menu.add_separator() # 区切り線
         file_menu.add_command(label="終了", command=self.root.quit) # アプリケーション終了
 
+        # --- 設定メニュー ---
+        settings_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="設定", menu=settings_menu) # "設定"カスケードメニューを追加
+        settings_menu.add_command(label="ページキャッシュの上限...", command=self._configure_page_cache_budget)
+        settings_menu.add_command(label="ディスクキャッシュの場所...", command=self._configure_disk_cache_dir)
+        settings_menu.add_command(label="ディスクキャッシュを無効にする", command=self._disable_disk_cache)
+        settings_menu.add_separator()
+        settings_menu.add_checkbutton(label="フリーハンド線を曲線で出力", variable=self.smooth_freehand_var,
+                                      command=self._on_smooth_freehand_toggled)
+        settings_menu.add_checkbutton(label="テキストを文字として出力", variable=self.vector_text_var,
+                                      command=self._on_vector_text_toggled)
+        settings_menu.add_checkbutton(label="変更したページのみ追記して保存", variable=self.incremental_save_var,
+                                      command=self._on_incremental_save_toggled)
+        settings_menu.add_separator()
+        settings_menu.add_command(label="キャッシュ統計", command=self._show_cache_stats)
+
         # --- ヘルプメニュー ---
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="ヘルプ", menu=help_menu) # "ヘルプ"カスケードメニューを追加
@@ -136,6 +1871,203 @@ class PDFEditorApp:
 
         self.root.config(menu=menubar) # 作成したメニューバーをウィンドウに設定
 
+    def _load_settings(self):
+        """
+        ユーザー設定ファイル (CONFIG_FILE_PATH、JSON形式) を読み込みます。
+
+        Returns:
+            dict: 設定の辞書。ファイルが存在しない、または読み込めない場合は空の辞書。
+        """
+        try:
+            with open(CONFIG_FILE_PATH, "r", encoding="utf-8") as f:
+                settings = json.load(f)
+            return settings if isinstance(settings, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e: # 壊れた設定ファイルでも起動できるようにする
+            print(f"Settings file could not be read ({CONFIG_FILE_PATH}): {e}")
+            return {}
+
+    def _save_settings(self):
+        """現在のユーザー設定を設定ファイル (CONFIG_FILE_PATH) に保存します。"""
+        try:
+            with open(CONFIG_FILE_PATH, "w", encoding="utf-8") as f:
+                json.dump(self.settings, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            messagebox.showerror("エラー", f"設定ファイルの保存に失敗しました: {e}")
+
+    def _on_smooth_freehand_toggled(self):
+        """「フリーハンド線を曲線で出力」の切り替えを設定ファイルに保存します。"""
+        self.settings["smooth_freehand_export"] = self.smooth_freehand_var.get()
+        self._save_settings()
+
+    def _on_vector_text_toggled(self):
+        """「テキストを文字として出力」の切り替えを設定ファイルに保存します。"""
+        self.settings["vector_text_export"] = self.vector_text_var.get()
+        self._save_settings()
+
+    def _on_incremental_save_toggled(self):
+        """「変更したページのみ追記して保存」の切り替えを設定ファイルに保存します。"""
+        self.settings["incremental_save"] = self.incremental_save_var.get()
+        self._save_settings()
+
+    def _get_cache_budget_bytes(self, setting_name, default_mb):
+        """
+        設定からキャッシュのメモリ上限を取得します。
+
+        Args:
+            setting_name (str): 設定ファイル内のキー名 (MB単位の値)。
+            default_mb (int): 設定がない、または不正な場合に使用する値 (MB)。
+
+        Returns:
+            int: キャッシュのメモリ上限 (バイト)。
+        """
+        value_mb = self.settings.get(setting_name, default_mb)
+        if not isinstance(value_mb, (int, float)) or value_mb <= 0:
+            print(f"Invalid cache setting '{setting_name}': {value_mb!r}. Using {default_mb} MB.")
+            value_mb = default_mb
+        return int(value_mb * 1024 * 1024)
+
+    def _configure_page_cache_budget(self):
+        """
+        ページキャッシュのメモリ上限 (MB) をダイアログで入力させ、即座に反映して設定ファイルに保存します。
+        """
+        current_mb = self._rendered_page_cache.max_bytes // (1024 * 1024)
+        new_mb = simpledialog.askinteger("ページキャッシュの上限",
+                                         "レンダリング済みページ画像のキャッシュに使用するメモリの上限 (MB):",
+                                         initialvalue=current_mb, minvalue=16, maxvalue=65536, parent=self.root)
+        if new_mb is None: # キャンセルされた場合
+            return
+        self._rendered_page_cache.set_max_bytes(new_mb * 1024 * 1024)
+        self.settings["page_cache_mb"] = new_mb
+        self._save_settings()
+
+    def _open_disk_cache(self):
+        """
+        設定 (disk_cache_dir, disk_cache_mb) に従って永続ディスクキャッシュを開きます。
+
+        Returns:
+            DiskRenderCache or None: ディスクキャッシュ。ディレクトリが設定されていない、または作成できない場合はNone。
+        """
+        cache_dir = self.settings.get("disk_cache_dir")
+        if not cache_dir:
+            return None
+        try:
+            return DiskRenderCache(os.path.expanduser(cache_dir),
+                                   self._get_cache_budget_bytes("disk_cache_mb", self.DEFAULT_DISK_CACHE_MB))
+        except OSError as e:
+            print(f"Disk cache could not be opened ({cache_dir}): {e}")
+            return None
+
+    def _start_document_workers(self):
+        """
+        開いているPDF用のバックグラウンドワーカー (ページの先読みとサムネイル一覧) を起動します。
+        ディスクキャッシュが有効な場合は、キーに使うPDFファイルの内容のハッシュをバックグラウンドのスレッドで計算し、
+        完了後に `_poll_doc_hash` で起動します (大きなファイル全体の読み込みでUIを止めないため)。
+        計算中に表示するページは同期的にレンダリングし、サムネイル一覧は枠のみを表示します。
+        """
+        self._stop_render_worker()
+        self._doc_hash = None
+        self._doc_hash_generation += 1
+        if not self._disk_cache:
+            self._start_render_worker() # 先読み用ワーカーもこのPDFで起動し直す
+            self.thumbnail_navigator.set_document(self.doc, self.pdf_path)
+            return
+        self.thumbnail_navigator.set_document(self.doc, None) # ワーカーはハッシュの計算後に起動する
+        generation, path = self._doc_hash_generation, self.pdf_path
+        threading.Thread(target=lambda: self._doc_hash_results.put((generation, self._hash_pdf_file(path))),
+                         name="doc-hash", daemon=True).start()
+        self.root.after(self.RENDER_POLL_INTERVAL_MS, self._poll_doc_hash, generation)
+
+    @staticmethod
+    def _hash_pdf_file(path):
+        """
+        ディスクキャッシュのキーに使うPDFファイルの内容のハッシュを計算します (バックグラウンドのスレッドで実行)。
+
+        Args:
+            path (str): PDFファイルのパス。
+
+        Returns:
+            str or None: ハッシュ文字列。ファイルを読めない場合はNone。
+        """
+        try:
+            return DiskRenderCache.hash_file(path)
+        except OSError as e:
+            print(f"Could not hash '{path}' for the disk cache: {e}")
+            return None
+
+    def _poll_doc_hash(self, generation):
+        """
+        バックグラウンドで計算したPDFのハッシュを取り出し、ワーカーを起動して現在のページ周辺の先読みを依頼します。
+        計算中に別のPDFを開いた、またはPDFを閉じた場合、その計算結果は使用しません。
+
+        Args:
+            generation (int): 待っている計算の世代番号。
+        """
+        if generation != self._doc_hash_generation or not self.doc:
+            return
+        try:
+            while True:
+                result_generation, doc_hash = self._doc_hash_results.get_nowait()
+                if result_generation == generation:
+                    break # 古い計算の結果は読み捨てる
+        except queue.Empty:
+            self.root.after(self.RENDER_POLL_INTERVAL_MS, self._poll_doc_hash, generation)
+            return
+        self._doc_hash = doc_hash # 読めなかった場合はNone (ディスクキャッシュを使わずにワーカーを起動する)
+        self._start_render_worker()
+        self.thumbnail_navigator.set_document(self.doc, self.pdf_path, self._disk_cache, self._doc_hash)
+        self.thumbnail_navigator.set_current_page(self.current_page_index)
+        self._prefetch_neighbour_pages()
+
+    def _configure_disk_cache_dir(self):
+        """
+        永続ディスクキャッシュのディレクトリを選択させ、有効にします。設定は設定ファイルに保存されます。
+        """
+        initial_dir = self._disk_cache.cache_dir if self._disk_cache else os.path.expanduser("~")
+        cache_dir = filedialog.askdirectory(title="ディスクキャッシュの保存先を選択", initialdir=initial_dir, parent=self.root)
+        if not cache_dir: # キャンセルされた場合
+            return
+        self.settings["disk_cache_dir"] = cache_dir
+        self._disk_cache = self._open_disk_cache()
+        if not self._disk_cache:
+            messagebox.showerror("エラー", f"ディスクキャッシュのディレクトリを使用できません: {cache_dir}")
+            return
+        self._save_settings()
+        self._restart_render_worker_for_disk_cache()
+
+    def _disable_disk_cache(self):
+        """永続ディスクキャッシュを無効にします (保存済みのファイルは削除しません)。"""
+        self.settings.pop("disk_cache_dir", None)
+        self._disk_cache = None
+        self._save_settings()
+        self._restart_render_worker_for_disk_cache()
+
+    def _restart_render_worker_for_disk_cache(self):
+        """ディスクキャッシュの設定変更を、開いているPDFのハッシュとワーカープロセスに反映します。"""
+        if self.pdf_path:
+            self._start_document_workers()
+            self.thumbnail_navigator.set_current_page(self.current_page_index)
+            self._prefetch_neighbour_pages()
+
+    def _show_cache_stats(self):
+        """ページキャッシュとタイルキャッシュの統計情報 (ヒット率、使用メモリなど) を表示します。"""
+        lines = []
+        for label, cache in (("ページキャッシュ", self._rendered_page_cache), ("タイルキャッシュ", self._tile_cache),
+                             ("挿入画像キャッシュ", self._image_sprite_cache), ("テキスト画像キャッシュ", self._text_sprite_cache)):
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+            lines.append(f"{label}:\n"
+                         f"  エントリ数: {stats['entries']}\n"
+                         f"  使用メモリ: {stats['bytes'] / (1024 * 1024):.1f} MB / {stats['max_bytes'] / (1024 * 1024):.0f} MB\n"
+                         f"  ヒット: {stats['hits']}  ミス: {stats['misses']}  (ヒット率 {hit_rate:.1f}%)\n"
+                         f"  削除: {stats['evictions']}")
+        lines.append(f"挿入画像データ:\n"
+                     f"  画像数: {len(self.image_blobs)}\n"
+                     f"  使用メモリ: {self.image_blobs.total_bytes() / (1024 * 1024):.1f} MB")
+        messagebox.showinfo("キャッシュ統計", "\n\n".join(lines))
+
     def _show_help_dialog(self):
         """
         アプリケーションの基本的な操作方法を説明するヘルプダイアログを表示します。
@@ -153,6 +2085,7 @@ PDF編集ツール 操作方法
    - PDF結合: 複数のPDFを結合。
    - ページ回転: 現在のページを90度ずつ回転させます。
    - 元に戻す (Ctrl+Z / Cmd+Z): 直前の操作を取り消します。
+   - やり直す (Ctrl+Y / Cmd+Shift+Z): 元に戻した操作をもう一度実行します。
    - 文字出力: 現在のページのテキストを右側のテキストプレビューに表示します。
    - 加工後プレビュー: 現在の編集内容を別ウィンドウでプレビューします。
 
@@ -184,6 +2117,7 @@ PDF編集ツール 操作方法
 ショートカット:
    - Ctrl+S (Cmd+S): 保存
    - Ctrl+Z (Cmd+Z): 元に戻す
+   - Ctrl+Y (Cmd+Shift+Z): やり直す
    - Ctrl + マウスホイール: ズームイン/ズームアウト
         """
         messagebox.showinfo("操作方法", help_text)
@@ -232,8 +2166,10 @@ PDF編集ツール 操作方法
         tk.Button(pdf_tools_frame, text="ページ回転", command=self.rotate_current_page, width=12).grid(row=1, column=1, pady=2, padx=2, sticky="ew")
         self.undo_button = tk.Button(pdf_tools_frame, text="元に戻す (Ctrl+Z)", command=self.undo_action, state=tk.DISABLED, width=12)
         self.undo_button.grid(row=2, column=0, pady=2, padx=2, sticky="ew")
-        tk.Button(pdf_tools_frame, text="文字出力", command=self.extract_text_to_preview, width=12).grid(row=2, column=1, pady=2, padx=2, sticky="ew")
-        tk.Button(pdf_tools_frame, text="加工後プレビュー", command=self.show_processed_preview, width=12).grid(row=3, column=0, columnspan=2, pady=2, padx=2, sticky="ew")
+        self.redo_button = tk.Button(pdf_tools_frame, text="やり直す (Ctrl+Y)", command=self.redo_action, state=tk.DISABLED, width=12)
+        self.redo_button.grid(row=2, column=1, pady=2, padx=2, sticky="ew")
+        tk.Button(pdf_tools_frame, text="文字出力", command=self.extract_text_to_preview, width=12).grid(row=3, column=0, pady=2, padx=2, sticky="ew")
+        tk.Button(pdf_tools_frame, text="加工後プレビュー", command=self.show_processed_preview, width=12).grid(row=3, column=1, pady=2, padx=2, sticky="ew")
 
 
         # --- ページ操作 & ズームセクション ---
@@ -254,6 +2190,8 @@ PDF編集ツール 操作方法
         self.page_info_label = tk.Label(page_nav_frame, text="- / -") # "現在のページ / 総ページ数" 表示
         self.page_info_label.pack(side="left", padx=2)
         tk.Button(page_nav_frame, text="次へ>>", command=self.next_page).pack(side="left", padx=2)
+        Checkbutton(page_frame, text="連続スクロール", variable=self.continuous_scroll_var,
+                    command=self._on_continuous_scroll_toggled).grid(row=2, column=0, columnspan=3, sticky="w")
 
         zoom_frame = tk.LabelFrame(page_zoom_container, text="倍率", padx=10, pady=5)
         zoom_frame.pack(side="right", fill="x", expand=True, padx=(2,0)) # 右側に配置
@@ -378,6 +2316,27 @@ PDF編集ツール 操作方法
             # ウィジェットが既に破棄されている場合などにエラーが発生する可能性があるため、念のため捕捉
             pass
 
+    def _setup_thumbnail_panel(self):
+        """
+        左パネルとPDFプレビューパネルの間に、ページサムネイルの一覧 (ThumbnailNavigator) をセットアップします。
+        サムネイルをクリックするとそのページに移動します。
+        """
+        self.thumbnail_navigator = ThumbnailNavigator(self.root, self._on_thumbnail_selected, bd=2, relief=tk.SUNKEN)
+        self.thumbnail_navigator.pack(side="left", fill="y", pady=10)
+
+    def _on_thumbnail_selected(self, page_idx):
+        """
+        サムネイル一覧でページがクリックされたときに呼び出され、そのページに移動します。
+
+        Args:
+            page_idx (int): クリックされたページのインデックス。
+        """
+        if self.doc and page_idx != self.current_page_index:
+            self.current_page_index = page_idx
+            self.page_entry.delete(0, tk.END)
+            self.page_entry.insert(0, str(page_idx))
+            self.show_page()
+
     def _setup_right_panel(self):
         """
         アプリケーションの右側のPDFプレビューパネルをセットアップします。
@@ -401,8 +2360,10 @@ PDF編集ツール 操作方法
         self.h_scroll.pack(side="bottom", fill="x")
         
         # PDFページ画像とアノテーションを表示するメインCanvas
+        # スクロール位置の変化はタイル表示の更新にも使用する
         self.canvas = tk.Canvas(image_preview_frame, bg="lightgrey", 
-                                yscrollcommand=self.v_scroll.set, xscrollcommand=self.h_scroll.set)
+                                yscrollcommand=lambda first, last: self._on_canvas_view_changed(self.v_scroll, first, last),
+                                xscrollcommand=lambda first, last: self._on_canvas_view_changed(self.h_scroll, first, last))
         self.canvas.pack(side="left", fill="both", expand=True)
         self.v_scroll.config(command=self.canvas.yview) # スクロールバーとCanvasを連携
         self.h_scroll.config(command=self.canvas.xview)
@@ -417,6 +2378,22 @@ PDF編集ツール 操作方法
         text_v_scroll.pack(side="right", fill="y")
         self.text_output.config(yscrollcommand=text_v_scroll.set) # スクロールバーとTextウィジェットを連携
 
+    def _on_canvas_view_changed(self, scrollbar, first, last):
+        """
+        メインCanvasの表示範囲が変化したとき (スクロール、ウィンドウサイズ変更など) に呼び出されます。
+        スクロールバーを更新し、タイル表示中や連続スクロール表示中であれば新しく見えた範囲の描画を予約します。
+
+        Args:
+            scrollbar (tk.Scrollbar): 更新するスクロールバー。
+            first (str): 表示範囲の先頭位置 (0.0-1.0)。
+            last (str): 表示範囲の末尾位置 (0.0-1.0)。
+        """
+        scrollbar.set(first, last)
+        if self._tiled_view:
+            self._schedule_tile_update()
+        elif self._continuous_items:
+            self._schedule_continuous_update()
+
     def _bind_events(self):
         """
         Canvasおよびルートウィンドウの主要なイベントハンドラをバインドします。
@@ -447,6 +2424,8 @@ PDF編集ツール 操作方法
         self.root.bind("<Command-s>", self._save_pdf_key_bind) # Command+S (macOS) - PDF保存
         self.root.bind("<Control-z>", lambda event: self.undo_action()) # Ctrl+Z - 元に戻す
         self.root.bind("<Command-z>", lambda event: self.undo_action()) # Command+Z (macOS) - 元に戻す
+        self.root.bind("<Control-y>", lambda event: self.redo_action()) # Ctrl+Y - やり直す
+        self.root.bind("<Command-Z>", lambda event: self.redo_action()) # Command+Shift+Z (macOS) - やり直す
 
     def _setup_dnd(self):
         """
@@ -620,7 +2599,7 @@ PDF編集ツール 操作方法
     def _get_font(self, font_size, font_family="gothic", is_bold=False):
         """
         指定されたサイズ、ファミリー、太字設定のフォントオブジェクトを取得します。
-        フォントはキャッシュされ、再利用されます。プラットフォームごとに適切なフォントパスを探索します。
+        フォントファイルの検索、読み込み、キャッシュは `FontRegistry` が行います。
 
         Args:
             font_size (int): フォントサイズ (ポイント)。
@@ -630,205 +2609,139 @@ PDF編集ツール 操作方法
         Returns:
             ImageFont.FreeTypeFont: Pillowのフォントオブジェクト。
         """
-        font_key = (font_size, font_family, platform.system(), is_bold) # キャッシュキーに太字情報も追加
-        if font_key in self.font_cache:
-            return self.font_cache[font_key]
-        
-        font_path = None
-        # プラットフォームとフォントファミリー、太字指定に応じたフォントパス候補
-        # 各フォントファミリーに対して、[通常フォントパス候補, 太字フォントパス候補] の形式で定義
-        font_paths_config = {
-            "Windows": {
-                "msgothic": (["C:/Windows/Fonts/msgothic.ttc", "arial.ttf"], ["C:/Windows/Fonts/msgothic.ttc", "arialbd.ttf"]), # TTCの場合、太字は同じファイル内の別indexの可能性もあるが、Pillowのtruetypeはindex指定可能
-                "msmincho": (["C:/Windows/Fonts/msmincho.ttc", "arial.ttf"], ["C:/Windows/Fonts/msmincho.ttc", "arialbd.ttf"]),
-                "meiryo_ui": (["C:/Windows/Fonts/meiryo.ttc", "arial.ttf"], ["C:/Windows/Fonts/meiryob.ttc", "arialbd.ttf"]),
-                "yu_gothic_ui": (["C:/Windows/Fonts/YuGothR.ttc", "C:/Windows/Fonts/YuGothic-Regular.ttf", "arial.ttf"], ["C:/Windows/Fonts/YuGothB.ttc", "C:/Windows/Fonts/YuGothic-Bold.ttf", "arialbd.ttf"]),
-                "gothic": (["C:/Windows/Fonts/meiryo.ttc", "arial.ttf"], ["C:/Windows/Fonts/meiryob.ttc", "arialbd.ttf"]), # デフォルトゴシック
-                "mincho": (["C:/Windows/Fonts/YuMincho.ttc", "arial.ttf"], ["C:/Windows/Fonts/YuMinb.ttc", "arialbd.ttf"])  # デフォルト明朝
-            },
-            "Darwin": { # macOS
-                "gothic": (["/System/Library/Fonts/ヒラギノ角ゴシック W4.ttc", "Arial Unicode.ttf"], ["/System/Library/Fonts/ヒラギノ角ゴシック W7.ttc", "Arial Bold.ttf"]), # ヒラギノはウェイトで太さを表現
-                "mincho": (["/System/Library/Fonts/ヒラギノ明朝 ProN W3.ttc", "Arial Unicode.ttf"], ["/System/Library/Fonts/ヒラギノ明朝 ProN W6.ttc", "Arial Bold.ttf"]),
-                "msgothic": (["Arial Unicode.ttf"], ["Arial Bold.ttf"]), # macOSにMSフォントは標準搭載なし、Arialで代替
-                "msmincho": (["Arial Unicode.ttf"], ["Arial Bold.ttf"]),
-                "meiryo_ui": (["Arial Unicode.ttf"], ["Arial Bold.ttf"]), # Meiryoも標準搭載なし
-                "yu_gothic_ui": (["/System/Library/Fonts/YuGothic-Regular.otf", "Arial Unicode.ttf"], ["/System/Library/Fonts/YuGothic-Bold.otf", "Arial Bold.ttf"]) # macOSにも游ゴシックは含まれる
-            },
-            "Linux": { # Linux (フォントは環境依存性が高い)
-                "gothic": (["NotoSansCJK-Regular.ttc", "ipag.ttf", "DejaVuSans.ttf"], ["NotoSansCJK-Bold.ttc", "ipagp.ttf", "DejaVuSans-Bold.ttf"]),
-                "mincho": (["NotoSerifCJK-Regular.ttc", "ipam.ttf", "DejaVuSans.ttf"], ["NotoSerifCJK-Bold.ttc", "ipamp.ttf", "DejaVuSans-Bold.ttf"]),
-                "msgothic": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"]), # MSフォントの代替
-                "msmincho": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"]),
-                "meiryo_ui": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"]),
-                "yu_gothic_ui": (["DejaVuSans.ttf"], ["DejaVuSans-Bold.ttf"])
-            }
-        }
-        
-        font_candidates = []
-        if platform.system() in font_paths_config:
-            platform_fonts = font_paths_config[platform.system()]
-            font_family_paths = platform_fonts.get(font_family, ([], []))
-            font_candidates = font_family_paths[1] if is_bold else font_family_paths[0]
-
-        # 候補パスを順にチェックし、存在するフォントパスを見つける
-        for path_candidate in font_candidates:
-            if os.path.exists(path_candidate):
-                font_path = path_candidate
-                break
-        
-        # 太字指定で太字フォントが見つからなかった場合、通常フォントで代替しようと試みる
-        if is_bold and not font_path and font_family_paths[0]:
-            for path_candidate in font_family_paths[0]:
-                if os.path.exists(path_candidate):
-                    font_path = path_candidate # 通常フォントで代替
-                    # print(f"Warning: Bold font for '{font_family}' not found. Using regular weight.")
-                    break
-        
-        try:
-            if font_path:
-                # PillowのImageFont.truetypeでフォントをロード
-                # TTCファイルの場合、太字は別のインデックスにある可能性もあるが、
-                # Pillowはフォント名やファイルパスで適切なウェイトを推測しようと試みる
-                font = ImageFont.truetype(font_path, font_size)
-            else:
-                # フォントが見つからない場合はPillowのデフォルトフォントを使用
-                # print(f"Warning: Font '{font_family}' (bold: {is_bold}) not found. Using default font.")
-                font = ImageFont.load_default() 
-        except Exception as e:
-            # フォントロード中にエラーが発生した場合もデフォルトフォントを使用
-            print(f"Font loading error for '{font_family}' (bold: {is_bold}) at '{font_path}': {e}. Using default.")
-            font = ImageFont.load_default()
-        
-        self.font_cache[font_key] = font
-        return font
+        return self.font_registry.get_font(font_size, font_family, is_bold)
+
+    def _poll_font_scan(self):
+        """
+        フォントの走査が完了するまでポーリングします。
+        走査中は `FontRegistry` が仮のフォントを返すため、完了したらフォントに依存するキャッシュを破棄して、
+        テキストアノテーションのあるページを描き直します。
+        """
+        if not self.font_registry.is_ready():
+            self.root.after(self.FONT_SCAN_POLL_INTERVAL_MS, self._poll_font_scan)
+            return
+        self.font_fitter.clear()
+        self._text_sprite_cache.clear()
+        self._text_png_cache.clear()
+        self._export_memo.clear()
+        self._dirty_pages.update(ann['page_idx'] for ann in self.annotations if ann.get('type') == 'text_image')
+        if self.doc:
+            self.show_page()
 
     def _get_fitted_font_size(self, text_content, rect_width, rect_height, max_font_size=100, font_family="gothic", is_bold=False):
         """
         指定されたテキストが与えられた矩形内に収まる最大のフォントサイズを計算します。
-        効率的な探索のために二分探索アルゴリズムを使用します。
+        計算は `FontFitter` (基準サイズでの計測結果からの比例計算と1回の確認) で行い、結果は記憶されます。
 
         Args:
             text_content (str): 表示するテキスト。
             rect_width (float): テキストを表示する矩形の幅 (ピクセル)。
             rect_height (float): テキストを表示する矩形の高さ (ピクセル)。
-            max_font_size (int, optional): 探索するフォントサイズの最大値。デフォルトは100。
+            max_font_size (int, optional): フォントサイズの最大値。デフォルトは100。
             font_family (str, optional): フォントファミリーの内部名。デフォルトは "gothic"。
             is_bold (bool, optional): 太字にするかどうか。デフォルトは False。
 
         Returns:
-            int: 矩形内に収まる最大のフォントサイズ。収まらない場合は0に近い値を返す可能性あり。
+            int: 矩形内に収まる最大のフォントサイズ。収まらない場合は1、テキストや矩形が空の場合は0。
         """
-        if not text_content or rect_width <= 0 or rect_height <= 0:
-            return 0 
-        
-        min_f_size, low, high, best_f_size = 1, 1, max_font_size, 1 # 最小フォントサイズ、探索範囲の下限・上限、最適なフォントサイズ
-        
-        # 二分探索で最適なフォントサイズを見つける
-        while low <= high:
-            mid = (low + high) // 2
-            if mid == 0: # フォントサイズ0は無効なのでスキップ
-                low = 1
-                continue
-            
-            font = self._get_font(mid, font_family, is_bold) # 現在の試行サイズでフォントを取得
-            
-            # Pillow 9.0.0 以降では getbbox, 9.2.0 以降では getlength が推奨される場合がある
-            # getbbox は (left, top, right, bottom) のタプルを返す
-            try:
-                bbox = font.getbbox(text_content) # テキストのバウンディングボックスを取得
-                text_render_width = bbox[2] - bbox[0]
-                text_render_height = bbox[3] - bbox[1]
-            except AttributeError: # 古いPillowバージョンなどへのフォールバック
-                 text_render_width, text_render_height = font.getsize(text_content)
+        return self.font_fitter.fit(text_content, rect_width, rect_height, max_font_size, font_family, is_bold)
 
+    def _record_edit(self, changes):
+        """
+        操作で変わった部分 (変更のリスト) を編集履歴に記録し、undo/redoボタンの状態を更新します。
+        変更の形式は `EditHistory` を参照してください。新しい操作が記録されると、やり直しの履歴は破棄されます。
 
-            if text_render_width <= rect_width and text_render_height <= rect_height:
-                best_f_size = mid # 現在のサイズで収まるなら、これが新しい最適候補
-                low = mid + 1     # より大きなサイズを試す
-            else:
-                high = mid - 1    # サイズが大きすぎるので、より小さなサイズを試す
-        return best_f_size
-
-    def _save_state(self): 
-        """
-        アプリケーションの現在の状態（アノテーションリスト、現在のページ、選択情報など）を
-        undoスタックにディープコピーして保存します。
-        これにより、「元に戻す」機能が実現されます。
-        新しい操作が行われると、redoスタックはクリアされます。
-        """
-        # 保存する状態を定義
-        state = {
-            'annotations': copy.deepcopy(self.annotations), # アノテーションリスト (重要なのでディープコピー)
-            'current_page_index': self.current_page_index,
-            # 選択中のアノテーションの座標のみを保存 (オブジェクト自体はannotationsから復元するため)
-            'selected_ann_coords': self.selected_ann['coords'] if self.selected_ann else None, 
-            # 各ページの回転情報も保存
-            'page_rotations': {i: self.doc[i].rotation for i in range(len(self.doc))} if self.doc else {}
-        }
-        self.undo_stack.append(state)
-        if len(self.undo_stack) > self.max_undo_depth: # スタックが最大深度を超えた場合
-            self.undo_stack.pop(0) # 最も古い状態を削除 (FIFO)
-        
-        self.redo_stack.clear() # 新しい操作が加わったので、やり直し履歴はクリア
-        self._update_undo_redo_buttons() # undo/redoボタンの有効/無効状態を更新
+        Args:
+            changes (list): 変更のリスト。
+        """
+        self.edit_history.record(changes, self.current_page_index)
+        self._update_undo_redo_buttons()
 
     def _update_undo_redo_buttons(self): 
         """
-        「元に戻す」ボタンの有効/無効状態を、undoスタックの状態に基づいて更新します。
-        undoスタックに複数の状態（初期状態＋1つ以上の操作後状態）がある場合に有効になります。
-        (redoボタンは現バージョンではUIにないため、undoのみ更新)
+        「元に戻す」「やり直す」ボタンの有効/無効状態を、編集履歴の状態に基づいて更新します。
         """
         if hasattr(self, 'undo_button') and self.undo_button.winfo_exists(): # undo_buttonが生成済みか確認
-            # undoスタックに初期状態以外にも履歴があれば有効 (初期状態は常にスタックの底にある想定)
-            can_undo = len(self.undo_stack) > 1 
-            self.undo_button.config(state=tk.NORMAL if can_undo else tk.DISABLED)
+            self.undo_button.config(state=tk.NORMAL if self.edit_history.can_undo() else tk.DISABLED)
+        if hasattr(self, 'redo_button') and self.redo_button.winfo_exists():
+            self.redo_button.config(state=tk.NORMAL if self.edit_history.can_redo() else tk.DISABLED)
 
     def undo_action(self): 
         """
         「元に戻す」操作を実行します。
-        undoスタックから直前の状態を復元し、UIを更新します。
+        直前の操作で変わった部分のみを変更前の状態に戻し、UIを更新します。
         """
-        if len(self.undo_stack) > 1: # 初期状態以外に復元可能な状態がある場合
-            self._dirty_pages.add(self.current_page_index) # 現在表示中のページは再描画が必要になる可能性
-            
-            self.undo_stack.pop() # 現在の状態をスタックから取り除く (これにより1つ前の状態がトップになる)
-            restored_state = copy.deepcopy(self.undo_stack[-1]) # 復元する状態 (スタックの新しいトップ) を取得
-            
-            # アプリケーションの状態変数を復元
-            self.annotations = restored_state['annotations']
-            new_page_index = restored_state['current_page_index']
-            
-            # ページ回転状態を復元
-            if self.doc:
-                for idx, rotation in restored_state.get('page_rotations', {}).items():
-                    if 0 <= idx < len(self.doc): # ページの存在を確認
-                        self.doc[idx].set_rotation(rotation)
-
-            self.selected_ann = None # 選択状態を一旦リセット
-            # 復元されたアノテーション座標に基づいて、選択されていたアノテーションを再特定
-            if restored_state['selected_ann_coords']:
-                for ann in self.annotations: 
-                    # ページインデックスと座標が一致するものを探す
-                    if ann['coords'] == restored_state['selected_ann_coords'] and \
-                       ann['page_idx'] == new_page_index: # 復元後のページインデックスで比較
-                        self.selected_ann = ann
-                        break
-            
-            # UIを復元後の状態に更新
-            self.page_entry.delete(0, tk.END)
-            self.page_entry.insert(0, str(new_page_index))
-            
-            # ページインデックスが変更された場合は、ダーティページセットにも追加
-            if self.current_page_index != new_page_index:
-                 self._dirty_pages.add(new_page_index)
-            self.current_page_index = new_page_index # ページインデックスを更新
-
-            self.show_page() # ページを再表示 (アノテーションなども再描画される)
-            self._update_undo_redo_buttons() # ボタン状態を更新
-            if self.selected_ann: # もしアノテーションが再選択されたら、左パネルも更新
-                self._update_left_panel_for_selected_ann(self.selected_ann)
-        else:
+        entry = self.edit_history.pop_undo()
+        if entry is None:
             messagebox.showinfo("情報", "これ以上元に戻せる操作はありません。")
+            return
+        self._apply_history_entry(entry, undo=True)
+
+    def redo_action(self):
+        """
+        「やり直す」操作を実行します。
+        直前に元に戻した操作で変わった部分のみを変更後の状態にし、UIを更新します。
+        """
+        entry = self.edit_history.pop_redo()
+        if entry is None:
+            messagebox.showinfo("情報", "やり直せる操作はありません。")
+            return
+        self._apply_history_entry(entry, undo=False)
+
+    def _apply_history_entry(self, entry, undo):
+        """
+        編集履歴の1操作分の変更を、アノテーションとページに適用します。
+        変更されたアノテーションはその場で書き換えるため、処理量は操作で変わった部分の大きさにのみ比例します。
+
+        Args:
+            entry (tuple): `EditHistory.pop_undo` / `pop_redo` が返す (変更のリスト, 操作時のページインデックス)。
+            undo (bool): True の場合は変更前の状態に、False の場合は変更後の状態にします。
+        """
+        changes, new_page_index = entry
+        touched_ann = None # 元に戻した/やり直した結果、存在しているアノテーション (選択状態にする)
+        for change in (reversed(changes) if undo else changes): # 元に戻すときは逆順に適用
+            kind = change[0]
+            if kind == 'rotate':
+                _, page_idx, rotation_before, rotation_after = change
+                if self.doc and 0 <= page_idx < len(self.doc): # ページの存在を確認
+                    self.doc[page_idx].set_rotation(rotation_before if undo else rotation_after)
+                    self._dirty_pages.add(page_idx)
+                    self._invalidate_continuous_layout() # 回転が戻るとページサイズが変わり得る
+            elif kind in ('add', 'remove'):
+                _, ann, sequence = change
+                self._dirty_pages.add(ann['page_idx'])
+                if (kind == 'add') == undo: # 追加を元に戻す、または削除をやり直す
+                    if ann in self.annotations:
+                        self.annotations.remove(ann)
+                    if self.selected_ann is ann:
+                        self.selected_ann = None
+                    if touched_ann is ann:
+                        touched_ann = None
+                else: # 削除を元に戻す、または追加をやり直す (元の描画順に戻す)
+                    self.annotations.append(ann, sequence=sequence)
+                    touched_ann = ann
+            elif kind == 'modify':
+                _, ann, ann_before, ann_after = change
+                self._dirty_pages.add(ann['page_idx']) # 変更前のページ
+                ann.restore(ann_before if undo else ann_after)
+                self.annotations.update(ann) # 座標やページが変わり得るため索引を更新
+                self._dirty_pages.add(ann['page_idx']) # 変更後のページ
+                touched_ann = ann
+
+        if touched_ann is not None and touched_ann in self.annotations and touched_ann['page_idx'] == new_page_index:
+            self.selected_ann = touched_ann
+        elif self.selected_ann is not None and self.selected_ann not in self.annotations:
+            self.selected_ann = None
+
+        # UIを操作時のページに合わせて更新
+        self.page_entry.delete(0, tk.END)
+        self.page_entry.insert(0, str(new_page_index))
+        self.current_page_index = new_page_index
+
+        self.show_page() # ページを再表示 (アノテーションなども再描画される)
+        self._update_undo_redo_buttons() # ボタン状態を更新
+        if self.selected_ann: # アノテーションが選択されていれば、左パネルも更新
+            self._update_left_panel_for_selected_ann(self.selected_ann)
 
     def select_pdf(self): 
         """
@@ -840,164 +2753,893 @@ PDF編集ツール 操作方法
             return
         self.select_pdf_path(path) # 選択されたパスでPDFを開く処理を呼び出す
 
-    def select_pdf_path(self, path): 
+    def select_pdf_path(self, path): 
+        """
+        指定されたパスのPDFファイルを開き、アプリケーションの状態を初期化します。
+        既存のドキュメントは閉じられます。
+
+        Args:
+            path (str): 開くPDFファイルのフルパス。
+        """
+        try:
+            if self.doc: # 既に別のPDFが開いていれば閉じる
+                self.doc.close()
+            
+            self.doc = fitz.open(path) # PyMuPDFでPDFを開く
+            self.pdf_path = path
+            self._original_page_rotations.clear()
+            self._source_file_stat = self._stat_source_file(path)
+            self.current_page_index = 0 # 最初のページを表示
+            self._start_document_workers() # ディスクキャッシュが有効な場合は、ハッシュの計算後に起動する
+            
+            # UI要素の更新
+            self.filename_label.config(text=os.path.basename(path)) # ファイル名ラベル更新
+            self.page_entry.delete(0, tk.END)
+            self.page_entry.insert(0, "0")
+            
+            # アプリケーション状態のリセット
+            self.annotations.clear()
+            self.canvas_item_to_ann.clear()
+            self.selected_ann = None
+            self.zoom_scale.set(int(self.zoom_factor * 100)) # ズームをデフォルトに戻す
+            self.deselect_all_annotations() # 念のため選択解除処理
+            
+            # キャッシュクリア
+            self._rendered_page_cache.clear()
+            self._invalidate_continuous_layout()
+            self._annotation_overlay_cache.clear()
+            self._tile_cache.clear()
+            self._tile_display_list = None
+            self._dirty_pages.clear()
+            self._export_memo.clear()
+            
+            self.show_page() # 最初のページを表示
+            self._update_text_preview("") # 新しいPDFを開いた直後はテキストプレビューをクリア
+            self.edit_history.clear() # 前のPDFに対する編集履歴は破棄
+            self._update_undo_redo_buttons()
+        except Exception as e:
+            messagebox.showerror("エラー", f"PDF読み込み失敗: {e}")
+            if self.doc: self.doc.close() # エラー時もドキュメントが開いていれば閉じる
+            self.doc = None
+            self.pdf_path = None
+            self._doc_hash = None
+            self._stop_render_worker()
+            self.thumbnail_navigator.set_document(None, None)
+            self.filename_label.config(text="(未選択)")
+            self.clear_canvas_and_reset_scroll() # Canvasをクリア
+
+    def set_zoom_factor_from_scale(self, value): 
+        """
+        ズームスライダーの値が変更されたときに呼び出されます。
+        Ctrl+ホイールなどで連続して値が変わった場合に途中の倍率ごとにレンダリングしないよう、
+        操作が ZOOM_SETTLE_MS だけ止まってから最後の倍率を一度だけ適用します。
+
+        Args:
+            value (str): スライダーから渡される現在の値 (文字列型、パーセント表示)。
+        """
+        self._pending_zoom_factor = float(value) / 100.0 # パーセントから倍率 (0.0-1.0) に変換
+        if self._zoom_apply_job:
+            self.root.after_cancel(self._zoom_apply_job) # 連続操作中は適用を先送り
+        self._zoom_apply_job = self.root.after(self.ZOOM_SETTLE_MS, self._apply_pending_zoom)
+
+    def _apply_pending_zoom(self):
+        """
+        適用待ちのズーム倍率を反映し、ページを再表示します。
+        キャッシュはズーム倍率をキーに含むため破棄しません。目的の倍率のキャッシュがなければ、
+        最も近い倍率のキャッシュを拡大縮小した暫定画像を表示し、正確な倍率の画像はワーカーでレンダリングします。
+        """
+        self._zoom_apply_job = None
+        new_zoom = self._pending_zoom_factor
+        self._pending_zoom_factor = None
+        if new_zoom is not None and self.zoom_factor != new_zoom: # 実際にズーム倍率が変わった場合のみ処理
+            self.zoom_factor = new_zoom
+            self.show_page()
+
+    def _zoom_bucket(self, zoom):
+        """
+        ズーム倍率を対数スケールで量子化したバケット番号を返します。
+
+        Args:
+            zoom (float): ズーム倍率。
+
+        Returns:
+            int: バケット番号 (ZOOM_BUCKETS_PER_OCTAVE が2の場合、√2倍ごとに1つ増える)。
+        """
+        return round(math.log2(max(zoom, 0.01)) * self.ZOOM_BUCKETS_PER_OCTAVE)
+
+    def show_page(self): 
+        """
+        現在のページ (`self.current_page_index`) をCanvasに表示します。
+        表示画像は、素のページ画像 (ページ層) とアノテーションのオーバーレイ層を合成して作成します。
+        ページ層のレンダリングはキャッシュを利用し、必要な場合のみ行います。
+        アノテーションを編集しただけの場合はオーバーレイ層のみ再描画し、PDFの再ラスタライズは行いません。
+        """
+        if not self.doc: # PDFドキュメントが開かれていない場合は何もしない
+            self.clear_canvas_and_reset_scroll()
+            self._update_text_preview("")
+            return
+
+        if self._is_continuous_view():
+            self._show_continuous_pages() # 連続スクロール表示 (表示範囲のページのみ描画)
+            return
+        self._clear_continuous_pages() # 連続スクロール表示から単ページ表示に戻った場合に備えて削除
+        
+        page_idx = self.current_page_index
+        actual_zoom = max(0.01, self.zoom_factor) # ズーム倍率が0以下にならないように保護
+        
+        # 現在のページの回転角度を取得
+        current_rotation = self.doc[page_idx].rotation
+        cache_key = (page_idx, actual_zoom, current_rotation) # キャッシュキー (回転情報も含む)
+        
+        if self._use_tiled_rendering(page_idx, actual_zoom):
+            # --- 高倍率の場合: 表示範囲 (＋余白) のタイルのみをレンダリングして表示 ---
+            self._show_page_tiled(page_idx, actual_zoom, current_rotation)
+        else:
+            self._clear_tiles() # タイル表示から通常表示に戻った場合に備えてタイルを削除
+            # キャッシュから素のページ画像を再利用 (アノテーション変更はオーバーレイ層のみに影響する)
+            page_layer = self._rendered_page_cache.get(cache_key)
+            if page_layer is None and self._disk_cache and self._doc_hash and not self._render_worker:
+                # 以前にこのPDFを開いたときのレンダリング結果がディスクにあれば、ラスタライズせずに使用
+                # (ワーカーがある場合はワーカーがディスクキャッシュから読み込み、PNGの展開をUIスレッドで行わない)
+                page_layer = self._disk_cache.load(self._doc_hash, *cache_key)
+                if page_layer is not None:
+                    self._store_rendered_page(cache_key, page_layer)
+            if page_layer is None and self._render_worker:
+                # まず低解像度の暫定画像をすぐに表示し、高解像度のレンダリングはワーカーに任せる
+                # (ジョブは `_prefetch_neighbour_pages` で最優先で投入され、完了時に `_poll_render_results` で差し替える)
+                page_layer = self._get_interim_page_image(page_idx, actual_zoom, current_rotation)
+            elif page_layer is None:
+                # --- ページのレンダリング処理 (ワーカーが使えない場合は同期的に行う) ---
+                page = self.doc[page_idx]
+                # PyMuPDFでページを指定されたズーム倍率でピクセルマップにレンダリング
+                # fitz.Matrix(zoom_x, zoom_y) でズームを指定
+                pix = page.get_pixmap(matrix=fitz.Matrix(actual_zoom, actual_zoom))
+                # ピクセルマップからPillow Imageオブジェクトを生成 (samplesのbytesコピーを経由しない)
+                page_layer = pixmap_to_image(pix)
+                # 素のページ画像をキャッシュに保存
+                self._store_rendered_page(cache_key, page_layer)
+                if self._disk_cache and self._doc_hash:
+                    self._disk_cache.store(self._doc_hash, *cache_key, page_layer)
+
+            self._display_page_image(page_layer, page_idx, actual_zoom)
+        
+        # --- Canvas上のアノテーション枠の再描画 ---
+        # (アノテーション自体は合成済みの画像に含まれているが、選択用の枠はCanvas上に別途描画)
+        self.canvas.delete("annotation_group") # 既存のアノテーション枠を全て削除
+        self.canvas_item_to_ann.clear() # マッピングもクリア
+        # 現在のページのアノテーションのみを取得して描画
+        for ann in self.annotations.on_page(page_idx):
+            self._draw_annotation_bounding_box_on_canvas(ann, self.canvas_item_to_ann)
+        
+        self.update_page_info_label() # ページ情報ラベルを更新
+        self.thumbnail_navigator.set_current_page(page_idx) # サムネイル一覧の現在ページ表示を更新
+        self.highlight_selected_annotation() # 選択中のアノテーションがあればハイライト
+        self._prefetch_neighbour_pages() # 前後のページをバックグラウンドで先読み
+
+        # テキストプレビューの自動更新は行わない (「文字出力」ボタンで明示的に行う)
+
+    def _display_page_image(self, page_layer, page_idx, zoom):
+        """
+        素のページ画像とアノテーションのオーバーレイを、Canvasのページ画像として表示します。
+        画素のコピーを最小限にするため、以下のようにしています。
+        - ページ全体の画像は合成せず、ページ層はそのままPhotoImageに転送し、アノテーションのある範囲だけを
+          合成した小さな画像を別のCanvasアイテムとして重ねる
+        - PhotoImageは作り直さず、サイズが同じなら既存のものに上書き (paste) する
+        - 表示中と同じページ層・オーバーレイであれば何も転送しない
+        Canvas上のアノテーション枠などは変更しないため、ドラッグ操作中に呼び出されても問題ありません。
+
+        Args:
+            page_layer (PIL.Image.Image): 素のページ画像 (暫定の低解像度画像を拡大したものも可)。
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+        """
+        overlay = self._get_annotation_overlay(page_idx, zoom, page_layer.size)
+        self.page_image_pil = page_layer
+
+        # --- ページ層 ---
+        if not (self._page_image_item and self.canvas.type(self._page_image_item) == "image"):
+            self._page_image_item = None # 他の表示方式への切り替えなどで削除された
+            self._displayed_page_layer = None
+        if page_layer is not self._displayed_page_layer:
+            if self.page_image_tk and (self.page_image_tk.width(), self.page_image_tk.height()) == page_layer.size:
+                self.page_image_tk.paste(page_layer) # 同じサイズなら既存のPhotoImageに上書き (Tk側の画像を作り直さない)
+            else:
+                self.page_image_tk = ImageTk.PhotoImage(page_layer)
+            if self._page_image_item:
+                self.canvas.itemconfig(self._page_image_item, image=self.page_image_tk)
+            else:
+                # Canvasの(0,0)にページ画像を表示 (アンカーは北西)
+                self._page_image_item = self.canvas.create_image(0, 0, anchor="nw", image=self.page_image_tk, tags="page_image")
+                self.canvas.tag_lower(self._page_image_item) # アノテーション枠より背面に配置
+            self._displayed_page_layer = page_layer
+            self._displayed_overlay = None # ページ層が変わったため、オーバーレイも合成し直す
+
+        # --- アノテーションのオーバーレイ (アノテーションのある範囲のみ) ---
+        if overlay is not self._displayed_overlay:
+            self.canvas.delete("page_overlay")
+            self._page_overlay_tk = None
+            if overlay:
+                (overlay_x, overlay_y), overlay_image = overlay
+                # 下地のページ層のうちオーバーレイの範囲だけを切り出して合成 (ページ全体はコピーしない)
+                region = page_layer.crop((overlay_x, overlay_y, overlay_x + overlay_image.width, overlay_y + overlay_image.height))
+                region.paste(overlay_image, (0, 0), overlay_image)
+                self._page_overlay_tk = ImageTk.PhotoImage(region)
+                self.canvas.create_image(overlay_x, overlay_y, anchor="nw", image=self._page_overlay_tk,
+                                         tags=("page_image", "page_overlay"))
+                self.canvas.tag_raise("page_overlay", self._page_image_item) # ページ層の前面、アノテーション枠の背面
+            self._displayed_overlay = overlay
+
+        # Canvasのスクロール領域を画像のサイズに合わせる
+        self.canvas.config(scrollregion=(0, 0, page_layer.width, page_layer.height))
+
+    def _compose_page_image(self, page_layer, page_idx, zoom):
+        """
+        素のページ画像にアノテーションのオーバーレイ層を合成した表示用の画像を返します。
+        連続スクロール表示で使用します。アノテーションのあるページはページ全体を複製するため、
+        単ページ表示 (`_display_page_image`) と異なり、合成時のコピー量は減らしていません。
+
+        Args:
+            page_layer (PIL.Image.Image): 素のページ画像。
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+
+        Returns:
+            PIL.Image.Image: 合成後の画像。アノテーションがなければ page_layer そのもの。
+        """
+        overlay = self._get_annotation_overlay(page_idx, zoom, page_layer.size)
+        if not overlay:
+            return page_layer # アノテーションがなければ素のページ画像をそのまま表示
+        (overlay_x, overlay_y), overlay_image = overlay
+        composed_image = page_layer.copy() # キャッシュ内の素のページ画像は書き換えない
+        composed_image.paste(overlay_image, (overlay_x, overlay_y), overlay_image)
+        return composed_image
+
+    def _get_interim_page_image(self, page_idx, zoom, rotation):
+        """
+        高解像度のレンダリングが完了するまでの暫定表示用に、目的のサイズに拡大した低解像度のページ画像を作成します。
+        同じページを別のズーム倍率でレンダリングしたキャッシュがあればそれを使い、
+        なければサムネイル一覧のサムネイル、それもなければ縮小したズーム倍率で高速にレンダリングします。
+
+        Args:
+            page_idx (int): ページインデックス。
+            zoom (float): 目的のズーム倍率。
+            rotation (int): ページの回転角度。
+
+        Returns:
+            PIL.Image.Image: 目的のズーム倍率でのページサイズに拡大した暫定画像。
+        """
+        page = self.doc[page_idx]
+        target_rect = (page.rect * fitz.Matrix(zoom, zoom)).irect # 高解像度レンダリング時と同じ画像サイズ
+        cached_keys = [key for key in self._rendered_page_cache if key[0] == page_idx and key[2] == rotation]
+        if cached_keys:
+            # 目的のズーム倍率に最も近いキャッシュ (比率で比較) を使用
+            nearest_key = min(cached_keys, key=lambda key: abs(math.log(key[1] / zoom)))
+            source_image = self._rendered_page_cache.peek(nearest_key)
+        else:
+            source_image = self.thumbnail_navigator.get_cached_thumbnail(page_idx, rotation)
+            if source_image is None:
+                low_zoom = zoom * self.INTERIM_ZOOM_RATIO
+                pix = page.get_pixmap(matrix=fitz.Matrix(low_zoom, low_zoom))
+                source_image = pixmap_to_image(pix)
+        return source_image.resize((target_rect.width, target_rect.height), Image.BILINEAR)
+
+    def _store_rendered_page(self, cache_key, pil_image):
+        """
+        レンダリング済みの素のページ画像をLRUキャッシュに保存します。
+        同じページについては量子化したズームバケットごとに1枚だけ保持し、
+        保持するバケット数が上限を超えた場合は保存する倍率から最も遠いものを削除します。
+        キャッシュ全体のメモリ量が上限を超えた場合は、最も古く使われていないエントリを削除します。
+
+        Args:
+            cache_key (tuple): (ページインデックス, ズーム倍率, 回転角度) のキャッシュキー。
+            pil_image (PIL.Image.Image): アノテーションを含まないページ画像。
+        """
+        page_idx, zoom, rotation = cache_key
+        bucket = self._zoom_bucket(zoom)
+        same_page_keys = [key for key in self._rendered_page_cache
+                          if key[0] == page_idx and key[2] == rotation and key != cache_key]
+        # 同じバケットの古い倍率の画像は置き換える
+        stale_keys = [key for key in same_page_keys if self._zoom_bucket(key[1]) == bucket]
+        kept_keys = [key for key in same_page_keys if key not in stale_keys]
+        # バケット数の上限を超える分は、保存する倍率から遠いものから削除
+        kept_keys.sort(key=lambda key: abs(math.log(key[1] / zoom)))
+        stale_keys.extend(kept_keys[self.MAX_ZOOM_BUCKETS_PER_PAGE - 1:])
+        for key in stale_keys:
+            self._rendered_page_cache.pop(key)
+
+        # 合計バイト数が上限を超えた場合は、最も古く使われていないエントリから削除される
+        self._rendered_page_cache.put(cache_key, pil_image)
+
+    def _get_annotation_overlay(self, page_idx, zoom, page_size):
+        """
+        指定ページのアノテーションのみを描画したRGBAオーバーレイ層を返します。
+        オーバーレイはアノテーション全体を囲む範囲だけの大きさで作成し、キャッシュします。
+        ページがダーティ (アノテーション変更あり) の場合のみ再描画します。
+
+        Args:
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            page_size (tuple): 合成先のページ画像のサイズ (幅, 高さ)。
+
+        Returns:
+            tuple or None: ((原点X, 原点Y), RGBA画像)。このページにアノテーションがなければNone。
+        """
+        overlay_key = (page_idx, zoom)
+        if page_idx in self._dirty_pages: # アノテーションが変更されたページは、全ズーム倍率分のオーバーレイを破棄
+            for key in [k for k in self._annotation_overlay_cache if k[0] == page_idx]:
+                del self._annotation_overlay_cache[key]
+            self._dirty_pages.discard(page_idx) # ダーティフラグを解除
+        if overlay_key in self._annotation_overlay_cache:
+            overlay = self._annotation_overlay_cache.pop(overlay_key)
+            self._annotation_overlay_cache[overlay_key] = overlay # 末尾に移動 (LRU)
+            return overlay
+
+        page_anns = self.annotations.on_page(page_idx)
+        overlay = None
+        if page_anns:
+            # 全アノテーションを囲む範囲 (ピクセル座標、ページ画像内に制限)
+            x0 = max(0, int(math.floor(min(min(a['coords'][0], a['coords'][2]) for a in page_anns) * zoom)) - 1)
+            y0 = max(0, int(math.floor(min(min(a['coords'][1], a['coords'][3]) for a in page_anns) * zoom)) - 1)
+            x1 = min(page_size[0], int(math.ceil(max(max(a['coords'][0], a['coords'][2]) for a in page_anns) * zoom)) + 1)
+            y1 = min(page_size[1], int(math.ceil(max(max(a['coords'][1], a['coords'][3]) for a in page_anns) * zoom)) + 1)
+            if x1 > x0 and y1 > y0:
+                overlay_image = Image.new('RGBA', (x1 - x0, y1 - y0), (0, 0, 0, 0)) # 完全透明
+                self._render_annotations_on_pil(overlay_image, page_idx, zoom, origin=(x0, y0))
+                overlay = ((x0, y0), overlay_image)
+
+        self._annotation_overlay_cache[overlay_key] = overlay
+        # キャッシュサイズが上限を超えた場合、最も古く使われていないオーバーレイを削除
+        while len(self._annotation_overlay_cache) > self.MAX_OVERLAY_CACHE_SIZE:
+            del self._annotation_overlay_cache[next(iter(self._annotation_overlay_cache))]
+        return overlay
+
+    def _use_tiled_rendering(self, page_idx, zoom):
+        """
+        指定ページをタイル表示すべきか (ページ全体をラスタライズすると大きすぎるか) を判定します。
+
+        Args:
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+
+        Returns:
+            bool: ページ全体の画素数が閾値を超える場合True。
+        """
+        page_rect = self.doc[page_idx].rect # 回転を考慮したページサイズ
+        return page_rect.width * zoom * page_rect.height * zoom > self.TILED_RENDER_PIXEL_THRESHOLD
+
+    def _show_page_tiled(self, page_idx, zoom, rotation):
+        """
+        ページをタイル表示モードで表示します。
+        Canvasのスクロール領域はページ全体の大きさにし、タイルは表示範囲に応じて `_update_visible_tiles` で配置します。
+
+        Args:
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            rotation (int): ページの回転角度。
+        """
+        page_pixel_rect = (self.doc[page_idx].rect * fitz.Matrix(zoom, zoom)).irect
+        self._clear_tiles() # アノテーション変更も反映させるため、表示中のタイルは作り直す
+        self._tiled_view = (page_idx, zoom, rotation, (page_pixel_rect.width, page_pixel_rect.height))
+        self.canvas.delete("page_image")
+        self.page_image_pil = None # ページ全体の画像は作成しない
+        self.page_image_tk = None
+        self.canvas.config(scrollregion=(0, 0, page_pixel_rect.width, page_pixel_rect.height))
+        self._update_visible_tiles()
+
+    def _clear_tiles(self):
+        """表示中のタイルをCanvasから削除し、タイル表示モードを解除します (タイルキャッシュは保持)。"""
+        for item_id, _ in self._tile_items.values():
+            self.canvas.delete(item_id)
+        self._tile_items.clear()
+        self._tiled_view = None
+
+    def _schedule_tile_update(self):
+        """タイルの更新処理をアイドル時に予約します (スクロールイベントの連続発生をまとめるため)。"""
+        if not self._tile_update_scheduled:
+            self._tile_update_scheduled = True
+            self.root.after_idle(self._update_visible_tiles)
+
+    def _update_visible_tiles(self):
+        """
+        Canvasの表示範囲 (＋タイル1枚分の余白) に必要なタイルを配置し、範囲外のタイルを削除します。
+        画面中央に近いタイルから順に、1回あたり `TILES_PER_UPDATE` 枚ずつレンダリングし、
+        残りは次のアイドル処理に回すことでスクロール中もUIが固まらないようにします。
+        """
+        self._tile_update_scheduled = False
+        if not self._tiled_view or not self.doc:
+            return
+        page_idx, zoom, rotation, (page_w, page_h) = self._tiled_view
+        tile = self.TILE_SIZE
+
+        # 表示範囲 (Canvas座標) に余白を加えた範囲に含まれるタイルの列・行を求める
+        view_x0, view_y0 = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        view_x1, view_y1 = view_x0 + self.canvas.winfo_width(), view_y0 + self.canvas.winfo_height()
+        cols = range(max(0, int((view_x0 - tile) // tile)), min(math.ceil(page_w / tile), int((view_x1 + tile) // tile) + 1))
+        rows = range(max(0, int((view_y0 - tile) // tile)), min(math.ceil(page_h / tile), int((view_y1 + tile) // tile) + 1))
+        wanted = {(col, row) for col in cols for row in rows}
+
+        # 範囲外になったタイルをCanvasから削除 (タイル画像自体はキャッシュに残る)
+        for tile_pos in [pos for pos in self._tile_items if pos not in wanted]:
+            self.canvas.delete(self._tile_items.pop(tile_pos)[0])
+
+        # 表示範囲の中心に近いタイルから順に配置
+        center_x, center_y = (view_x0 + view_x1) / 2, (view_y0 + view_y1) / 2
+        missing = sorted((pos for pos in wanted if pos not in self._tile_items),
+                         key=lambda pos: abs((pos[0] + 0.5) * tile - center_x) + abs((pos[1] + 0.5) * tile - center_y))
+        for col, row in missing[:self.TILES_PER_UPDATE]:
+            tile_image = self._get_tile(page_idx, zoom, rotation, col, row, (page_w, page_h))
+            tile_image = self._compose_tile_overlay(tile_image, page_idx, zoom, col * tile, row * tile)
+            photo = ImageTk.PhotoImage(tile_image)
+            item_id = self.canvas.create_image(col * tile, row * tile, anchor="nw", image=photo, tags="page_image")
+            self.canvas.tag_lower(item_id) # アノテーション枠より背面に配置
+            self._tile_items[(col, row)] = (item_id, photo)
+        if len(missing) > self.TILES_PER_UPDATE: # 残りのタイルは次のアイドル処理で描画
+            self._schedule_tile_update()
+
+    def _get_tile(self, page_idx, zoom, rotation, col, row, page_size):
+        """
+        指定位置のタイル (アノテーションを含まない素の画像) を返します。キャッシュになければレンダリングします。
+        レンダリングはページのDisplayListから `clip` 指定で行うため、ページの解析はページごとに1回で済みます。
+
+        Args:
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            rotation (int): ページの回転角度。
+            col (int): タイルの列。
+            row (int): タイルの行。
+            page_size (tuple): ページ全体のピクセルサイズ (幅, 高さ)。
+
+        Returns:
+            PIL.Image.Image: タイル画像。
+        """
+        tile_key = (page_idx, zoom, rotation, col, row)
+        tile_image = self._tile_cache.get(tile_key)
+        if tile_image is not None:
+            return tile_image
+
+        if not self._tile_display_list or self._tile_display_list[0] != (page_idx, rotation):
+            self._tile_display_list = ((page_idx, rotation), self.doc[page_idx].get_displaylist())
+        tile = self.TILE_SIZE
+        # タイルの範囲 (ピクセル座標) を表示上のページ座標に変換してクリップ領域とする
+        clip = fitz.Rect(col * tile / zoom, row * tile / zoom,
+                         min((col + 1) * tile, page_size[0]) / zoom, min((row + 1) * tile, page_size[1]) / zoom)
+        pix = self._tile_display_list[1].get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip)
+        tile_image = pixmap_to_image(pix)
+
+        self._tile_cache.put(tile_key, tile_image) # 上限を超えた分は最も古く使われていないタイルから削除される
+        return tile_image
+
+    def _compose_tile_overlay(self, tile_image, page_idx, zoom, tile_x, tile_y):
+        """
+        タイル画像に、タイルの範囲にかかるアノテーションを合成した画像を返します。
+        範囲にかかるアノテーションがなければ、タイル画像をそのまま返します。
+
+        Args:
+            tile_image (PIL.Image.Image): 素のタイル画像 (キャッシュ内の画像のため書き換えない)。
+            page_idx (int): ページインデックス。
+            zoom (float): ズーム倍率。
+            tile_x (int): タイル左上のピクセルX座標。
+            tile_y (int): タイル左上のピクセルY座標。
+
+        Returns:
+            PIL.Image.Image: 合成後のタイル画像。
+        """
+        tile_x1, tile_y1 = tile_x + tile_image.width, tile_y + tile_image.height
+        if not self.annotations.query_rect(page_idx, (tile_x / zoom, tile_y / zoom, tile_x1 / zoom, tile_y1 / zoom)):
+            return tile_image
+        overlay_image = Image.new('RGBA', tile_image.size, (0, 0, 0, 0))
+        self._render_annotations_on_pil(overlay_image, page_idx, zoom, origin=(tile_x, tile_y))
+        composed_image = tile_image.copy()
+        composed_image.paste(overlay_image, (0, 0), overlay_image)
+        return composed_image
+
+    def _is_continuous_view(self):
+        """
+        連続スクロール表示で描画すべきかを返します。
+        ページ全体をラスタライズできないほどの高倍率 (タイル表示が必要な場合) は単ページ表示に切り替えます。
+        """
+        return bool(self.doc) and self.continuous_scroll_var.get() and \
+            not self._use_tiled_rendering(self.current_page_index, max(0.01, self.zoom_factor))
+
+    def _on_continuous_scroll_toggled(self):
+        """「連続スクロール」チェックボックスが切り替えられたときに、現在のページ位置で表示し直します。"""
+        self._continuous_anchor = None
+        if self.doc:
+            self.show_page()
+
+    def _get_continuous_layout(self):
+        """
+        連続スクロール表示での各ページの配置 (現在のズーム倍率) を返します。
+        ページサイズはPDFを開いた後 (または回転後) に1回だけ取得し、ズーム倍率が変わったときは配置のみ計算し直します。
+
+        Returns:
+            tuple: (ズーム倍率, 各ページの上端Y座標のリスト, 全体の幅, 全体の高さ)。
+        """
+        zoom = max(0.01, self.zoom_factor)
+        if self._continuous_page_sizes is None:
+            self._continuous_page_sizes = [(page.rect.width, page.rect.height) for page in self.doc]
+        if self._continuous_layout is None or self._continuous_layout[0] != zoom:
+            matrix = fitz.Matrix(zoom, zoom)
+            tops = []
+            y = self.CONTINUOUS_PAGE_GAP
+            max_width = 0
+            for width, height in self._continuous_page_sizes:
+                page_irect = (fitz.Rect(0, 0, width, height) * matrix).irect # レンダリングされる画像と同じ大きさ
+                tops.append(y)
+                y += page_irect.height + self.CONTINUOUS_PAGE_GAP
+                max_width = max(max_width, page_irect.width)
+            self._continuous_layout = (zoom, tops, max_width, y)
+        return self._continuous_layout
+
+    def _invalidate_continuous_layout(self):
+        """ページサイズが変わった (回転、別のPDFを開いたなど) ときに、連続スクロール表示の配置を破棄します。"""
+        self._continuous_page_sizes = None
+        self._continuous_layout = None
+        self._clear_continuous_pages()
+
+    def _page_at_canvas_y(self, canvas_y):
+        """
+        連続スクロール表示で、指定されたCanvas Y座標にあるページ (ページ間の余白の場合は直前のページ) を返します。
+
+        Args:
+            canvas_y (float): Canvas Y座標。
+
+        Returns:
+            int: ページインデックス。
+        """
+        tops = self._get_continuous_layout()[1]
+        return min(max(bisect.bisect_right(tops, canvas_y) - 1, 0), len(tops) - 1)
+
+    def _page_origin(self, page_idx):
+        """
+        Canvas上でのページ左上の座標を返します。単ページ表示では常に (0, 0) です。
+
+        Args:
+            page_idx (int): ページインデックス。
+
+        Returns:
+            tuple: (X, Y)。
+        """
+        if self._is_continuous_view(): # 連続スクロール表示中 (高倍率でタイル表示に切り替えた場合は単ページ表示)
+            return 0, self._get_continuous_layout()[1][page_idx]
+        return 0, 0
+
+    def _pdf_to_canvas(self, coords_pdf, page_idx):
+        """
+        PDF座標 (x, y の組の並び) を、指定ページのCanvas座標に変換します。
+
+        Args:
+            coords_pdf (sequence): PDF座標 (例: (x0, y0, x1, y1))。
+            page_idx (int): 座標が属するページのインデックス。
+
+        Returns:
+            list: Canvas座標。
+        """
+        origin = self._page_origin(page_idx)
+        return [c * self.zoom_factor + origin[i % 2] for i, c in enumerate(coords_pdf)]
+
+    def _canvas_to_pdf(self, coords_canvas, page_idx):
+        """
+        Canvas座標 (x, y の組の並び) を、指定ページのPDF座標に変換します。
+
+        Args:
+            coords_canvas (sequence): Canvas座標 (例: (x0, y0, x1, y1))。
+            page_idx (int): 座標が属するページのインデックス。
+
+        Returns:
+            tuple: PDF座標。
         """
-        指定されたパスのPDFファイルを開き、アプリケーションの状態を初期化します。
-        既存のドキュメントは閉じられます。
+        origin = self._page_origin(page_idx)
+        return tuple((c - origin[i % 2]) / self.zoom_factor for i, c in enumerate(coords_canvas))
+
+    def _select_page_at_canvas_y(self, canvas_y):
+        """
+        連続スクロール表示で、クリックされた位置のページを現在のページにします (表示位置は変えません)。
+        単ページ表示では何もしません。
 
         Args:
-            path (str): 開くPDFファイルのフルパス。
+            canvas_y (float): クリック位置のCanvas Y座標。
         """
-        try:
-            if self.doc: # 既に別のPDFが開いていれば閉じる
-                self.doc.close()
-            
-            self.doc = fitz.open(path) # PyMuPDFでPDFを開く
-            self.pdf_path = path
-            self.current_page_index = 0 # 最初のページを表示
-            
-            # UI要素の更新
-            self.filename_label.config(text=os.path.basename(path)) # ファイル名ラベル更新
-            self.page_entry.delete(0, tk.END)
-            self.page_entry.insert(0, "0")
-            
-            # アプリケーション状態のリセット
-            self.annotations.clear()
-            self.canvas_item_to_ann.clear()
-            self.selected_ann = None
-            self.zoom_scale.set(int(self.zoom_factor * 100)) # ズームをデフォルトに戻す
-            self.deselect_all_annotations() # 念のため選択解除処理
-            
-            # キャッシュクリア
-            self._rendered_page_cache.clear()
-            self._page_cache_lru.clear()
-            self._dirty_pages.clear()
-            
-            self.show_page() # 最初のページを表示
-            self._update_text_preview("") # 新しいPDFを開いた直後はテキストプレビューをクリア
-            self._save_state() # 新しいPDFを開いた状態をundoスタックの初期状態として保存
-        except Exception as e:
-            messagebox.showerror("エラー", f"PDF読み込み失敗: {e}")
-            if self.doc: self.doc.close() # エラー時もドキュメントが開いていれば閉じる
-            self.doc = None
-            self.pdf_path = None
-            self.filename_label.config(text="(未選択)")
-            self.clear_canvas_and_reset_scroll() # Canvasをクリア
+        if self._continuous_items and self._is_continuous_view():
+            self._set_current_page_from_view(self._page_at_canvas_y(canvas_y))
 
-    def set_zoom_factor_from_scale(self, value): 
+    def _set_current_page_from_view(self, page_idx):
         """
-        ズームスライダーの値が変更されたときに呼び出されます。
-        ズーム倍率を更新し、ページを再表示します。
+        連続スクロール表示で、スクロールやクリックにより操作対象のページが変わったときに、
+        現在のページとページ番号表示を更新します。
 
         Args:
-            value (str): スライダーから渡される現在の値 (文字列型、パーセント表示)。
+            page_idx (int): 新しい現在のページのインデックス。
         """
-        new_zoom = float(value) / 100.0 # パーセントから倍率 (0.0-1.0) に変換
-        if self.zoom_factor != new_zoom: # 実際にズーム倍率が変わった場合のみ処理
-            self.zoom_factor = new_zoom
-            # ズーム変更時は全ページのレンダリングキャッシュが無効になるためクリア
-            self._rendered_page_cache.clear()
-            self._page_cache_lru.clear()
-            self._dirty_pages.clear() # ダーティフラグも一旦クリア (全ページ再描画のため)
-            self.show_page()
+        self._continuous_anchor = (page_idx, max(0.01, self.zoom_factor)) # 既に表示されているのでスクロール不要
+        if page_idx == self.current_page_index:
+            return
+        self.current_page_index = page_idx
+        self.page_entry.delete(0, tk.END)
+        self.page_entry.insert(0, str(page_idx))
+        self.update_page_info_label()
+        self.thumbnail_navigator.set_current_page(page_idx)
 
-    def show_page(self): 
+    def _show_continuous_pages(self):
         """
-        現在のページ (`self.current_page_index`) をCanvasに表示します。
-        ページのレンダリングはキャッシュを利用し、必要な場合のみ行います。
-        アノテーションの描画、ページ情報ラベルの更新もここで行います。
+        全ページを縦に並べた連続スクロール表示で再描画します。
+        ページ移動やズーム変更の直後は現在のページの先頭までスクロールし、
+        アノテーション編集後などはスクロール位置を保ったまま表示範囲のページを更新します。
         """
-        if not self.doc: # PDFドキュメントが開かれていない場合は何もしない
-            self.clear_canvas_and_reset_scroll()
-            self._update_text_preview("")
+        self._clear_tiles()
+        self.canvas.delete("page_image") # 単ページ表示の画像を削除
+        self.page_image_pil = None
+        self.page_image_tk = None
+
+        zoom = max(0.01, self.zoom_factor)
+        if self._continuous_layout and self._continuous_layout[0] != zoom:
+            self._clear_continuous_pages() # ページの位置と大きさが全て変わるため配置し直す
+        _, tops, total_width, total_height = self._get_continuous_layout()
+        self.canvas.config(scrollregion=(0, 0, total_width, total_height))
+        if self._continuous_anchor != (self.current_page_index, zoom):
+            # ページ移動 (前へ/次へ、サムネイルなど) やズーム変更: 現在のページの先頭を表示
+            self.canvas.yview_moveto(max(0, tops[self.current_page_index] - self.CONTINUOUS_PAGE_GAP) / total_height)
+            self._continuous_anchor = (self.current_page_index, zoom)
+
+        # アノテーション枠は全て描き直す (編集された可能性があるため)
+        self.canvas.delete("annotation_group")
+        self.canvas_item_to_ann.clear()
+        for page_idx in self._continuous_items:
+            self._draw_continuous_page_boxes(page_idx)
+        self._update_continuous_view()
+
+        self.update_page_info_label()
+        self.thumbnail_navigator.set_current_page(self.current_page_index)
+        self.highlight_selected_annotation()
+
+    def _schedule_continuous_update(self):
+        """連続スクロール表示の更新をアイドル時に1回だけ実行するよう予約します (スクロール中の連続イベントをまとめる)。"""
+        if not self._continuous_update_scheduled:
+            self._continuous_update_scheduled = True
+            self.root.after_idle(lambda: self._update_continuous_view(follow_scroll=True))
+
+    def _update_continuous_view(self, follow_scroll=False):
+        """
+        連続スクロール表示で、表示範囲 (＋上下の先読み範囲) に入ったページを配置し、範囲外のページの画像を解放します。
+        未レンダリングのページは、画面内のものは暫定画像を表示してワーカーに依頼し、先読み範囲のものは依頼のみ行います。
+
+        Args:
+            follow_scroll (bool, optional): スクロールにより現在のページが画面外に出た場合に、
+                画面を最も大きく占めるページを現在のページにするかどうか。
+        """
+        self._continuous_update_scheduled = False
+        if not self._is_continuous_view():
             return
-        
-        page_idx = self.current_page_index
-        actual_zoom = max(0.01, self.zoom_factor) # ズーム倍率が0以下にならないように保護
-        
-        # 現在のページの回転角度を取得
-        current_rotation = self.doc[page_idx].rotation
-        cache_key = (page_idx, actual_zoom, current_rotation) # キャッシュキー (回転情報も含む)
-        
-        # ページの再レンダリングが必要かどうかの判断:
-        # 1. キャッシュに存在しない
-        # 2. または、ページがダーティ (アノテーション変更など) である
-        needs_rerender = cache_key not in self._rendered_page_cache or page_idx in self._dirty_pages
+        zoom, tops, _, _ = self._get_continuous_layout()
+        view_top = self.canvas.canvasy(0)
+        view_bottom = view_top + self.canvas.winfo_height()
+        margin = self.canvas.winfo_height() * self.CONTINUOUS_PREFETCH_SCREENS
+        # (表示範囲の上端がページ間の余白にある場合、その上のページは見えていないため余白分ずらして判定)
+        first_visible = self._page_at_canvas_y(view_top + self.CONTINUOUS_PAGE_GAP)
+        last_visible = self._page_at_canvas_y(view_bottom)
+        first_wanted, last_wanted = self._page_at_canvas_y(view_top - margin), self._page_at_canvas_y(view_bottom + margin)
+
+        for page_idx in list(self._continuous_items):
+            if not (first_wanted <= page_idx <= last_wanted):
+                self._release_continuous_page(page_idx)
+
+        # 画面内のページ → 先読み範囲のページ (画面に近い順) の順に処理する
+        wanted_pages = list(range(first_visible, last_visible + 1))
+        for distance in range(1, max(first_visible - first_wanted, last_wanted - last_visible) + 1):
+            wanted_pages.extend(idx for idx in (last_visible + distance, first_visible - distance)
+                                if first_wanted <= idx <= last_wanted)
+        worker_keys = []
+        for page_idx in wanted_pages:
+            cache_key = (page_idx, zoom, self.doc[page_idx].rotation)
+            if cache_key not in self._rendered_page_cache:
+                worker_keys.append(cache_key)
+            self._place_continuous_page(page_idx, cache_key, on_screen=first_visible <= page_idx <= last_visible)
+
+        if self._render_worker:
+            self._render_worker.cancel_except(set(worker_keys))
+            for key in worker_keys:
+                self._render_worker.submit(*key)
+            self._schedule_render_poll()
+
+        if follow_scroll and self.drag_mode == 'none' and \
+           not (first_visible <= self.current_page_index <= last_visible):
+            # 現在のページが画面外に出た場合は、画面を最も大きく占めるページを現在のページにする
+            visible_heights = {idx: min(view_bottom, tops[idx] + self._page_image_height(idx, zoom)) - max(view_top, tops[idx])
+                               for idx in range(first_visible, last_visible + 1)}
+            self._set_current_page_from_view(max(visible_heights, key=visible_heights.get))
+
+    def _page_image_height(self, page_idx, zoom):
+        """連続スクロール表示でのページ画像の高さ (ピクセル) を返します。"""
+        width, height = self._continuous_page_sizes[page_idx]
+        return (fitz.Rect(0, 0, width, height) * fitz.Matrix(zoom, zoom)).irect.height
+
+    def _place_continuous_page(self, page_idx, cache_key, on_screen):
+        """
+        連続スクロール表示で1ページ分の画像を配置 (または差し替え) します。
+        既に同じ画像を配置済みで、アノテーションの変更もない場合は何もしません。
 
-        if needs_rerender:
-            # --- ページのレンダリング処理 ---
-            page = self.doc[page_idx]
-            # PyMuPDFでページを指定されたズーム倍率でピクセルマップにレンダリング
-            # fitz.Matrix(zoom_x, zoom_y) でズームを指定
-            pix = page.get_pixmap(matrix=fitz.Matrix(actual_zoom, actual_zoom))
-            mode = "RGB" if pix.alpha == 0 else "RGBA" # アルファチャンネルの有無でモード決定
-            # ピクセルマップからPillow Imageオブジェクトを生成
-            current_pil_image = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-            
-            # このPIL画像上に、このページのアノテーションを描画
-            self._render_annotations_on_pil(current_pil_image, page_idx, actual_zoom)
-            
-            # レンダリング結果をキャッシュに保存
-            self._rendered_page_cache[cache_key] = current_pil_image
-            if page_idx in self._dirty_pages:
-                self._dirty_pages.remove(page_idx) # ダーティフラグを解除
-            
-            # LRUキャッシュの更新
-            if cache_key in self._page_cache_lru:
-                self._page_cache_lru.remove(cache_key)
-            self._page_cache_lru.append(cache_key)
-            
-            # キャッシュサイズが上限を超えた場合、最も古く使われていないエントリを削除
-            if len(self._page_cache_lru) > self.MAX_PAGE_CACHE_SIZE:
-                oldest_key = self._page_cache_lru.pop(0)
-                if oldest_key in self._rendered_page_cache:
-                    del self._rendered_page_cache[oldest_key]
-            
-            self.page_image_pil = current_pil_image # 表示用のPillow Imageを更新
+        Args:
+            page_idx (int): ページインデックス。
+            cache_key (tuple): (ページインデックス, ズーム倍率, 回転角度)。
+            on_screen (bool): ページが画面内にあるか。画面外のページは暫定画像を作らず、レンダリング済みの場合のみ配置します。
+        """
+        entry = self._continuous_items.get(page_idx)
+        is_cached = cache_key in self._rendered_page_cache
+        if entry and entry["key"] == cache_key and page_idx not in self._dirty_pages and \
+           not (entry["interim"] and is_cached):
+            return # 配置済みの画像がそのまま使える
+
+        zoom = cache_key[1]
+        page_layer = self._rendered_page_cache.get(cache_key)
+        if page_layer is None and self._disk_cache and self._doc_hash and not self._render_worker:
+            page_layer = self._disk_cache.load(self._doc_hash, *cache_key) # ワーカーがある場合はワーカーが読み込む
+            if page_layer is not None:
+                self._store_rendered_page(cache_key, page_layer)
+        is_interim = page_layer is None
+        if is_interim:
+            if not on_screen:
+                return # 先読み範囲のページはワーカーのレンダリング完了後に配置する
+            if self._render_worker:
+                page_layer = self._get_interim_page_image(page_idx, zoom, cache_key[2])
+            else: # ワーカーが使えない場合は同期的にレンダリング
+                pix = self.doc[page_idx].get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+                page_layer = pixmap_to_image(pix)
+                self._store_rendered_page(cache_key, page_layer)
+                is_interim = False
+
+        display_image = self._compose_page_image(page_layer, page_idx, zoom)
+        photo = entry["photo"] if entry else None
+        if photo is not None and (photo.width(), photo.height()) == display_image.size:
+            photo.paste(display_image) # 同じサイズなら既存のPhotoImageへ書き込み、Tkイメージの再確保を避ける
+        elif entry:
+            photo = ImageTk.PhotoImage(display_image)
+            self.canvas.itemconfig(entry["item"], image=photo)
         else:
-            # キャッシュから画像を再利用
-            self.page_image_pil = self._rendered_page_cache[cache_key]
-            # LRUリスト内でアクセスされたキーを末尾に移動
-            if cache_key in self._page_cache_lru:
-                self._page_cache_lru.remove(cache_key)
-            self._page_cache_lru.append(cache_key)
-
-        # --- Canvasへの表示処理 ---
-        # Pillow ImageをTkinter PhotoImageに変換
-        self.page_image_tk = ImageTk.PhotoImage(self.page_image_pil)
-        self.canvas.delete("page_image") # 既存のページ画像を削除 (タグで管理)
-        # Canvasの(0,0)に新しいページ画像を表示 (アンカーは北西)
-        self.canvas.create_image(0, 0, anchor="nw", image=self.page_image_tk, tags="page_image")
-        # Canvasのスクロール領域を画像のサイズに合わせる
-        self.canvas.config(scrollregion=(0, 0, self.page_image_pil.width, self.page_image_pil.height))
-        
-        # --- Canvas上のアノテーション枠の再描画 ---
-        # (アノテーション自体はPIL画像に焼きこまれているが、選択用の枠はCanvas上に別途描画)
-        self.canvas.delete("annotation_group") # 既存のアノテーション枠を全て削除
-        self.canvas_item_to_ann.clear() # マッピングもクリア
-        # 現在のページのアノテーションのみを取得して描画
-        page_anns = [ann for ann in self.annotations if ann['page_idx'] == page_idx]
-        for ann in page_anns:
+            photo = ImageTk.PhotoImage(display_image)
+            item_id = self.canvas.create_image(0, self._get_continuous_layout()[1][page_idx], anchor="nw",
+                                               image=photo, tags="continuous_page")
+            self.canvas.tag_lower(item_id) # アノテーション枠より背面に配置
+            entry = {"item": item_id}
+            self._continuous_items[page_idx] = entry
+            self._draw_continuous_page_boxes(page_idx)
+        entry.update(photo=photo, key=cache_key, interim=is_interim)
+
+    def _draw_continuous_page_boxes(self, page_idx):
+        """連続スクロール表示で、指定ページのアノテーション枠を描画します。"""
+        for ann in self.annotations.on_page(page_idx):
             self._draw_annotation_bounding_box_on_canvas(ann, self.canvas_item_to_ann)
+        if self.selected_ann and self.selected_ann['page_idx'] == page_idx:
+            self.highlight_selected_annotation()
+
+    def _release_continuous_page(self, page_idx):
+        """連続スクロール表示で範囲外になったページの画像 (PhotoImage) とアノテーション枠を解放します。"""
+        entry = self._continuous_items.pop(page_idx)
+        self.canvas.delete(entry["item"])
+        tag = f"page_boxes_{page_idx}"
+        for item_id in self.canvas.find_withtag(tag):
+            self.canvas_item_to_ann.pop(item_id, None)
+        self.canvas.delete(tag)
+
+    def _clear_continuous_pages(self):
+        """連続スクロール表示で配置した全てのページを削除します。"""
+        for page_idx in list(self._continuous_items):
+            self._release_continuous_page(page_idx)
+        self._continuous_anchor = None
+
+    def _prefetch_neighbour_pages(self):
+        """
+        現在のページ (暫定表示中の場合) と前後 (N±1, N±2) のページを、バックグラウンドワーカーでレンダリングするよう依頼します。
+        新しい先読み範囲に含まれない未着手のジョブ (ユーザーが別のページへ移動した場合など) はキャンセルされます。
+        """
+        if not self.doc or not self._render_worker or self._is_continuous_view():
+            return # 連続スクロール表示では `_update_continuous_view` が表示範囲に合わせて依頼する
+        zoom = max(0.01, self.zoom_factor)
+        wanted_keys = [] # 現在のページを最優先に、近いページから順に先読みする
+        for distance in range(0, self.PREFETCH_RADIUS + 1):
+            neighbours = (self.current_page_index,) if distance == 0 else \
+                         (self.current_page_index + distance, self.current_page_index - distance)
+            for idx in neighbours:
+                if 0 <= idx < len(self.doc) and not self._use_tiled_rendering(idx, zoom): # タイル表示のページは全体を先読みしない
+                    key = (idx, zoom, self.doc[idx].rotation)
+                    if key not in self._rendered_page_cache:
+                        wanted_keys.append(key)
         
-        self.update_page_info_label() # ページ情報ラベルを更新
-        self.highlight_selected_annotation() # 選択中のアノテーションがあればハイライト
+        self._render_worker.cancel_except(set(wanted_keys))
+        for key in wanted_keys:
+            self._render_worker.submit(*key)
+        self._schedule_render_poll()
+
+    def _schedule_render_poll(self):
+        """ワーカーの結果ポーリングを予約します (既に予約済み、またはジョブがなければ何もしない)。"""
+        if not self._render_poll_scheduled and self._render_worker and self._render_worker.has_pending():
+            self._render_poll_scheduled = True
+            self.root.after(self.RENDER_POLL_INTERVAL_MS, self._poll_render_results)
+
+    def _poll_render_results(self):
+        """
+        バックグラウンドワーカーで完了したレンダリング結果 (素のページ画像) を取り出し、ページキャッシュに格納します。
+        取り出した時点で回転角度が変わっている結果は破棄します。ズーム倍率が変わっている結果も
+        別の倍率の暫定表示に使えるためキャッシュには格納しますが、表示の差し替えは行いません。
+        ワーカーでのレンダリングに失敗したページが暫定画像のまま表示されている場合は、同期的にレンダリングします。
+        ワーカープロセスが異常終了した場合はワーカーを停止し、以降は同期レンダリングで表示します。
+        """
+        self._render_poll_scheduled = False
+        if not self.doc or not self._render_worker:
+            return
+        for cache_key, pil_image in self._render_worker.poll_results():
+            page_idx, zoom, rotation = cache_key
+            if not (0 <= page_idx < len(self.doc)) or self.doc[page_idx].rotation != rotation:
+                continue # 古い条件でのレンダリング結果
+            if cache_key in self._rendered_page_cache:
+                continue # 既に同期レンダリング済み
+            if pil_image is None: # ワーカーでのレンダリングに失敗した
+                if not self._is_waiting_for_render(cache_key):
+                    continue # 先読みのみのページは、表示するときに改めてレンダリングする
+                # 表示中のページが低解像度の暫定画像のまま残らないよう、同期的にレンダリングする
+                pil_image = pixmap_to_image(self.doc[page_idx].get_pixmap(matrix=fitz.Matrix(zoom, zoom)))
+                if self._disk_cache and self._doc_hash:
+                    self._disk_cache.store(self._doc_hash, *cache_key, pil_image)
+            self._store_rendered_page(cache_key, pil_image)
+            if self._continuous_items:
+                self._schedule_continuous_update() # 連続スクロール表示中の暫定画像の差し替え、先読み範囲のページの配置
+            elif page_idx == self.current_page_index and zoom == max(0.01, self.zoom_factor) and not self._tiled_view:
+                self._display_page_image(pil_image, page_idx, zoom) # 暫定表示中の画像を高解像度の画像に差し替え
+        if self._render_worker.is_broken():
+            print("Background render worker stopped unexpectedly; rendering pages synchronously")
+            self._stop_render_worker()
+            return
+        self._schedule_render_poll()
 
-        # テキストプレビューの自動更新は行わない (「文字出力」ボタンで明示的に行う)
+    def _is_waiting_for_render(self, cache_key):
+        """
+        指定したキーのページが暫定画像で表示されていて、高解像度のレンダリング結果を待っているかを返します。
 
-    def _render_annotations_on_pil(self, pil_image, page_idx, zoom): 
+        Args:
+            cache_key (tuple): (ページインデックス, ズーム倍率, 回転角度)。
+
+        Returns:
+            bool: 待っている場合True。
+        """
+        page_idx, zoom, _ = cache_key
+        if self._is_continuous_view():
+            entry = self._continuous_items.get(page_idx)
+            return bool(entry) and entry["interim"] and entry["key"] == cache_key
+        return page_idx == self.current_page_index and zoom == max(0.01, self.zoom_factor) and not self._tiled_view
+
+    def _start_render_worker(self):
+        """現在のPDF用のバックグラウンドレンダリングワーカーを (再) 起動します。"""
+        self._stop_render_worker()
+        if self.pdf_path:
+            try:
+                self._render_worker = PageRenderWorker(self.pdf_path, max_workers=self.RENDER_WORKER_COUNT,
+                                                       disk_cache=self._disk_cache, doc_hash=self._doc_hash)
+            except Exception as e: # ワーカーが起動できなくても、同期レンダリングで動作は継続できる
+                print(f"Background render worker could not be started: {e}")
+                self._render_worker = None
+
+    def _stop_render_worker(self):
+        """バックグラウンドレンダリングワーカーを停止します。"""
+        if self._render_worker:
+            self._render_worker.shutdown()
+            self._render_worker = None
+
+    def _render_annotations_on_pil(self, pil_image, page_idx, zoom, origin=(0, 0)): 
         """
-        指定されたPillow Imageオブジェクト (ページのレンダリング結果) に、
-        該当ページのアノテーションを描画（焼きこみ）します。
+        指定されたRGBAのPillow Imageオブジェクト (アノテーションオーバーレイ層) に、
+        該当ページのアノテーションを描画します。
         描画順序 (Zオーダー) も考慮されます。
 
         Args:
-            pil_image (PIL.Image.Image): アノテーションを描画する対象のPillow Imageオブジェクト。
+            pil_image (PIL.Image.Image): アノテーションを描画する対象のRGBA画像 (通常は透明で初期化されたオーバーレイ)。
             page_idx (int): アノテーションを描画するページのインデックス。
             zoom (float): 現在の表示ズーム倍率。
+            origin (tuple, optional): `pil_image` の左上がページ画像上のどのピクセル位置に対応するか。デフォルトは (0, 0)。
         """
         draw = ImageDraw.Draw(pil_image) # Pillowの描画コンテキストを取得
-        page_annotations = [ann for ann in self.annotations if ann['page_idx'] == page_idx]
+        origin_x, origin_y = origin
+        # 描画対象の画像 (タイルなど) の範囲にかかるアノテーションのみを空間索引から取得
+        page_annotations = self.annotations.query_rect(page_idx, (origin_x / zoom, origin_y / zoom,
+                                                                  (origin_x + pil_image.width) / zoom, (origin_y + pil_image.height) / zoom))
 
         # アノテーションの描画順序を定義 (値が小さいものが先に描画される = 奥になる)
         def get_render_order(ann): 
@@ -1015,9 +3657,12 @@ PDF編集ツール 操作方法
 
         for ann in sorted_annotations:
             coords_pdf = ann['coords'] # PDF座標系でのアノテーション座標 (x0, y0, x1, y1)
-            # Pillow Image上の描画座標に変換 (ズーム適用)
-            x0_pil, y0_pil, x1_pil, y1_pil = [c * zoom for c in coords_pdf]
+            # オーバーレイ画像上の描画座標に変換 (ズーム適用後、オーバーレイの原点分ずらす)
+            x0_pil, y0_pil, x1_pil, y1_pil = (coords_pdf[0] * zoom - origin_x, coords_pdf[1] * zoom - origin_y,
+                                              coords_pdf[2] * zoom - origin_x, coords_pdf[3] * zoom - origin_y)
             pil_bbox_w, pil_bbox_h = x1_pil - x0_pil, y1_pil - y0_pil # 描画領域の幅と高さ
+            if x1_pil < 0 or y1_pil < 0 or x0_pil > pil_image.width or y0_pil > pil_image.height:
+                continue # 描画対象の画像 (タイルなど) の範囲外にあるアノテーションは描画しない
 
             ann_type = ann.get('type')
 
@@ -1038,28 +3683,18 @@ PDF編集ツール 操作方法
                 text_color = ann.get('text_color', '#000000')
                 is_bold = ann.get('font_bold', False) # 太字情報を取得
 
-                # 描画領域に収まるようにフォントサイズを調整 (ズーム後のピクセルサイズで計算)
-                fitted_font_size = self._get_fitted_font_size(text_content, pil_bbox_w, pil_bbox_h, 
-                                                              int(original_font_size * zoom), font_family, is_bold)
-                if fitted_font_size > 0:
-                    font = self._get_font(fitted_font_size, font_family, is_bold)
-                    
-                    # テキストを矩形の中央（垂直方向）に配置するためのオフセット計算
-                    try:
-                        text_bbox = font.getbbox(text_content) # (left, top, right, bottom)
-                        text_draw_y = y0_pil + (pil_bbox_h - (text_bbox[3] - text_bbox[1])) / 2 - text_bbox[1]
-                        text_draw_x = x0_pil - text_bbox[0]
-                    except AttributeError: # 古いPillowバージョンへのフォールバック
-                        text_width, text_height = font.getsize(text_content)
-                        ascent, descent = font.getmetrics() # フォントのベースライン情報
-                        text_draw_y = y0_pil + (pil_bbox_h - (ascent + descent)) / 2
-                        text_draw_x = x0_pil
-
-                    draw.text((text_draw_x, text_draw_y), text_content, font=font, fill=text_color)
+                # 描画領域に収まるフォントサイズで描画したテキスト画像を取得 (ズーム後のピクセルサイズで計算)
+                text_sprite_entry = self._get_text_sprite(text_content, font_family, is_bold, text_color,
+                                                          pil_bbox_w, pil_bbox_h, int(original_font_size * zoom))
+                if text_sprite_entry:
+                    text_sprite = text_sprite_entry[1]
+                    # テキストを矩形の中央（垂直方向）に配置
+                    text_draw_y = y0_pil + (pil_bbox_h - text_sprite.height) / 2
+                    pil_image.alpha_composite(text_sprite, (int(x0_pil), int(text_draw_y)))
 
             elif ann_type == 'graphic_object' or (ann_type == 'text_box' and ann.get('shape_kind') == 'rectangle'):
                 # 図形描画 (矩形、楕円、直線、フリーハンド)
-                # 透明背景の一時的なPillow画像を作成し、そこに図形を描画後、メイン画像に合成
+                # 透明背景の一時的なPillow画像を作成し、そこに図形を描画後、オーバーレイに合成
                 temp_graphic_pil = Image.new('RGBA', (max(1, int(math.ceil(pil_bbox_w))), max(1, int(math.ceil(pil_bbox_h)))), (0,0,0,0)) # 完全透明
                 temp_draw = ImageDraw.Draw(temp_graphic_pil)
                 
@@ -1076,38 +3711,122 @@ PDF編集ツール 操作方法
                     spec_data = ann.get('shape_specific_data', {})
                     s_pdf, e_pdf = spec_data.get('start'), spec_data.get('end') # PDF座標での始点・終点
                     if s_pdf and e_pdf:
-                        # 一時画像内の相対座標に変換し、線を描画
-                        s_rel = ((s_pdf[0]*zoom)-x0_pil, (s_pdf[1]*zoom)-y0_pil)
-                        e_rel = ((e_pdf[0]*zoom)-x0_pil, (e_pdf[1]*zoom)-y0_pil)
+                        # 一時画像内の相対座標に変換し、線を描画 (一時画像の左上はアノテーション座標の左上)
+                        s_rel = ((s_pdf[0]-coords_pdf[0])*zoom, (s_pdf[1]-coords_pdf[1])*zoom)
+                        e_rel = ((e_pdf[0]-coords_pdf[0])*zoom, (e_pdf[1]-coords_pdf[1])*zoom)
                         temp_draw.line([s_rel, e_rel], fill=line_color, width=line_thickness)
                 elif shape_kind == 'freehand':
-                    points_pdf = ann.get('shape_specific_data', {}).get('points', []) # PDF座標での点群
-                    if len(points_pdf) > 1:
-                        # 一時画像内の相対座標に変換し、フリーハンド線を描画
-                        points_rel_pil = [((p[0]*zoom)-x0_pil, (p[1]*zoom)-y0_pil) for p in points_pdf]
+                    spec_data = ann.get('shape_specific_data')
+                    if spec_data is not None and len(spec_data.point_pairs()) > 1:
+                        # 一時画像内の相対座標 [x0, y0, x1, y1, ...] に変換し、フリーハンド線を描画
+                        # (点ごとのタプルは作らない。PillowはPythonのarrayを座標列として正しく扱えないためリストで渡す)
+                        points_rel_pil = spec_data.transformed_points(zoom, zoom, -coords_pdf[0] * zoom, -coords_pdf[1] * zoom).tolist()
                         temp_draw.line(points_rel_pil, fill=line_color, width=line_thickness, joint="curve") # joint="curve"で滑らかに
                 
-                # 描画した一時画像をメインのPIL画像にアルファ合成で貼り付け
-                pil_image.paste(temp_graphic_pil, (int(x0_pil), int(y0_pil)), temp_graphic_pil)
+                # 描画した一時画像をオーバーレイにアルファ合成
+                pil_image.alpha_composite(temp_graphic_pil, (int(x0_pil), int(y0_pil)))
             
             elif ann_type == 'image_object' and pil_bbox_w > 0 and pil_bbox_h > 0:
                 # 挿入画像の描画
-                image_data_bytes = ann.get('image_data')
-                if image_data_bytes:
+                image_blob = ann.get('image_blob')
+                if image_blob:
                     try:
-                        img_to_paste_orig = Image.open(io.BytesIO(image_data_bytes))
-                        # 描画領域に合わせてリサイズ (アスペクト比維持、高品質フィルタ)
-                        img_to_paste_resized = img_to_paste_orig.copy() # コピーしてからリサイズ
-                        img_to_paste_resized.thumbnail((int(pil_bbox_w), int(pil_bbox_h)), Image.LANCZOS)
-                        
+                        # 描画領域に合わせてリサイズ済みの画像を取得 (キャッシュにあればデコードもリサイズもしない)
+                        img_to_paste_resized = self._get_image_sprite(image_blob, (int(pil_bbox_w), int(pil_bbox_h)))
                         paste_x, paste_y = int(x0_pil), int(y0_pil)
-                        if img_to_paste_resized.mode != 'RGBA': # アルファチャンネルがない場合は変換
-                            img_to_paste_resized = img_to_paste_resized.convert('RGBA')
-                        # メインのPIL画像にアルファ合成で貼り付け
-                        pil_image.paste(img_to_paste_resized, (paste_x, paste_y), img_to_paste_resized)
+                        # オーバーレイにアルファ合成
+                        pil_image.alpha_composite(img_to_paste_resized, (paste_x, paste_y))
                     except Exception as e:
                         print(f"Error rendering pasted image on PIL: {e}") # 画像レンダリングエラーを出力
 
+    def _get_text_sprite(self, text_content, font_family, is_bold, text_color, rect_width, rect_height, max_font_size):
+        """
+        テキストを矩形に収まる最大のフォントサイズで描画した、余白のないRGBA画像を返します。
+        画面表示とPDF生成の両方から使用します。フォントサイズの計算結果 (`FontFitter`) と描画結果を記憶するため、
+        同じ内容・同じサイズのテキストは一度だけラスタライズされます。
+
+        Args:
+            text_content (str): 描画するテキスト。
+            font_family (str): フォントファミリーの内部名。
+            is_bold (bool): 太字にするかどうか。
+            text_color (str): 文字色 (HEXカラーコード)。
+            rect_width (float): テキストを収める矩形の幅。
+            rect_height (float): テキストを収める矩形の高さ。
+            max_font_size (int): フォントサイズの最大値。
+
+        Returns:
+            tuple or None: (キャッシュキー, RGBA画像)。キャッシュキーはPNGデータの取得 (`_get_text_sprite_png`) に使用します。
+                           収まるフォントサイズがない、または描画する画素がない場合はNone。
+                           画像はキャッシュと共有されるため、呼び出し側で変更しないこと。
+        """
+        fitted_font_size = self._get_fitted_font_size(text_content, rect_width, rect_height, max_font_size, font_family, is_bold)
+        if fitted_font_size <= 0:
+            return None
+
+        sprite_key = (text_content, font_family, is_bold, text_color, fitted_font_size)
+        text_sprite = self._text_sprite_cache.get(sprite_key)
+        if text_sprite is None:
+            font = self._get_font(fitted_font_size, font_family, is_bold)
+            try:
+                text_bbox = font.getbbox(text_content) # (left, top, right, bottom)
+            except AttributeError: # 古いPillowバージョンへのフォールバック
+                text_width, text_height = font.getsize(text_content)
+                text_bbox = (0, 0, text_width, text_height)
+            sprite_w, sprite_h = text_bbox[2] - text_bbox[0], text_bbox[3] - text_bbox[1]
+            if sprite_w <= 0 or sprite_h <= 0:
+                return None
+            # 文字色で塗った完全透明の画像にテキストを描画し、アンチエイリアス部分も色がにじまないようにする
+            text_sprite = Image.new('RGBA', (sprite_w, sprite_h), ImageColor.getrgb(text_color)[:3] + (0,))
+            ImageDraw.Draw(text_sprite).text((-text_bbox[0], -text_bbox[1]), text_content, font=font, fill=text_color)
+            self._text_sprite_cache.put(sprite_key, text_sprite)
+        return sprite_key, text_sprite
+
+    def _get_text_sprite_png(self, sprite_key, text_sprite):
+        """
+        `_get_text_sprite` で取得したテキスト画像のPNGデータを返します (PDFへの埋め込み用)。
+        エンコード結果はキャッシュし、同じテキスト画像は一度だけPNGに変換します。
+
+        Args:
+            sprite_key (tuple): `_get_text_sprite` が返したキャッシュキー。
+            text_sprite (PIL.Image.Image): `_get_text_sprite` が返したRGBA画像。
+
+        Returns:
+            bytes: PNGデータ。
+        """
+        png_data = self._text_png_cache.get(sprite_key)
+        if png_data is None:
+            img_bytes = io.BytesIO()
+            text_sprite.save(img_bytes, format='PNG')
+            png_data = img_bytes.getvalue()
+            self._text_png_cache.put(sprite_key, png_data)
+        return png_data
+
+    def _get_image_sprite(self, image_blob, target_size):
+        """
+        挿入画像のデータを、指定サイズに収まるよう縮小したRGBA画像を返します。
+        結果は画像データのハッシュと描画サイズをキーにしたLRUキャッシュ (`_image_sprite_cache`) に保持し、
+        同じ画像を同じサイズで再描画する場合はデコードとリサイズを省略します。
+
+        Args:
+            image_blob (ImageBlob): 画像ファイルのデータ。
+            target_size (tuple): 描画領域の (幅, 高さ) ピクセル数。アスペクト比を維持してこの範囲に収めます。
+
+        Returns:
+            PIL.Image.Image: 縮小済みのRGBA画像 (キャッシュと共有されるため、呼び出し側で変更しないこと)。
+        """
+        cache_key = (image_blob.blob_id, target_size)
+
+        sprite = self._image_sprite_cache.get(cache_key)
+        if sprite is None:
+            sprite = Image.open(io.BytesIO(image_blob.data))
+            # 読み込み前の画像に対してthumbnailを呼ぶことで、JPEGはdraftによりデコード時点で縮小される
+            # (大きな写真でもフル解像度の展開を避けられる)。その後、高品質フィルタでアスペクト比を維持して縮小
+            sprite.thumbnail(target_size, Image.LANCZOS)
+            if sprite.mode != 'RGBA': # アルファチャンネルがない場合は変換
+                sprite = sprite.convert('RGBA')
+            self._image_sprite_cache.put(cache_key, sprite)
+        return sprite
+
     def _on_mouse_wheel(self, event): 
         """
         メインCanvas (PDFプレビュー) 上でのマウスホイールイベントを処理し、Canvasを垂直スクロールします。
@@ -1134,7 +3853,7 @@ PDF編集ツール 操作方法
             item_map (dict): CanvasアイテムIDとアノテーションオブジェクトをマッピングする辞書 (更新される)。
         """
         coords_pdf = ann['coords']
-        coords_canvas = [c * self.zoom_factor for c in coords_pdf] # PDF座標をCanvas座標に変換
+        coords_canvas = self._pdf_to_canvas(coords_pdf, ann['page_idx']) # PDF座標をCanvas座標に変換
         
         # デフォルトの枠線スタイル
         outline_color, width, dash_style = self.default_text_box_outline_color, 1, ()
@@ -1159,7 +3878,7 @@ PDF編集ツール 操作方法
              self.canvas.itemconfig(existing_item_id, outline=outline_color, width=width, dash=dash_style)
         else:
             rect_id = self.canvas.create_rectangle(*coords_canvas, outline=outline_color, width=width, 
-                                                 tags="annotation_group", dash=dash_style) # "annotation_group" タグでグループ化
+                                                 tags=("annotation_group", f"page_boxes_{ann['page_idx']}"), dash=dash_style) # "annotation_group" タグでグループ化
             if 'canvas_items' not in ann: ann['canvas_items'] = {}
             ann['canvas_items']['rect'] = rect_id # アノテーション辞書にCanvasアイテムIDを保存
             item_map[rect_id] = ann # IDとアノテーションのマップに追加
@@ -1222,22 +3941,15 @@ PDF編集ツール 操作方法
         Args:
             event: マウスボタン押下イベントオブジェクト。
         """
-        if not self.page_image_tk: return # ページ未表示なら何もしない
+        if not self.doc: return # ページ未表示なら何もしない
         
         canvas_x, canvas_y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y) # Canvas内の座標に変換
+        self._select_page_at_canvas_y(canvas_y) # 連続スクロール表示ではカーソル下のページを操作対象にする
         self.drag_start_x, self.drag_start_y = canvas_x, canvas_y # ドラッグ開始点を記録
         self.drag_mode = 'none' # ドラッグモードを初期化
 
         # --- クリックされた位置のアノテーションを特定 ---
-        # find_overlapping でクリック地点に重なるCanvasアイテムIDのリストを取得
-        overlapping_items = self.canvas.find_overlapping(canvas_x-1, canvas_y-1, canvas_x+1, canvas_y+1)
-        # 重なっているアイテムの中から、現在ページのアノテーションを最前面から順に探す
-        # (reversedでリストを逆順にし、Canvasの描画順で手前にあるものを優先)
-        clicked_ann = next(
-            (self.canvas_item_to_ann[item_id] for item_id in reversed(overlapping_items) 
-             if item_id in self.canvas_item_to_ann and self.canvas_item_to_ann[item_id]['page_idx'] == self.current_page_index), 
-            None # 見つからなければNone
-        )
+        clicked_ann = self._find_annotation_at(canvas_x, canvas_y)
 
         if clicked_ann: # アノテーションがクリックされた場合
             self.selected_ann = clicked_ann
@@ -1285,13 +3997,42 @@ PDF編集ツール 操作方法
             elif shape_to_draw == "draw_line": 
                 self.temp_canvas_item_id = self.canvas.create_line(canvas_x, canvas_y, canvas_x, canvas_y,
                                                                  fill=line_col, width=line_thick, dash=())
-            # フリーハンドの場合は on_canvas_move_press で線が描画される
+            elif shape_to_draw == "draw_freehand":
+                # フリーハンドは1本の折れ線アイテムを作り、描画中は座標を末尾に追加していく
+                self.temp_canvas_item_id = self.canvas.create_line(canvas_x, canvas_y, canvas_x, canvas_y,
+                                                                 fill=line_col, width=line_thick,
+                                                                 capstyle=tk.ROUND, joinstyle=tk.ROUND)
+                self._freehand_shown_count = 1
             return
 
         # 上記のどの条件にも当てはまらない左クリック (例: 選択モードで何もない場所をクリック)
         if event.num == 1 and not clicked_ann: # アノテーション外をクリックした場合
             self.deselect_all_annotations() # 全ての選択を解除
 
+    def _find_annotation_at(self, canvas_x, canvas_y):
+        """
+        現在のページで、Canvas上の指定位置にある (枠線の上にある) アノテーションを返します。
+        アノテーションの空間索引で候補を絞り込み、枠線の近く (HIT_TOLERANCE_PX 以内) にあるもののうち、
+        最前面 (最後に追加されたもの) を返します。
+
+        Args:
+            canvas_x (float): Canvas上のX座標。
+            canvas_y (float): Canvas上のY座標。
+
+        Returns:
+            dict or None: 見つかったアノテーション。なければNone。
+        """
+        page_idx = self.current_page_index
+        pdf_x, pdf_y = self._canvas_to_pdf((canvas_x, canvas_y), page_idx)
+        tolerance = self.HIT_TOLERANCE_PX / max(0.01, self.zoom_factor) # 許容誤差をPDF座標に換算
+        for ann in reversed(self.annotations.query_point(page_idx, pdf_x, pdf_y, tolerance)):
+            x0, x1 = sorted((ann['coords'][0], ann['coords'][2]))
+            y0, y1 = sorted((ann['coords'][1], ann['coords'][3]))
+            # 枠の内側 (枠線から許容誤差より離れた位置) は対象外 (塗りつぶしのない枠はCanvas上でも枠線のみが当たり判定を持つ)
+            if not (x0 + tolerance < pdf_x < x1 - tolerance and y0 + tolerance < pdf_y < y1 - tolerance):
+                return ann
+        return None
+
     def on_right_click_select(self, event):
         """
         メインCanvas上でのマウス右ボタン押下イベントのハンドラ。
@@ -1300,18 +4041,14 @@ PDF編集ツール 操作方法
         Args:
             event: マウスボタン押下イベントオブジェクト。
         """
-        if not self.page_image_tk: return
+        if not self.doc: return
         
         canvas_x, canvas_y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        self._select_page_at_canvas_y(canvas_y) # 連続スクロール表示ではカーソル下のページを操作対象にする
         self.drag_start_x, self.drag_start_y = canvas_x, canvas_y
         self.drag_mode = 'none'
 
-        overlapping_items = self.canvas.find_overlapping(canvas_x-1, canvas_y-1, canvas_x+1, canvas_y+1)
-        clicked_ann = next(
-            (self.canvas_item_to_ann[item_id] for item_id in reversed(overlapping_items) 
-             if item_id in self.canvas_item_to_ann and self.canvas_item_to_ann[item_id]['page_idx'] == self.current_page_index), 
-            None
-        )
+        clicked_ann = self._find_annotation_at(canvas_x, canvas_y)
 
         if clicked_ann: # アノテーション上で右クリックされた場合
             self.selected_ann = clicked_ann
@@ -1381,14 +4118,14 @@ PDF編集ツール 操作方法
             shape_being_drawn = "draw_rectangle" if self.draw_mode_var.get() == "textbox" else self.draw_mode_var.get()
             
             if shape_being_drawn == "draw_freehand":
-                # フリーハンド描画: 現在の点をリストに追加し、直前の点との間に線を描画
+                # フリーハンド描画: 現在の点をリストに追加し、プレビューの更新は次のフレームでまとめて行う
+                last_x, last_y = self.current_drawing_points_canvas[-1]
+                if math.hypot(cur_x - last_x, cur_y - last_y) < self.FREEHAND_MIN_SAMPLE_DISTANCE_PX:
+                    return # 直前の点とほぼ同じ位置の入力は記録しない
                 self.current_drawing_points_canvas.append((cur_x,cur_y))
-                if len(self.current_drawing_points_canvas) > 1:
-                    p1, p2 = self.current_drawing_points_canvas[-2], self.current_drawing_points_canvas[-1]
-                    self.canvas.create_line(p1[0], p1[1], p2[0], p2[1], 
-                                           fill=self.line_color_var.get(), 
-                                           width=self.line_thickness_scale.get(), 
-                                           tags="temp_drawing_feedback") # 一時的な描画用タグ
+                if self._freehand_feedback_job is None:
+                    self._freehand_feedback_job = self.root.after(self.FREEHAND_FEEDBACK_INTERVAL_MS,
+                                                                  self._flush_freehand_feedback)
             elif self.temp_canvas_item_id: # 矩形、楕円、直線の場合
                 # 一時的なCanvasアイテムの座標を更新してプレビュー
                 self.canvas.coords(self.temp_canvas_item_id, self.drag_start_x, self.drag_start_y, cur_x, cur_y)
@@ -1419,6 +4156,26 @@ PDF編集ツール 操作方法
                                min(new_x0, new_x1), min(new_y0, new_y1), 
                                max(new_x0, new_x1), max(new_y0, new_y1))
 
+    def _flush_freehand_feedback(self):
+        """
+        前回の更新以降に記録されたフリーハンドの点を、プレビューの折れ線アイテムの末尾に追加します。
+        追加分の座標のみをTkに渡すため、線が長くなっても1回の更新にかかる時間は変わりません。
+        """
+        self._freehand_feedback_job = None
+        if self.drag_mode != 'draw_shape' or not self.temp_canvas_item_id: return
+        new_points = self.current_drawing_points_canvas[self._freehand_shown_count:]
+        if not new_points: return
+        coords = [c for point in new_points for c in point]
+        self.canvas.insert(self.temp_canvas_item_id, "end", coords)
+        self._freehand_shown_count += len(new_points)
+
+    def _cancel_freehand_feedback(self):
+        """未実行のフリーハンド線のプレビュー更新を取り消します。"""
+        if self._freehand_feedback_job is not None:
+            self.root.after_cancel(self._freehand_feedback_job)
+            self._freehand_feedback_job = None
+        self._freehand_shown_count = 0
+
     def on_canvas_button_release(self, event): 
         """
         メインCanvas上でのマウスボタン離上イベントのハンドラ。
@@ -1434,10 +4191,10 @@ PDF編集ツール 操作方法
 
         if self.drag_mode == 'draw_shape':
             # --- 図形描画操作の完了 ---
+            self._cancel_freehand_feedback()
             if self.temp_canvas_item_id: # 一時的なプレビューアイテムがあれば削除
                 self.canvas.delete(self.temp_canvas_item_id)
                 self.temp_canvas_item_id = None
-            self.canvas.delete("temp_drawing_feedback") # フリーハンドの一時線も削除
             
             ann_type, shape_kind, shape_specific_data, coords_pdf_final = None, None, {}, None
             line_color_final = self.line_color_var.get()
@@ -1447,7 +4204,9 @@ PDF編集ツール 操作方法
                 if len(self.current_drawing_points_canvas) < 2: # 点が少なすぎる場合は無効
                     self._reset_drag_state(); return
                 # Canvas座標をPDF座標に変換
-                points_pdf = [(p[0]/self.zoom_factor, p[1]/self.zoom_factor) for p in self.current_drawing_points_canvas]
+                points_pdf = [self._canvas_to_pdf(p, self.current_page_index) for p in self.current_drawing_points_canvas]
+                # 見た目が変わらない範囲で点を間引く (PDF座標での許容誤差)
+                points_pdf = simplify_polyline(points_pdf, self.FREEHAND_SIMPLIFY_TOLERANCE_PT)
                 # 全ての点を含む最小の矩形 (バウンディングボックス) を計算
                 min_x_pdf = min(p[0] for p in points_pdf)
                 min_y_pdf = min(p[1] for p in points_pdf)
@@ -1467,7 +4226,7 @@ PDF編集ツール 操作方法
                 if abs(x1_c-x0_c) < 5 or abs(y1_c-y0_c) < 5: # 描画サイズが小さすぎる場合は無効
                     self._reset_drag_state(); return
                 
-                coords_pdf_final = tuple(c/self.zoom_factor for c in (x0_c,y0_c,x1_c,y1_c)) # PDF座標に変換
+                coords_pdf_final = self._canvas_to_pdf((x0_c, y0_c, x1_c, y1_c), self.current_page_index) # PDF座標に変換
                 
                 if current_draw_mode_val == "textbox": 
                     ann_type = 'text_box'
@@ -1477,12 +4236,12 @@ PDF編集ツール 操作方法
                     shape_kind = current_draw_mode_val.split('_')[1] # "draw_rectangle" -> "rectangle"
                     if shape_kind == 'line': # 直線の場合、始点と終点をPDF座標で保存
                         shape_specific_data = {
-                            'start': (self.drag_start_x/self.zoom_factor, self.drag_start_y/self.zoom_factor), 
-                            'end': (end_x/self.zoom_factor, end_y/self.zoom_factor)
+                            'start': self._canvas_to_pdf((self.drag_start_x, self.drag_start_y), self.current_page_index), 
+                            'end': self._canvas_to_pdf((end_x, end_y), self.current_page_index)
                         }
             
             # 新しいアノテーションオブジェクトを作成
-            new_annotation = {
+            new_annotation = Annotation.from_dict({
                 'page_idx': self.current_page_index, 
                 'coords': coords_pdf_final, 
                 'type': ann_type, 
@@ -1491,12 +4250,12 @@ PDF編集ツール 操作方法
                 'line_color': line_color_final, 
                 'line_thickness': line_thickness_final,
                 'shape_specific_data': shape_specific_data # 直線やフリーハンドの点情報など
-            }
+            })
             self.annotations.append(new_annotation)
             self.selected_ann = new_annotation # 新規作成したものを選択状態にする
             
             self._dirty_pages.add(self.current_page_index) # ページが変更されたのでダーティマーク
-            self._save_state() # 操作履歴を保存
+            self._record_edit([('add', new_annotation, self.annotations.sequence_of(new_annotation))]) # 操作履歴を保存
             self.show_page()   # UIを更新
             if ann_type == 'text_box': # テキストボックス作成後はテキスト入力欄にフォーカス
                 self.text_to_add_as_image_entry.delete(0, tk.END)
@@ -1505,7 +4264,8 @@ PDF編集ツール 操作方法
         elif self.drag_mode == 'move' and self.selected_ann and self.initial_pdf_coords_for_move:
             # --- アノテーション移動操作の完了 ---
             current_canvas_coords = self.canvas.coords(self.selected_ann['canvas_items']['rect'])
-            new_coords_pdf = tuple(c / self.zoom_factor for c in current_canvas_coords) # 移動後のPDF座標
+            new_coords_pdf = self._canvas_to_pdf(current_canvas_coords, self.selected_ann['page_idx']) # 移動後のPDF座標
+            ann_before = copy.deepcopy(self.selected_ann) # 履歴用に変更前の内容を保持 (ドラッグ中はCanvas上のみ動かしている)
             
             # グラフィックオブジェクトの場合、図形固有のデータも移動量に応じて更新
             if self.selected_ann.get('type') == 'graphic_object':
@@ -1516,17 +4276,18 @@ PDF編集ツール 操作方法
                     spec_data['start'] = (spec_data['start'][0] + dx_pdf, spec_data['start'][1] + dy_pdf)
                     spec_data['end'] = (spec_data['end'][0] + dx_pdf, spec_data['end'][1] + dy_pdf)
                 elif self.selected_ann['shape_kind'] == 'freehand' and 'points' in spec_data:
-                    spec_data['points'] = [(p[0]+dx_pdf, p[1]+dy_pdf) for p in spec_data['points']]
+                    spec_data['points'] = spec_data.transformed_points(1, 1, dx_pdf, dy_pdf)
             
             self.selected_ann['coords'] = new_coords_pdf # アノテーションの座標を更新
+            self.annotations.update(self.selected_ann) # 空間索引も更新
             self._dirty_pages.add(self.current_page_index)
-            self._save_state()
+            self._record_edit([('modify', self.selected_ann, ann_before, copy.deepcopy(self.selected_ann))])
             self.show_page()
 
         elif self.drag_mode.startswith('resize_') and self.selected_ann and self.original_pdf_coords_for_resize:
             # --- アノテーションリサイズ操作の完了 ---
             new_bbox_canvas = self.canvas.coords(self.selected_ann['canvas_items']['rect']) # リサイズ後のCanvas座標
-            new_bbox_pdf = tuple(c / self.zoom_factor for c in new_bbox_canvas) # PDF座標に変換
+            new_bbox_pdf = self._canvas_to_pdf(new_bbox_canvas, self.selected_ann['page_idx']) # PDF座標に変換
             
             old_bbox_pdf = self.original_pdf_coords_for_resize # リサイズ開始時のPDF座標
             old_w_pdf = old_bbox_pdf[2] - old_bbox_pdf[0]
@@ -1537,7 +4298,9 @@ PDF編集ツール 操作方法
             scale_y = (new_bbox_pdf[3]-new_bbox_pdf[1]) / old_h_pdf if old_h_pdf != 0 else 1
             
             current_ann = self.selected_ann
+            ann_before = copy.deepcopy(current_ann) # 履歴用に変更前の内容を保持
             current_ann['coords'] = new_bbox_pdf # アノテーションのバウンディングボックス座標を更新
+            self.annotations.update(current_ann) # 空間索引も更新
             
             # グラフィックオブジェクトの場合、図形固有データもスケールと位置に応じて更新
             if current_ann.get('type') == 'graphic_object' and self.original_shape_specific_data_for_resize:
@@ -1551,15 +4314,13 @@ PDF編集ツール 操作方法
                     new_spec_data['end'] =   (new_bbox_pdf[0] + (e_orig[0]-old_bbox_pdf[0])*scale_x, 
                                               new_bbox_pdf[1] + (e_orig[1]-old_bbox_pdf[1])*scale_y)
                 elif current_ann['shape_kind']=='freehand' and 'points' in orig_spec_data:
-                    new_spec_data['points'] = [
-                        (new_bbox_pdf[0] + (p[0]-old_bbox_pdf[0])*scale_x, 
-                         new_bbox_pdf[1] + (p[1]-old_bbox_pdf[1])*scale_y) 
-                        for p in orig_spec_data.get('points',[])
-                    ]
+                    # 元のバウンディングボックスの左上を基準とした相対座標をスケーリングし、新しい左上に加算
+                    new_spec_data['points'] = orig_spec_data.transformed_points(
+                        scale_x, scale_y, new_bbox_pdf[0] - old_bbox_pdf[0] * scale_x, new_bbox_pdf[1] - old_bbox_pdf[1] * scale_y)
                 current_ann['shape_specific_data'] = new_spec_data
             
             self._dirty_pages.add(self.current_page_index)
-            self._save_state()
+            self._record_edit([('modify', current_ann, ann_before, copy.deepcopy(current_ann))])
             self.show_page()
         
         self._reset_drag_state() # ドラッグ関連の状態変数をリセット
@@ -1567,6 +4328,7 @@ PDF編集ツール 操作方法
     def _reset_drag_state(self):
         """ドラッグ操作に関連する一時的な状態変数をリセットします。"""
         self.drag_mode = 'none'
+        self._cancel_freehand_feedback()
         self.current_drawing_points_canvas = []
         self.original_ann_coords_canvas = None
         self.initial_pdf_coords_for_move = None
@@ -1575,7 +4337,6 @@ PDF編集ツール 操作方法
         if self.temp_canvas_item_id: # 一時的な描画アイテムが残っていれば削除
             self.canvas.delete(self.temp_canvas_item_id)
             self.temp_canvas_item_id = None
-        self.canvas.delete("temp_drawing_feedback")
 
 
     def _update_left_panel_for_selected_ann(self, ann):
@@ -1684,8 +4445,6 @@ PDF編集ツール 操作方法
             messagebox.showerror("エラー", "PDFが開かれていません。ペーストできません。")
             return
 
-        self._save_state() # ペースト操作前の状態を保存
-
         new_ann = copy.deepcopy(self.copied_ann) # コピー元から新しいアノテーションを作成
 
         # ペースト時に元の位置から少しずらす (PDF座標系でオフセット)
@@ -1707,7 +4466,7 @@ PDF編集ツール 操作方法
                 spec_data['start'] = (spec_data['start'][0] + offset_x_pdf, spec_data['start'][1] + offset_y_pdf)
                 spec_data['end'] = (spec_data['end'][0] + offset_x_pdf, spec_data['end'][1] + offset_y_pdf)
             elif new_ann.get('shape_kind') == 'freehand' and 'points' in spec_data:
-                spec_data['points'] = [(p[0] + offset_x_pdf, p[1] + offset_y_pdf) for p in spec_data['points']]
+                spec_data['points'] = spec_data.transformed_points(1, 1, offset_x_pdf, offset_y_pdf)
 
         new_ann['page_idx'] = self.current_page_index # ペースト先は現在のページ
         new_ann['canvas_items'] = {} # CanvasアイテムIDは再描画時に新たに割り当てられる
@@ -1717,7 +4476,7 @@ PDF編集ツール 操作方法
         
         self._dirty_pages.add(self.current_page_index)
         self.show_page() # UI更新
-        self._save_state() # ペースト後の状態を保存
+        self._record_edit([('add', new_ann, self.annotations.sequence_of(new_ann))]) # 操作履歴を保存
 
     def delete_selected_annotation(self): 
         """
@@ -1726,7 +4485,6 @@ PDF編集ツール 操作方法
         """
         if self.selected_ann:
             if messagebox.askyesno("確認", "選択されたオブジェクトを削除しますか？この操作は元に戻せます。"):
-                self._save_state() # 削除前の状態を保存
                 self._dirty_pages.add(self.selected_ann['page_idx'])
                 
                 # Canvas上のアイテムを削除
@@ -1734,7 +4492,8 @@ PDF編集ツール 操作方法
                 if rect_id_to_delete and self.canvas.winfo_exists() and self.canvas.type(rect_id_to_delete):
                     self.canvas.delete(rect_id_to_delete)
                 
-                # アノテーションリストから削除
+                # アノテーションリストから削除 (元に戻したときに同じ描画順に戻せるよう、描画順も記録)
+                self._record_edit([('remove', self.selected_ann, self.annotations.sequence_of(self.selected_ann))])
                 self.annotations.remove(self.selected_ann)
                 # マッピングからも削除 (念のため)
                 if rect_id_to_delete in self.canvas_item_to_ann:
@@ -1753,13 +4512,14 @@ PDF編集ツール 操作方法
         """
         if self.selected_ann:
             if messagebox.askyesno("確認", "選択範囲をリダクション（内容を隠蔽）しますか？"):
-                self._save_state()
+                ann_before = copy.deepcopy(self.selected_ann) # 履歴用に変更前の内容を保持
                 self.selected_ann['type'] = 'redaction' # タイプをリダクションに変更
                 # リダクションに伴い、不要になる可能性のあるキーを削除 (あれば)
                 for key_to_remove in ['text_content', 'font_size', 'font_family', 'text_color', 'font_bold', 
-                                      'shape_kind', 'shape_specific_data', 'image_data']:
+                                      'shape_kind', 'shape_specific_data', 'image_blob']:
                     if key_to_remove in self.selected_ann:
                         del self.selected_ann[key_to_remove]
+                self._record_edit([('modify', self.selected_ann, ann_before, copy.deepcopy(self.selected_ann))])
                 self._dirty_pages.add(self.selected_ann['page_idx'])
                 self.show_page()
                 self.highlight_selected_annotation() # ハイライト更新 (枠色が変わるため)
@@ -1769,12 +4529,13 @@ PDF編集ツール 操作方法
     def mask_selected_area_black(self): 
         """選択されたアノテーションのタイプを「マスク」(黒塗り) に変更します。"""
         if self.selected_ann:
-            self._save_state()
+            ann_before = copy.deepcopy(self.selected_ann) # 履歴用に変更前の内容を保持
             self.selected_ann['type'] = 'mask'
             for key_to_remove in ['text_content', 'font_size', 'font_family', 'text_color', 'font_bold', 
-                                  'shape_kind', 'shape_specific_data', 'image_data']:
+                                  'shape_kind', 'shape_specific_data', 'image_blob']:
                 if key_to_remove in self.selected_ann:
                     del self.selected_ann[key_to_remove]
+            self._record_edit([('modify', self.selected_ann, ann_before, copy.deepcopy(self.selected_ann))])
             self._dirty_pages.add(self.selected_ann['page_idx'])
             self.show_page()
             self.highlight_selected_annotation()
@@ -1782,12 +4543,13 @@ PDF編集ツール 操作方法
     def mask_selected_area_white(self): 
         """選択されたアノテーションのタイプを「白色マスク」(白塗り) に変更します。"""
         if self.selected_ann:
-            self._save_state()
+            ann_before = copy.deepcopy(self.selected_ann) # 履歴用に変更前の内容を保持
             self.selected_ann['type'] = 'white_mask'
             for key_to_remove in ['text_content', 'font_size', 'font_family', 'text_color', 'font_bold', 
-                                  'shape_kind', 'shape_specific_data', 'image_data']:
+                                  'shape_kind', 'shape_specific_data', 'image_blob']:
                 if key_to_remove in self.selected_ann:
                     del self.selected_ann[key_to_remove]
+            self._record_edit([('modify', self.selected_ann, ann_before, copy.deepcopy(self.selected_ann))])
             self._dirty_pages.add(self.selected_ann['page_idx'])
             self.show_page()
             self.highlight_selected_annotation()
@@ -1830,7 +4592,7 @@ PDF編集ツール 操作方法
         if not self.selected_ann:
             return messagebox.showinfo("情報", "テキストを追加/更新する枠または図形を選択してください。")
         
-        self._save_state() # 操作前の状態を保存
+        ann_before = copy.deepcopy(self.selected_ann) # 履歴用に変更前の内容を保持
         
         # 選択中のアノテーションのプロパティを更新
         self.selected_ann.update({
@@ -1843,9 +4605,10 @@ PDF編集ツール 操作方法
         })
         
         # text_imageタイプに不要な可能性のあるキーを削除 (元が図形だった場合など)
-        for key_to_remove in ['shape_kind', 'shape_specific_data', 'image_data', 'line_color', 'line_thickness']:
+        for key_to_remove in ['shape_kind', 'shape_specific_data', 'image_blob', 'line_color', 'line_thickness']:
             if key_to_remove in self.selected_ann:
                 del self.selected_ann[key_to_remove]
+        self._record_edit([('modify', self.selected_ann, ann_before, copy.deepcopy(self.selected_ann))])
         
         self._dirty_pages.add(self.selected_ann['page_idx'])
         self.show_page() # UI更新
@@ -1862,6 +4625,9 @@ PDF編集ツール 操作方法
                 self.doc.close()
                 self.doc = None
                 self.pdf_path = None
+                self._doc_hash = None
+                self._stop_render_worker()
+                self.thumbnail_navigator.set_document(None, None)
                 self.filename_label.config(text="(PDFファイル:未選択)")
                 self.current_page_index = 0
                 self.annotations.clear()
@@ -1869,12 +4635,17 @@ PDF編集ツール 操作方法
                 self.selected_ann = None
                 self.clear_canvas_and_reset_scroll()
                 self.update_page_info_label()
-                self.undo_stack.clear()
-                self._save_state() # クリア後の初期状態を保存
+                self.edit_history.clear()
                 self._update_undo_redo_buttons()
                 self._rendered_page_cache.clear()
-                self._page_cache_lru.clear()
+                self._annotation_overlay_cache.clear()
+                self._tile_cache.clear()
+                self._tile_display_list = None
+                self._image_sprite_cache.clear()
+                self._text_sprite_cache.clear()
+                self._text_png_cache.clear()
                 self._dirty_pages.clear()
+                self._export_memo.clear()
                 self._update_text_preview("") # テキストプレビューもクリア
         else:
             messagebox.showinfo("情報", "クリアするPDFが選択されていません。")
@@ -1889,15 +4660,15 @@ PDF編集ツール 操作方法
             if messagebox.askyesno("確認", "PDFを再読み込みしますか？\n現在の編集内容は失われます。"):
                 current_path = self.pdf_path
                 # 一旦クリアしてから再度同じパスで開くことで再読み込みを実現
-                # (clear_pdf_selection は内部で undo_stack.clear() も行う)
+                # (編集履歴は select_pdf_path 内で破棄される)
                 if self.doc: self.doc.close() # 先に閉じる
                 self.doc=None; self.pdf_path=None; self.filename_label.config(text="(未選択)")
                 self.current_page_index=0; self.annotations.clear(); self.canvas_item_to_ann.clear()
                 self.selected_ann=None; self.clear_canvas_and_reset_scroll(); self.update_page_info_label()
-                self.undo_stack.clear(); self._rendered_page_cache.clear(); self._page_cache_lru.clear(); self._dirty_pages.clear()
+                self._rendered_page_cache.clear(); self._annotation_overlay_cache.clear(); self._tile_cache.clear(); self._tile_display_list = None; self._dirty_pages.clear()
                 self._update_text_preview("")
 
-                self.select_pdf_path(current_path) # 同じパスで再度開く (内部で _save_state が呼ばれる)
+                self.select_pdf_path(current_path) # 同じパスで再度開く
         else:
             messagebox.showinfo("情報", "再読み込みするPDFが選択されていません。")
 
@@ -1909,8 +4680,16 @@ PDF編集ツール 操作方法
         """
         self.canvas.delete("all") # Canvas上の全ての描画アイテムを削除
         self.canvas.config(scrollregion=(0,0,0,0)) # スクロール領域をリセット
+        self._tile_items.clear() # タイルのCanvasアイテムも上で削除済み
+        self._tiled_view = None
+        self._continuous_items.clear() # 連続スクロール表示のページも上で削除済み
+        self._continuous_anchor = None
         self.page_image_pil = None
         self.page_image_tk = None # Tkinter PhotoImageもNoneに
+        self._page_image_item = None
+        self._displayed_page_layer = None
+        self._page_overlay_tk = None
+        self._displayed_overlay = None
 
     def _save_pdf_key_bind(self, event): 
         """Ctrl+S (またはCmd+S) キーバインドでPDF保存関数を呼び出すためのイベントハンドラ。"""
@@ -1925,10 +4704,131 @@ PDF編集ツール 操作方法
         # 16進数文字列を2文字ずつに区切り、整数に変換し、255で割って0.0-1.0の範囲にする
         return tuple(int(hex_color[i:i + 2], 16) / 255.0 for i in (0, 2, 4))
 
+    def _export_ops_for_page(self, page_idx):
+        """
+        指定ページのアノテーションを、PDFへの描画命令 (`draw_export_ops` を参照) に変換します。
+        テキスト画像は画面表示と共通のキャッシュを使用してPNGデータにします。
+
+        Args:
+            page_idx (int): ページインデックス。
+
+        Returns:
+            list: 描画命令のリスト (描画順)。
+        """
+        # アノテーションの描画順序を定義 (値が小さいものが先に描画される = 奥になる)
+        def get_save_order(ann): 
+            type_order = {'redaction':0, 'mask':1, 'white_mask':1, 'image_object':1.5, 'graphic_object':2, 'text_image':3}
+            return type_order.get(ann.get('type'), 4)
+        sorted_annotations = sorted(self.annotations.on_page(page_idx), key=get_save_order)
+
+        ops = []
+        for ann in sorted_annotations:
+            coords_pdf, ann_type = tuple(ann['coords']), ann.get('type')
+            rect_fitz = fitz.Rect(coords_pdf)
+            
+            if ann_type == 'redaction':
+                ops.append(('redaction', coords_pdf))
+            elif ann_type == 'mask':
+                # 黒色マスキング領域を塗りつぶし
+                ops.append(('fill', coords_pdf, fitz.utils.getColor("black")))
+            elif ann_type == 'white_mask':
+                # 白色マスキング領域を塗りつぶし
+                ops.append(('fill', coords_pdf, fitz.utils.getColor("white")))
+            elif ann_type == 'text_image' and ann.get('text_content',''):
+                text_op = self._export_text_op(ann, rect_fitz) if self.vector_text_var.get() else None
+                if text_op:
+                    ops.append(text_op) # フォントを埋め込んだ文字として出力
+                    continue
+                # テキストが矩形に収まるフォントサイズで描画した透明な画像を取得 (画面表示と共通のキャッシュを使用)
+                text_sprite_entry = self._get_text_sprite(ann.get('text_content', ''), ann.get('font_family', 'gothic'),
+                                                          ann.get('font_bold', False), ann.get('text_color', '#000000'),
+                                                          rect_fitz.width, rect_fitz.height, ann.get('font_size', 100))
+                if text_sprite_entry:
+                    sprite_key, text_pil = text_sprite_entry
+                    # 同じテキスト画像は1つの画像オブジェクトを共有し、PDF内に重複して格納しない
+                    ops.append(('image', coords_pdf, ('text',) + sprite_key, self._get_text_sprite_png(sprite_key, text_pil)))
+            elif ann_type == 'graphic_object' or (ann_type == 'text_box' and ann.get('shape_kind') == 'rectangle'):
+                # 図形（矩形、楕円、直線、フリーハンド）
+                if rect_fitz.width <= 0 or rect_fitz.height <= 0: continue # 無効なサイズはスキップ
+                shape_kind = ann.get('shape_kind')
+                # アノテーションに保存された線の色をRGBタプルに変換
+                color_rgb = self._hex_to_rgb(ann.get('line_color','#000000')) 
+                thick = ann.get('line_thickness',1)
+                
+                if shape_kind == 'rectangle' or ann_type == 'text_box':
+                    ops.append(('rect', coords_pdf, color_rgb, thick)) # 塗りつぶしなし、線のみ
+                elif shape_kind == 'oval':
+                    ops.append(('oval', coords_pdf, color_rgb, thick))
+                elif shape_kind == 'line':
+                    s, e = ann.get('shape_specific_data',{}).get('start'), ann.get('shape_specific_data',{}).get('end')
+                    if s and e:
+                        ops.append(('line', s, e, color_rgb, thick))
+                elif shape_kind == 'freehand':
+                    # フリーハンド線は区間ごとの直線ではなく、1本のパスとして出力する
+                    spec_data = ann.get('shape_specific_data')
+                    points = spec_data.point_pairs() if spec_data is not None else () # 点群の配列を参照するビュー (タプルのリストは作らない)
+                    if len(points) > 2 and self.smooth_freehand_var.get():
+                        ops.append(('curve', points, color_rgb, thick))
+                    elif len(points) > 1:
+                        ops.append(('polyline', points, color_rgb, thick))
+            elif ann_type == 'image_object':
+                image_blob = ann.get('image_blob')
+                if image_blob:
+                    ops.append(('image', coords_pdf, ('blob', image_blob.blob_id), image_blob.data))
+        return ops
+
+    def _export_text_op(self, ann, rect_fitz):
+        """
+        テキストアノテーションを、文字として出力する描画命令 ('text') に変換します。
+        文字の大きさと位置は、画像として出力する場合 (矩形に収まるサイズで描画した画像を、縦横比を保って
+        矩形の中央に配置) と同じになるように、Pillowで計測した文字の範囲から求めます。
+
+        Args:
+            ann (Annotation): テキストアノテーション。
+            rect_fitz (fitz.Rect): アノテーションの矩形 (PDF座標)。
+
+        Returns:
+            tuple or None: 描画命令。フォントファイルが見つからない、改行を含むなど、文字として出力できない場合はNone (画像で出力する)。
+        """
+        text_content, font_family, is_bold = ann.get('text_content', ''), ann.get('font_family', 'gothic'), ann.get('font_bold', False)
+        font_path = self.font_registry.resolve(font_family, is_bold)
+        if not font_path or "\n" in text_content:
+            return None
+        fitted_font_size = self._get_fitted_font_size(text_content, rect_fitz.width, rect_fitz.height,
+                                                      ann.get('font_size', 100), font_family, is_bold)
+        if fitted_font_size <= 0:
+            return None
+        font = self._get_font(fitted_font_size, font_family, is_bold)
+        try:
+            left, top, right, bottom = font.getbbox(text_content) # アンカーは左上 (アセンダーの高さ)
+            ascent = font.getmetrics()[0]
+        except AttributeError: # 古いPillowバージョン
+            return None
+        text_w, text_h = right - left, bottom - top
+        if text_w <= 0 or text_h <= 0:
+            return None
+        scale = min(rect_fitz.width / text_w, rect_fitz.height / text_h)
+        x0 = rect_fitz.x0 + (rect_fitz.width - text_w * scale) / 2
+        y0 = rect_fitz.y0 + (rect_fitz.height - text_h * scale) / 2
+        origin = (x0 - left * scale, y0 + (ascent - top) * scale) # ベースラインの始点
+        return ('text', origin, text_content, font_path, fitted_font_size * scale,
+                self._hex_to_rgb(ann.get('text_color', '#000000')))
+
+    def _export_worker_count(self):
+        """書き出しに使うワーカープロセス数を返します (設定 export_workers、未設定の場合は1で並列化しない。上限あり)。"""
+        # 複数コアの環境での効果を確認できるまでは、並列化は設定で有効にした場合のみ行う
+        workers = self.settings.get("export_workers", 1)
+        if not isinstance(workers, int) or workers < 1:
+            workers = 1
+        return min(workers, self.MAX_EXPORT_WORKERS)
+
     def _create_preview_pdf_data(self):
         """
-        現在のドキュメントとアノテーションに基づいて、プレビュー用のPDFデータをメモリ上に生成します。
-        save_pdfメソッドのロジックを流用し、ファイル保存の代わりにバイトデータを返します。
+        現在のドキュメントとアノテーションに基づいて、加工後のPDFデータをメモリ上に生成します (プレビューと保存で使用)。
+        ページ数が PARALLEL_EXPORT_MIN_PAGES 以上で複数のワーカーを使える場合は、ページ範囲ごとに
+        別プロセスで並列に生成して結合します (結果は1プロセスで生成した場合と同じ内容になります)。
+        前回の書き出し結果を保持しておき (PageExportMemo)、アノテーションと回転が変わったページのみを作り直します。
+        何も変わっていなければ前回のPDFデータをそのまま返します。
 
         Returns:
             bytes or None: 生成されたPDFのバイトデータ。エラー時はNone。
@@ -1937,124 +4837,177 @@ PDF編集ツール 操作方法
             return None
 
         try:
-            preview_doc = fitz.open() # プレビュー用の新しい空のPDFドキュメント
-            for page_idx in range(len(self.doc)):
-                original_page = self.doc[page_idx]
-                # 元のページと同じサイズで新しいページを作成し、元のページの内容をコピー
-                new_page = preview_doc.new_page(width=original_page.rect.width,
-                                                height=original_page.rect.height)
-                new_page.show_pdf_page(new_page.rect, self.doc, page_idx)
-                new_page.set_rotation(original_page.rotation) # 元のページの回転を適用
-
-                # 現在のページに適用されているアノテーションのみをフィルタリング
-                page_annotations = [ann for ann in self.annotations if ann['page_idx'] == page_idx]
-                
-                # アノテーションの描画順序を定義 (値が小さいものが先に描画される = 奥になる)
-                def get_save_order(ann): 
-                    type_order = {'redaction':0, 'mask':1, 'white_mask':1, 'image_object':1.5, 'graphic_object':2, 'text_image':3}
-                    return type_order.get(ann.get('type'), 4)
-                sorted_annotations = sorted(page_annotations, key=get_save_order)
-
-                # まずリダクションを適用 (PyMuPDFのリダクションは他の描画より先に行う必要がある)
-                has_redactions = False
-                for ann in sorted_annotations:
-                    if ann.get('type') == 'redaction':
-                        # リダクションアノテーションを追加し、灰色で塗りつぶす
-                        new_page.add_redact_annot(fitz.Rect(ann['coords']), text=" ", fill=(0.75,0.75,0.75))
-                        has_redactions = True
-                if has_redactions:
-                    new_page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS) # リダクションを適用して内容を削除
-
-                # その他のアノテーションを描画
-                for ann in sorted_annotations:
-                    coords_pdf, ann_type = ann['coords'], ann.get('type')
-                    rect_fitz = fitz.Rect(coords_pdf) # PyMuPDFのRectオブジェクトに変換
-                    
-                    if ann_type == 'mask':
-                        # 黒色マスキング領域を塗りつぶし
-                        new_page.draw_rect(rect_fitz, color=fitz.utils.getColor("black"), fill=fitz.utils.getColor("black"), overlay=True)
-                    elif ann_type == 'white_mask':
-                        # 白色マスキング領域を塗りつぶし
-                        new_page.draw_rect(rect_fitz, color=fitz.utils.getColor("white"), fill=fitz.utils.getColor("white"), overlay=True)
-                    elif ann_type == 'text_image' and ann.get('text_content',''):
-                        # テキスト画像をPDFに挿入
-                        text_content = ann.get('text_content', '')
-                        font_size = ann.get('font_size', 100)
-                        font_family = ann.get('font_family', 'gothic')
-                        text_color = ann.get('text_color', '#000000')
-                        is_bold = ann.get('font_bold', False)
-                        
-                        # テキストが矩形に収まるフォントサイズを計算
-                        fitted_font_size = self._get_fitted_font_size(text_content, rect_fitz.width, rect_fitz.height, font_size, font_family, is_bold)
-                        if fitted_font_size > 0:
-                            font = self._get_font(fitted_font_size, font_family, is_bold)
-                            
-                            # Pillowでテキストを透明な画像としてレンダリング
-                            try:
-                                text_bbox_pil = font.getbbox(text_content)
-                                img_w_pil, img_h_pil = text_bbox_pil[2]-text_bbox_pil[0], text_bbox_pil[3]-text_bbox_pil[1]
-                            except AttributeError: # 古いPillowバージョンへのフォールバック
-                                img_w_pil, img_h_pil = font.getsize(text_content)
-                                text_bbox_pil = (0,0,img_w_pil, img_h_pil)
-
-                            if img_w_pil > 0 and img_h_pil > 0:
-                                text_pil = Image.new('RGBA', (img_w_pil,img_h_pil), (0,0,0,0)) # 透明な背景
-                                # テキストを描画 (Pillowのfillは色、PyMuPDFのfillは塗りつぶし)
-                                ImageDraw.Draw(text_pil).text((-text_bbox_pil[0],-text_bbox_pil[1]), text_content, font=font, fill=text_color)
-                                
-                                # 画像をバイトデータに変換し、PDFに挿入
-                                img_bytes = io.BytesIO()
-                                text_pil.save(img_bytes, format='PNG')
-                                new_page.insert_image(rect_fitz, stream=img_bytes.getvalue(), overlay=True)
-                    elif ann_type == 'graphic_object' or (ann_type == 'text_box' and ann.get('shape_kind') == 'rectangle'):
-                        # 図形（矩形、楕円、直線、フリーハンド）をPDFに描画
-                        bbox_pdf = ann['coords']
-                        bbox_w, bbox_h = bbox_pdf[2]-bbox_pdf[0], bbox_pdf[3]-bbox_pdf[1]
-                        if bbox_w <=0 or bbox_h <=0: continue # 無効なサイズはスキップ
-                        
-                        shape_kind = ann.get('shape_kind')
-                        # アノテーションに保存された線の色をRGBタプルに変換
-                        color_rgb = self._hex_to_rgb(ann.get('line_color','#000000')) 
-                        thick = ann.get('line_thickness',1)
-                        
-                        if shape_kind == 'rectangle' or ann_type == 'text_box':
-                            # 矩形を描画 (塗りつぶしなし、線のみ)
-                            new_page.draw_rect(rect_fitz, color=color_rgb, width=thick, overlay=True)
-                        elif shape_kind == 'oval':
-                            # 楕円を描画 (塗りつぶしなし、線のみ)
-                            new_page.draw_oval(rect_fitz, color=color_rgb, width=thick, overlay=True)
-                        elif shape_kind == 'line':
-                            # 直線を描画
-                            s, e = ann.get('shape_specific_data',{}).get('start'), ann.get('shape_specific_data',{}).get('end')
-                            if s and e:
-                                new_page.draw_line(fitz.Point(s), fitz.Point(e), color=color_rgb, width=thick, overlay=True)
-                        elif shape_kind == 'freehand':
-                            # フリーハンド線を描画 (点と点を線で結ぶ)
-                            points = ann.get('shape_specific_data',{}).get('points',[])
-                            if len(points)>1:
-                                for i in range(len(points)-1):
-                                    p1 = fitz.Point(points[i])
-                                    p2 = fitz.Point(points[i+1])
-                                    new_page.draw_line(p1,p2,color=color_rgb,width=thick,overlay=True)
-                    elif ann_type == 'image_object':
-                        # 挿入画像をPDFに挿入
-                        image_data_bytes = ann.get('image_data')
-                        if image_data_bytes:
-                            try:
-                                new_page.insert_image(rect_fitz, stream=image_data_bytes, overlay=True)
-                            except Exception as e_img_prev:
-                                print(f"Error inserting image to preview PDF page {page_idx}: {e_img_prev}") # 画像挿入エラーを出力
+            fingerprints = [self._export_page_fingerprint(page_idx) for page_idx in range(len(self.doc))]
+            changed_pages = self._export_memo.changed_pages(self.doc, fingerprints)
+            if changed_pages is not None and not changed_pages and self._export_memo.pdf_bytes is not None:
+                return self._export_memo.pdf_bytes # 前回から変更なし
+
+            if changed_pages is None or len(changed_pages) > len(fingerprints) // 2:
+                # アノテーションを描画命令に変換 (テキストのラスタライズなどアプリの状態が必要な処理はここで行う)
+                page_jobs = [(page_idx, self.doc[page_idx].rotation, self._export_ops_for_page(page_idx))
+                             for page_idx in range(len(self.doc))]
+                workers = self._export_worker_count()
+                image_xrefs = {} # 画像のキー -> 埋め込み済み画像のxref (同じ画像は1つの画像オブジェクトを共有する)
+                preview_doc = None
+                if workers > 1 and len(page_jobs) >= self.PARALLEL_EXPORT_MIN_PAGES and self._source_file_unchanged():
+                    preview_doc = self._build_export_doc_parallel(page_jobs, workers)
+                if preview_doc is None: # 並列化しない場合、またはワーカーでの書き出しに失敗した場合
+                    preview_doc = fitz.open() # プレビュー用の新しい空のPDFドキュメント
+                    for page_idx, rotation, ops in page_jobs:
+                        insert_export_page(preview_doc, self.doc, page_idx, rotation, ops, image_xrefs)
+            else:
+                # 前回の書き出し結果のうち、変更されたページのみを作り直して差し替える
+                preview_doc, image_xrefs = self._export_memo.doc, self._export_memo.image_xrefs
+                for page_idx in changed_pages:
+                    preview_doc.delete_page(page_idx)
+                    insert_export_page(preview_doc, self.doc, page_idx, self.doc[page_idx].rotation,
+                                       self._export_ops_for_page(page_idx), image_xrefs, pno=page_idx)
             
-            # 生成されたPDFをバイトデータとして取得し、閉じる
-            pdf_bytes = preview_doc.tobytes(garbage=4, deflate=True, clean=True)
-            preview_doc.close()
+            # 生成されたPDFをバイトデータとして取得する。不要オブジェクトの削除 (garbage) はドキュメント内の
+            # オブジェクト番号を振り直してしまうため、次回の差し替えに使うドキュメントではなく、その複製から出力する
+            doc_data = preview_doc.tobytes()
+            output_doc = fitz.open("pdf", doc_data)
+            if self.vector_text_var.get():
+                subset_export_fonts(output_doc) # 文字として出力したテキストのフォントを、使用した文字のみに絞る
+            pdf_bytes = output_doc.tobytes(garbage=4, deflate=True, clean=True)
+            output_doc.close()
+            self._export_memo.store(self.doc, preview_doc, image_xrefs, fingerprints, pdf_bytes, len(doc_data),
+                                    replaced_pages=0 if changed_pages is None else len(changed_pages))
             return pdf_bytes
         except Exception as e_prev_create:
             messagebox.showerror("プレビュー生成エラー", f"プレビュー用PDFの生成中にエラーが発生しました: {e_prev_create}")
+            self._export_memo.clear() # 差し替えの途中で失敗した可能性があるため、前回の結果は使わない
             if 'preview_doc' in locals() and not preview_doc.is_closed: # エラー時もドキュメントが開いていれば閉じる
                 preview_doc.close()
             return None
 
+    def _export_page_fingerprint(self, page_idx):
+        """
+        ページの書き出し結果を決める内容 (回転、アノテーション、曲線と文字の出力の設定) をまとめたタプルを返します。
+        値が前回の書き出し時と同じページは、前回の書き出し結果を再利用します。
+
+        Args:
+            page_idx (int): ページインデックス。
+
+        Returns:
+            tuple: フィンガープリント。
+        """
+        return (self.doc[page_idx].rotation, bool(self.smooth_freehand_var.get()), bool(self.vector_text_var.get()),
+                tuple(ann.fingerprint() for ann in self.annotations.on_page(page_idx)))
+
+    def _build_export_doc_parallel(self, page_jobs, workers):
+        """
+        ページを連続した範囲に分けてワーカープロセスで書き出し、ページ順に結合したPDFを返します。
+        範囲ごとに重複して埋め込まれた画像などは、呼び出し側の tobytes(garbage=4) で1つにまとめられます。
+
+        Args:
+            page_jobs (list): (ページインデックス, 回転角度, 描画命令のリスト) のリスト (ページ順)。
+            workers (int): ワーカープロセス数。
+
+        Returns:
+            fitz.Document or None: 結合したPDF。ワーカーの起動や書き出しに失敗した場合はNone (呼び出し側で1プロセスで作り直す)。
+        """
+        # 処理の偏りを均すため、ワーカー数より多めの範囲に分ける
+        chunk_count = min(len(page_jobs), workers * self.EXPORT_CHUNKS_PER_WORKER)
+        chunk_size = -(-len(page_jobs) // chunk_count) # 切り上げ
+        chunks = [page_jobs[i:i + chunk_size] for i in range(0, len(page_jobs), chunk_size)]
+        # fork はTkの状態を子プロセスに引き継いでしまうため、spawn を使用 (PageRenderWorker と同様)
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                parts = list(executor.map(_export_worker_build, [self.pdf_path] * len(chunks), chunks))
+        except Exception as e: # ワーカーの異常終了 (BrokenProcessPool)、ワーカー内でのメモリ不足 (MemoryError) など
+            print(f"Parallel export failed, building the document in a single process instead: {e}")
+            return None
+        merged_doc = fitz.open()
+        for part_bytes in parts: # ページ順に結合
+            part_doc = fitz.open("pdf", part_bytes)
+            merged_doc.insert_pdf(part_doc)
+            part_doc.close()
+        return merged_doc
+
+    @staticmethod
+    def _stat_source_file(path):
+        """PDFファイルの (サイズ, 更新時刻) を返します。取得できない場合はNone。"""
+        try:
+            st = os.stat(path)
+            return (st.st_size, st.st_mtime_ns)
+        except OSError:
+            return None
+
+    def _source_file_unchanged(self):
+        """
+        開いているPDFファイルが、開いた時点から変更されていないかを返します。
+        追記保存と並列書き出しは、メモリ上のドキュメントではなくファイルを読み直すため、
+        ファイルが上書きされている場合 (同じファイル名で保存した場合など) は使用できません。
+        """
+        return bool(self.pdf_path) and self._source_file_stat is not None and \
+            self._stat_source_file(self.pdf_path) == self._source_file_stat
+
+    def _save_pdf_incrementally(self, output_path):
+        """
+        元のPDFファイルを保存先にコピーし、アノテーションのあるページと回転を変更したページの変更分のみを
+        追記 (PDFの増分更新) して保存します。ページ全体を作り直して書き出す `_create_preview_pdf_data` と異なり、
+        処理時間は変更したページの数に比例します。
+
+        次の場合は追記保存を行わず False を返します (呼び出し側で全体を書き出します)。
+        - 保存先が開いているPDFファイル自身の場合 (保存後もこのファイルを編集元として使い続けるため。
+          大文字・小文字の違いやリンクなど、別のパスで同じファイルを指す場合も含む)
+        - リダクションがある場合 (追記保存では、削除した内容がファイル内の以前の版に残ってしまうため)
+        - 回転角度が90度または270度のページがある場合 (全体の書き出しではページを作り直す際に縦横が入れ替わるため、
+          追記保存では加工後プレビューと異なるページサイズ・向きになってしまう)
+        - 元のファイルが追記保存に対応していない場合 (破損を修復して開いたファイルなど)
+        - 元のファイルが開いた後に上書きされている場合
+        - コピーへの追記の途中で失敗した場合 (書きかけのコピーは削除します)
+
+        Args:
+            output_path (str): 保存先のパス。
+
+        Returns:
+            bool: 追記保存した場合は True。
+        """
+        if not self._source_file_unchanged() or \
+           (os.path.exists(output_path) and os.path.samefile(output_path, self.pdf_path)):
+            return False
+        annotated_pages = self.annotations.pages()
+        if any(ann.get('type') == 'redaction' for page_idx in annotated_pages for ann in self.annotations.on_page(page_idx)):
+            return False
+        if any(page.rotation % 180 != 0 for page in self.doc): # ファイル上の回転とアプリでの回転の両方を含む
+            return False
+        rotated_pages = {page_idx: self.doc[page_idx].rotation for page_idx, original_rotation in self._original_page_rotations.items()
+                         if self.doc[page_idx].rotation != original_rotation}
+
+        try:
+            shutil.copyfile(self.pdf_path, output_path)
+        except shutil.SameFileError: # 上の確認の後に保存先が作られた場合など
+            return False
+        output_doc = None
+        saved = False
+        try:
+            output_doc = fitz.open(output_path)
+            if not output_doc.can_save_incrementally():
+                return False
+            image_xrefs = {} # 画像のキー -> 埋め込み済み画像のxref
+            for page_idx in sorted(set(annotated_pages) | set(rotated_pages)):
+                page = output_doc[page_idx]
+                if page_idx in rotated_pages:
+                    page.set_rotation(rotated_pages[page_idx])
+                draw_export_ops(page, self._export_ops_for_page(page_idx), image_xrefs)
+            if self.vector_text_var.get():
+                subset_export_fonts(output_doc)
+            output_doc.save(output_path, incremental=True, deflate=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+            saved = True
+        except Exception as e: # 全体の書き出しで保存し直す
+            print(f"Incremental save failed, writing the whole document instead: {e}")
+        finally:
+            if output_doc:
+                output_doc.close()
+            if not saved: # 書きかけのコピーを保存先に残さない
+                try:
+                    os.remove(output_path)
+                except OSError:
+                    pass
+        return saved
+
     def show_processed_preview(self):
         """
         「加工後プレビュー」ボタンのコマンド。
@@ -2089,6 +5042,11 @@ PDF編集ツール 操作方法
             return
         
         try:
+            # 変更したページのみを元のファイルに追記して保存 (できない場合は以下で全体を書き出す)
+            if self.incremental_save_var.get() and self._save_pdf_incrementally(output_path):
+                messagebox.showinfo("保存完了", f"編集されたPDFを '{output_path}' に保存しました。")
+                return
+
             # 加工済みPDFデータをメモリ上に生成
             processed_pdf_bytes = self._create_preview_pdf_data()
             if not processed_pdf_bytes:
@@ -2097,6 +5055,7 @@ PDF編集ツール 操作方法
             # バイトデータをファイルに書き込む
             with open(output_path, "wb") as f:
                 f.write(processed_pdf_bytes)
+            self._export_memo.release_pdf_bytes() # 書き込み済みのデータは保持しない (作成したPDFのみ保持する)
             
             messagebox.showinfo("保存完了", f"編集されたPDFを '{output_path}' に保存しました。")
         except Exception as e_save:
@@ -2216,19 +5175,19 @@ PDF編集ツール 操作方法
             messagebox.showerror("エラー", "PDFファイルが開かれていません。")
             return
         
-        self._save_state() # 回転操作前の状態を保存
-        
         current_page_obj = self.doc[self.current_page_index]
         current_rotation_angle = current_page_obj.rotation
         new_rotation_angle = (current_rotation_angle + 90) % 360 # 90度加算し、360で剰余を取る
         
+        self._original_page_rotations.setdefault(self.current_page_index, current_rotation_angle) # ファイル上の元の角度を記録
         current_page_obj.set_rotation(new_rotation_angle) # ページの回転を設定
+        self._record_edit([('rotate', self.current_page_index, current_rotation_angle, new_rotation_angle)])
         
         # ページが回転したため、関連するキャッシュをクリアし、再描画を強制
         self._dirty_pages.add(self.current_page_index) # 現在のページをダーティとしてマーク
+        self._invalidate_continuous_layout() # ページサイズ (縦横) が変わるため連続スクロール表示の配置も破棄
         
         self.show_page() # ページを再表示してUIを更新
-        # undoボタンの状態更新は_save_state内で行われる
 
     def _insert_image_at_click(self, canvas_x, canvas_y):
         """
@@ -2259,7 +5218,7 @@ PDF編集ツール 操作方法
             pil_temp_img.close()
             
             # クリックされたCanvas座標をPDF座標に変換 (画像の左上隅とする)
-            x0_pdf_coord, y0_pdf_coord = canvas_x/self.zoom_factor, canvas_y/self.zoom_factor
+            x0_pdf_coord, y0_pdf_coord = self._canvas_to_pdf((canvas_x, canvas_y), self.current_page_index)
             
             # 画像の初期表示サイズを計算 (ここではCanvas表示幅の30%を最大幅の目安とする)
             # ただし、PDF座標系でのサイズで計算する
@@ -2280,19 +5239,19 @@ PDF編集ツール 操作方法
             final_coords_pdf = (x0_pdf_coord, y0_pdf_coord, x1_pdf_coord, y1_pdf_coord)
             
             # 新しい画像アノテーションを作成
-            new_image_ann = {
+            new_image_ann = Annotation.from_dict({
                 'page_idx': self.current_page_index, 
                 'coords': final_coords_pdf, 
                 'type': 'image_object', 
-                'image_data': image_data_bytes_content, 
+                'image_blob': self.image_blobs.add(image_data_bytes_content), # 同じ内容の画像はデータを共有する
                 'canvas_items': {},
                 'line_thickness': self.line_thickness_scale.get() # 枠線の太さも保存
-            }
+            })
             self.annotations.append(new_image_ann)
             self.selected_ann = new_image_ann # 挿入した画像を選択状態にする
             
             self._dirty_pages.add(self.current_page_index)
-            self._save_state()
+            self._record_edit([('add', new_image_ann, self.annotations.sequence_of(new_image_ann))])
             self.show_page()
         except Exception as e_insert_img:
             messagebox.showerror("画像挿入エラー", f"画像の読み込みまたは挿入中にエラーが発生しました:\n{e_insert_img}")
@@ -2357,8 +5316,8 @@ class PreviewWindow(tk.Toplevel):
 
         self.pdf_doc = None # プレビュー用PDFドキュメント
         self.current_page_num = 0 # プレビューウィンドウで現在表示中のページ番号 (0始まり)
-        self.pil_image = None # 表示用Pillowイメージ
         self.tk_image = None  # 表示用Tkinterイメージ
+        self._preview_item = None # 表示用Canvasイメージアイテム
         self.preview_zoom_factor = 1.0 # プレビューウィンドウ専用のズーム倍率
 
         try:
@@ -2426,13 +5385,17 @@ class PreviewWindow(tk.Toplevel):
 
         page = self.pdf_doc[self.current_page_num]
         pix = page.get_pixmap(matrix=fitz.Matrix(self.preview_zoom_factor, self.preview_zoom_factor))
-        mode = "RGB" if pix.alpha == 0 else "RGBA"
-        self.pil_image = Image.frombytes(mode, [pix.width, pix.height], pix.samples)
-        self.tk_image = ImageTk.PhotoImage(self.pil_image)
-
-        self.canvas.delete("all") # 既存の描画をクリア
-        self.canvas.create_image(0, 0, anchor="nw", image=self.tk_image)
-        self.canvas.config(scrollregion=(0, 0, self.pil_image.width, self.pil_image.height))
+        # プレビューは合成するものがないため、Pillowを経由せずPPMデータから直接Tkイメージを作成する
+        ppm_data = pix.tobytes("ppm")
+        if self.tk_image is not None and (self.tk_image.width(), self.tk_image.height()) == (pix.width, pix.height):
+            self.tk_image.configure(data=ppm_data) # 同じサイズなら既存のTkイメージに読み込み直す
+        else:
+            self.tk_image = tk.PhotoImage(data=ppm_data)
+            if self._preview_item is None:
+                self._preview_item = self.canvas.create_image(0, 0, anchor="nw", image=self.tk_image)
+            else:
+                self.canvas.itemconfig(self._preview_item, image=self.tk_image) # Canvasアイテムは使い回す
+        self.canvas.config(scrollregion=(0, 0, pix.width, pix.height))
         
         self.page_label.config(text=f"ページ: {self.current_page_num + 1}/{len(self.pdf_doc)}")
 
@@ -2465,6 +5428,267 @@ class PreviewWindow(tk.Toplevel):
         self.destroy()
 
 
+# === サムネイルナビゲーター ===
+class ThumbnailNavigator(tk.Frame):
+    """
+    メインCanvasの横に表示するページサムネイルの一覧。
+    1000ページを超えるPDFでも軽快に動作するよう、Canvasアイテムは表示中のスロット分だけを作成し、
+    スクロールで見えなくなったスロットのアイテムは次に見えるようになったスロットで再利用します (仮想化)。
+    サムネイルはバックグラウンドのワーカープロセス (PageRenderWorker) で低解像度にレンダリングし、
+    表示中のスロットを優先して依頼します。レンダリング結果はメモリ上限付きのLRUキャッシュに保持します。
+    """
+    THUMB_WIDTH = 120 # サムネイル画像の最大幅 (ピクセル)
+    THUMB_HEIGHT = 160 # サムネイル画像の最大高さ (ピクセル)
+    SLOT_PADDING = 8 # スロットの上下左右の余白
+    LABEL_HEIGHT = 16 # ページ番号ラベルの高さ
+    SLOT_HEIGHT = THUMB_HEIGHT + LABEL_HEIGHT + SLOT_PADDING * 2 # 1ページ分のスロットの高さ (全ページ共通の固定値)
+    OVERSCAN_SLOTS = 4 # 表示範囲の前後に先読みするスロット数
+    CACHE_MAX_BYTES = 32 * 1024 * 1024 # サムネイルキャッシュのメモリ上限 (120x160のRGBで約400枚分)
+    POLL_INTERVAL_MS = 50 # ワーカーの結果をポーリングする間隔 (ミリ秒)
+
+    def __init__(self, master, on_page_selected, **kwargs):
+        """
+        Args:
+            master: 親ウィジェット。
+            on_page_selected (callable): サムネイルがクリックされたときに、ページインデックスを引数に呼び出される関数。
+            **kwargs: tk.Frame に渡すオプション。
+        """
+        super().__init__(master, **kwargs)
+        self._on_page_selected = on_page_selected
+        self.doc = None # 表示対象のPDFドキュメント (メインアプリケーションと共有)
+        self._worker = None # サムネイル用のバックグラウンドレンダリングワーカー (PageRenderWorker)
+        self._cache = LRUByteCache(self.CACHE_MAX_BYTES) # キー: (ページインデックス, 回転角度), 値: PIL Image
+        self._slots = {} # 表示中のスロット (ページインデックス -> スロット情報の辞書)
+        self._free_slots = [] # 再利用待ちのスロット (Canvasアイテムは非表示にして保持)
+        self._current_page = None # ハイライト表示中のページインデックス
+        self._update_scheduled = False # 表示スロットの更新が予約済みかどうか
+        self._poll_scheduled = False # 結果ポーリングが予約済みかどうか
+
+        self.scrollbar = tk.Scrollbar(self, orient="vertical")
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas = tk.Canvas(self, width=self.THUMB_WIDTH + self.SLOT_PADDING * 2, bg="grey",
+                                highlightthickness=0, yscrollcommand=self._on_view_changed)
+        self.canvas.pack(side="left", fill="y", expand=True)
+        self.scrollbar.config(command=self.canvas.yview)
+        # 現在のページを示す枠 (スロットの後ろに1つだけ作成し、位置を移動して使う)
+        self._highlight_id = self.canvas.create_rectangle(0, 0, 0, 0, outline="blue", width=3, state="hidden")
+
+        self.canvas.bind("<Configure>", lambda event: self._schedule_update())
+        self.canvas.bind("<ButtonPress-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_mouse_wheel) # Windows, macOS
+        self.canvas.bind("<Button-4>", self._on_mouse_wheel) # Linux (ホイールアップ)
+        self.canvas.bind("<Button-5>", self._on_mouse_wheel) # Linux (ホイールダウン)
+
+    def set_document(self, doc, pdf_path, disk_cache=None, doc_hash=None):
+        """
+        表示対象のPDFを切り替えます。Noneを渡すとサムネイルを全て消去します。
+
+        Args:
+            doc (fitz.Document or None): 表示対象のPDFドキュメント。
+            pdf_path (str or None): PDFファイルのパス (ワーカープロセスで開くため)。
+            disk_cache (DiskRenderCache, optional): サムネイルの読み書きにも使用するディスクキャッシュ。
+            doc_hash (str, optional): ディスクキャッシュのキーに使うドキュメントのハッシュ。
+        """
+        self.shutdown()
+        self.doc = doc
+        self._cache.clear()
+        for page_idx in list(self._slots):
+            self._release_slot(page_idx)
+        self._current_page = None
+        self.canvas.itemconfig(self._highlight_id, state="hidden")
+        page_count = len(doc) if doc else 0
+        self.canvas.config(scrollregion=(0, 0, self.THUMB_WIDTH + self.SLOT_PADDING * 2, page_count * self.SLOT_HEIGHT))
+        self.canvas.yview_moveto(0)
+        if doc and pdf_path:
+            try:
+                self._worker = PageRenderWorker(pdf_path, max_workers=1, disk_cache=disk_cache, doc_hash=doc_hash)
+            except Exception as e: # サムネイルが表示されないだけで、編集機能には影響しない
+                print(f"Thumbnail render worker could not be started: {e}")
+                self._worker = None
+        self._schedule_update()
+
+    def shutdown(self):
+        """サムネイル用のワーカープロセスを停止します。"""
+        if self._worker:
+            self._worker.shutdown()
+            self._worker = None
+
+    def set_current_page(self, page_idx):
+        """
+        現在のページのサムネイルをハイライトし、見えていなければ見える位置までスクロールします。
+        回転などでページの見た目が変わった場合に備えて、表示中のスロットの更新も予約します。
+
+        Args:
+            page_idx (int): 現在のページインデックス。
+        """
+        if not self.doc:
+            return
+        if page_idx != self._current_page:
+            self._current_page = page_idx
+            top = page_idx * self.SLOT_HEIGHT
+            self.canvas.coords(self._highlight_id, 3, top + 3,
+                               self.THUMB_WIDTH + self.SLOT_PADDING * 2 - 3, top + self.SLOT_HEIGHT - 3)
+            self.canvas.itemconfig(self._highlight_id, state="normal")
+            view_top, view_bottom = self.canvas.canvasy(0), self.canvas.canvasy(self.canvas.winfo_height())
+            if top < view_top or top + self.SLOT_HEIGHT > view_bottom:
+                self.canvas.yview_moveto(page_idx / len(self.doc))
+        self._schedule_update()
+
+    def get_cached_thumbnail(self, page_idx, rotation):
+        """
+        レンダリング済みのサムネイルを返します (メイン表示の暫定画像として利用するため)。
+
+        Args:
+            page_idx (int): ページインデックス。
+            rotation (int): ページの回転角度。
+
+        Returns:
+            PIL.Image.Image or None: サムネイル画像。未レンダリングの場合はNone。
+        """
+        return self._cache.peek((page_idx, rotation))
+
+    def _on_view_changed(self, first, last):
+        """Canvasの表示範囲が変化したときに、スクロールバーを更新して表示スロットの更新を予約します。"""
+        self.scrollbar.set(first, last)
+        self._schedule_update()
+
+    def _on_mouse_wheel(self, event):
+        """サムネイル一覧をマウスホイールでスクロールします。"""
+        if platform.system() == "Windows": delta = int(-1 * (event.delta / 120))
+        elif platform.system() == "Darwin": delta = int(-1 * event.delta)
+        else: delta = -1 if event.num == 4 else 1 if event.num == 5 else 0
+        self.canvas.yview_scroll(delta, "units")
+
+    def _on_click(self, event):
+        """クリックされた位置のスロットのページを選択します。"""
+        if not self.doc:
+            return
+        page_idx = int(self.canvas.canvasy(event.y) // self.SLOT_HEIGHT)
+        if 0 <= page_idx < len(self.doc):
+            self._on_page_selected(page_idx)
+
+    def _schedule_update(self):
+        """表示スロットの更新をアイドル時に1回だけ実行するよう予約します (スクロール中の連続イベントをまとめる)。"""
+        if not self._update_scheduled:
+            self._update_scheduled = True
+            self.after_idle(self._update_visible_slots)
+
+    def _update_visible_slots(self):
+        """
+        表示範囲に入ったスロットにCanvasアイテムを割り当て、範囲外になったスロットのアイテムを回収します。
+        未レンダリングのサムネイルは、表示範囲内 (上から順) → 前後の先読み範囲の順でワーカーに依頼します。
+        """
+        self._update_scheduled = False
+        if not self.doc or not self.winfo_exists():
+            return
+        page_count = len(self.doc)
+        view_top = self.canvas.canvasy(0)
+        view_bottom = self.canvas.canvasy(self.canvas.winfo_height())
+        first_visible = max(0, int(view_top // self.SLOT_HEIGHT))
+        last_visible = min(page_count - 1, int(view_bottom // self.SLOT_HEIGHT))
+        visible_pages = range(first_visible, last_visible + 1)
+
+        for page_idx in list(self._slots):
+            if page_idx not in visible_pages:
+                self._release_slot(page_idx)
+
+        # ワーカーへの依頼順: 表示中のスロット → 先読み範囲 (表示範囲に近い順)
+        wanted_pages = list(visible_pages)
+        for distance in range(1, self.OVERSCAN_SLOTS + 1):
+            wanted_pages.extend(idx for idx in (last_visible + distance, first_visible - distance) if 0 <= idx < page_count)
+
+        wanted_keys = []
+        for page_idx in wanted_pages:
+            page = self.doc[page_idx]
+            rotation = page.rotation
+            thumbnail = self._cache.get((page_idx, rotation))
+            if page_idx in visible_pages:
+                slot = self._slots.get(page_idx) or self._acquire_slot(page_idx)
+                if slot["shown_key"] != (page_idx, rotation) and thumbnail is not None:
+                    self._show_thumbnail(slot, page_idx, rotation, thumbnail)
+            if thumbnail is None:
+                # ページ全体がサムネイル枠に収まるズーム倍率 (ページごとにサイズが異なる場合があるため個別に計算)
+                zoom = min(self.THUMB_WIDTH / page.rect.width, self.THUMB_HEIGHT / page.rect.height)
+                wanted_keys.append((page_idx, zoom, rotation))
+
+        if self._worker:
+            self._worker.cancel_except(set(wanted_keys)) # スクロールで通り過ぎたページの未着手ジョブは破棄
+            for key in wanted_keys:
+                self._worker.submit(*key)
+            self._schedule_poll()
+
+    def _acquire_slot(self, page_idx):
+        """
+        ページ用のスロットを割り当てます。回収済みのスロットがあればそのCanvasアイテムを再利用します。
+
+        Args:
+            page_idx (int): ページインデックス。
+
+        Returns:
+            dict: スロット情報 (placeholder, image, label の各CanvasアイテムID、photo、shown_key)。
+        """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            slot = {"placeholder": self.canvas.create_rectangle(0, 0, 0, 0, fill="white", outline="darkgrey"),
+                    "image": self.canvas.create_image(0, 0, anchor="n"),
+                    "label": self.canvas.create_text(0, 0, anchor="n", fill="white"),
+                    "photo": None, "shown_key": None}
+        top = page_idx * self.SLOT_HEIGHT + self.SLOT_PADDING
+        center_x = self.SLOT_PADDING + self.THUMB_WIDTH / 2
+        # サムネイルが届くまではサムネイル枠全体に白い矩形を表示
+        self.canvas.coords(slot["placeholder"], self.SLOT_PADDING, top, self.SLOT_PADDING + self.THUMB_WIDTH, top + self.THUMB_HEIGHT)
+        self.canvas.coords(slot["image"], center_x, top)
+        self.canvas.coords(slot["label"], center_x, top + self.THUMB_HEIGHT + 2)
+        self.canvas.itemconfig(slot["placeholder"], state="normal")
+        self.canvas.itemconfig(slot["image"], image="", state="normal")
+        self.canvas.itemconfig(slot["label"], text=str(page_idx + 1), state="normal") # ページ情報ラベルと同じく1から数える
+        self.canvas.tag_raise(self._highlight_id)
+        slot["photo"], slot["shown_key"] = None, None
+        self._slots[page_idx] = slot
+        return slot
+
+    def _release_slot(self, page_idx):
+        """スロットのCanvasアイテムを非表示にして回収します (PhotoImageは解放)。"""
+        slot = self._slots.pop(page_idx)
+        for item_name in ("placeholder", "image", "label"):
+            self.canvas.itemconfig(slot[item_name], state="hidden")
+        self.canvas.itemconfig(slot["image"], image="")
+        slot["photo"], slot["shown_key"] = None, None
+        self._free_slots.append(slot)
+
+    def _show_thumbnail(self, slot, page_idx, rotation, thumbnail):
+        """スロットにサムネイル画像を表示し、白い枠を画像サイズに合わせます。"""
+        slot["photo"] = ImageTk.PhotoImage(thumbnail)
+        slot["shown_key"] = (page_idx, rotation)
+        self.canvas.itemconfig(slot["image"], image=slot["photo"])
+        left = self.SLOT_PADDING + (self.THUMB_WIDTH - thumbnail.width) / 2
+        top = page_idx * self.SLOT_HEIGHT + self.SLOT_PADDING
+        self.canvas.coords(slot["placeholder"], left - 1, top - 1, left + thumbnail.width, top + thumbnail.height)
+
+    def _schedule_poll(self):
+        """ワーカーの結果ポーリングを予約します (既に予約済み、またはジョブがない場合は何もしません)。"""
+        if not self._poll_scheduled and self._worker and self._worker.has_pending():
+            self._poll_scheduled = True
+            self.after(self.POLL_INTERVAL_MS, self._poll_results)
+
+    def _poll_results(self):
+        """完了したサムネイルをキャッシュに格納し、表示中のスロットであれば表示します。"""
+        self._poll_scheduled = False
+        if not self.doc or not self._worker:
+            return
+        for (page_idx, _, rotation), thumbnail in self._worker.poll_results():
+            if thumbnail is None:
+                continue # レンダリングに失敗したページはプレースホルダーのまま表示する
+            if not (0 <= page_idx < len(self.doc)) or self.doc[page_idx].rotation != rotation:
+                continue # レンダリング中にページが回転された
+            self._cache.put((page_idx, rotation), thumbnail)
+            slot = self._slots.get(page_idx)
+            if slot:
+                self._show_thumbnail(slot, page_idx, rotation, thumbnail)
+        self._schedule_poll()
+
+
 # === アプリケーションのエントリーポイント ===
 if __name__ == "__main__":
     root_window = tk.Tk() # Tkinterのルートウィンドウを作成
@@ -2474,6 +5698,8 @@ if __name__ == "__main__":
         """ウィンドウが閉じられるときに呼び出される処理。開いているPDFドキュメントを安全に閉じます。"""
         if app_instance.doc and not app_instance.doc.is_closed: # ドキュメントが開いていれば
             app_instance.doc.close() # 閉じる
+        app_instance._stop_render_worker() # バックグラウンドレンダリングワーカーも停止
+        app_instance.thumbnail_navigator.shutdown() # サムネイル用のワーカーも停止
         root_window.destroy() # ルートウィンドウを破棄してアプリケーションを終了
     
     # ウィンドウの閉じるボタン("X")が押されたときの動作を on_main_window_closing 関数に設定